@@ -0,0 +1,167 @@
+"""
+Load test for the HTTP API (musclemap.api).
+
+Starts the API with uvicorn in a subprocess, then drives it from many
+keep-alive connections at once for a fixed time per endpoint and reports
+requests per second and latency. Also times a large NDJSON /batch upload.
+
+    python benchmarks/bench_api.py --connections 64 --duration 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_brain import make_inputs
+from common import add_arguments, report, summarize
+
+
+def bodies(count):
+    """
+    JSON bodies for /plan and /checkin built from the brain benchmark inputs.
+    """
+    plans, checkins = [], []
+    for profile, log, nutrition, workout in make_inputs(count):
+        profile = {key: value.isoformat() if hasattr(value, "isoformat") else value for key, value in profile.items()}
+        log = {key: value.isoformat() if hasattr(value, "isoformat") else value for key, value in log.items()}
+        plans.append(json.dumps(profile).encode())
+        checkins.append(json.dumps({
+            "profile": profile, "progress": log, "nutrition_plan": nutrition, "workout_plan": workout.to_dict(),
+        }).encode())
+    return plans, checkins
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = None
+    chunked = False
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and b"chunked" in value:
+            chunked = True
+    if not chunked:
+        return status, await reader.readexactly(length or 0)
+    body = []
+    while True:
+        size = int((await reader.readline()).strip(), 16)
+        data = await reader.readexactly(size + 2)
+        if size == 0:
+            return status, b"".join(body)
+        body.append(data[:-2])
+
+
+def _request(path, body, content_type="application/json"):
+    return (
+        f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+
+
+async def load(port, path, payloads, connections, duration):
+    """
+    Sends requests back to back on each connection until `duration` is up.
+    Returns (requests per second, latency summary, error count).
+    """
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(seed):
+        nonlocal errors
+        rng = random.Random(seed)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            writer.write(_request(path, rng.choice(payloads)))
+            status, _ = await _read_response(reader)
+            latencies.append((time.perf_counter() - t) * 1000)
+            errors += status != 200
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(connections)))
+    elapsed = time.perf_counter() - started
+    return round(len(latencies) / elapsed), summarize(latencies), errors
+
+
+async def batch(port, plans, checkins, size):
+    """
+    Uploads `size` mixed requests as one NDJSON /batch, in chunked encoding.
+    Returns (seconds, status, result lines, error lines).
+    """
+    lines = [
+        b'{"op": "plan", "body": ' + plans[i % len(plans)] + b"}\n" if i % 2 else
+        b'{"op": "checkin", "body": ' + checkins[i % len(checkins)] + b"}\n"
+        for i in range(size)
+    ]
+    t = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    response = asyncio.ensure_future(_read_response(reader)) # Results stream back during the upload
+    writer.write(b"POST /batch HTTP/1.1\r\nHost: bench\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n")
+    for first in range(0, size, 1000):
+        data = b"".join(lines[first:first + 1000])
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    status, body = await response
+    writer.close()
+    return time.perf_counter() - t, status, body.count(b"\n"), body.count(b'{"error"')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per endpoint (default: 5)")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="requests in the /batch upload (default: 100000)")
+    parser.add_argument("--workers", type=int, default=None, help="API batch worker processes (default: one per CPU)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    port = _free_port()
+    command = [sys.executable, "-m", "musclemap.api", "--port", str(port)]
+    if args.workers is not None:
+        command += ["--workers", str(args.workers)]
+    server = subprocess.Popen(command, cwd=os.path.join(os.path.dirname(__file__), ".."), stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        plans, checkins = bodies(500)
+
+        results = {"connections": args.connections}
+        for path, payloads in (("/plan", plans), ("/checkin", checkins)):
+            rps, latency, errors = asyncio.run(load(port, path, payloads, args.connections, args.duration))
+            results[path] = {"requests_per_s": rps, **latency, "errors": errors}
+        seconds, status, lines, errors = asyncio.run(batch(port, plans, checkins, args.batch_size))
+        results["/batch"] = {
+            "requests": args.batch_size, "seconds": round(seconds, 2),
+            "requests_per_s": round(args.batch_size / seconds), "status": status, "results": lines, "errors": errors,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
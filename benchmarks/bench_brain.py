@@ -0,0 +1,171 @@
+"""
+Micro-benchmarks for the AI brain functions.
+
+Times each function the pages call on a fixed, seeded mix of realistic
+inputs (every goal, activity level and check-in branch), per call. The
+exercise library lookups are also timed on a synthetic library of
+--variations exercises, to check they stay flat as the library grows, and
+meal plans on a food table of --foods foods:
+
+    python benchmarks/bench_brain.py --output brain.json
+    python benchmarks/bench_brain.py --baseline brain.json --threshold 0.25
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import add_arguments, report, timed_calls
+
+from musclemap.brain import (
+    ACTIVITY_LEVELS, DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, EXPERIENCE_LEVELS, GENDERS, GOALS,
+    SLEEP_OPTIONS, STRENGTH_OPTIONS, adapt_maintenance, calculate_bmi_details, calculate_tdee,
+    get_ai_recommendation, get_initial_nutrition_plan, get_initial_workout_plan,
+)
+from musclemap.exercises import ExerciseInfo, ExerciseLibrary, default_library
+from musclemap.gauge import _gauge_for, create_bmi_gauge
+from musclemap.meals import DIETS, FoodTable, _solve_day, default_table, plan_week, update_week
+from musclemap.periodization import PROGRAM_WEEKS, Program, _block_swaps, _week_plan
+from musclemap.tdee import PRIOR
+
+
+def make_inputs(count, seed=42):
+    """
+    Returns `count` (profile, progress_log, nutrition_plan, workout_plan) tuples.
+    """
+    rng = random.Random(seed)
+    inputs = []
+    for _ in range(count):
+        profile = {
+            "age": rng.randint(16, 70), "gender": rng.choice(GENDERS),
+            "activity_level": rng.choice(ACTIVITY_LEVELS), "height": rng.randint(150, 200),
+            "start_weight": round(rng.uniform(50, 130), 1), "goal": rng.choice(GOALS),
+            "experience_level": rng.choice(EXPERIENCE_LEVELS),
+            "plan_start_date": datetime.date(2024, 1, 1), "weeks_on_plan": rng.randint(0, 52),
+        }
+        profile['tdee'] = calculate_tdee(profile)
+        log = {
+            "date": datetime.date(2024, 6, 1), "week_number": profile['weeks_on_plan'] + 1,
+            "start_weight_of_week": profile['start_weight'],
+            "current_weight": round(profile['start_weight'] + rng.uniform(-1.2, 0.8), 1),
+            "diet_adherence": rng.choice(DIET_ADHERENCE_OPTIONS), "strength_progress": rng.choice(STRENGTH_OPTIONS),
+            "energy_levels": rng.choice(ENERGY_OPTIONS), "sleep_quality": rng.choice(SLEEP_OPTIONS),
+        }
+        nutrition = get_initial_nutrition_plan(profile['tdee'], profile['goal'], profile['start_weight'])
+        workout = get_initial_workout_plan(profile['goal'], profile['experience_level'])
+        inputs.append((profile, log, nutrition, workout))
+    return inputs
+
+
+def make_library(size, seed=42):
+    """
+    The default exercise library padded to `size` exercises with seeded
+    variations of its entries (other equipment, renamed).
+    """
+    rng = random.Random(seed)
+    base = default_library()
+    equipment = base.values("equipment")
+    exercises = list(base.exercises)
+    while len(exercises) < size:
+        e = rng.choice(base.exercises)
+        exercises.append(ExerciseInfo(f"{e.name} (variation {len(exercises)})", e.pattern, rng.choice(equipment), e.muscles, ()))
+    return ExerciseLibrary(exercises)
+
+
+def make_food_table(size, seed=42):
+    """
+    The default food table padded to `size` foods with seeded variations
+    of its entries (scaled portions, more or less protein, renamed).
+    """
+    rng = random.Random(seed)
+    base = default_table()
+    foods = list(base.foods)
+    while len(foods) < size:
+        f, scale = rng.choice(base.foods), rng.uniform(0.7, 1.3)
+        foods.append(f._replace(
+            name=f"{f.name} (variation {len(foods)})", kcal=f.kcal * scale, protein_g=f.protein_g * rng.uniform(0.7, 1.3),
+            fats_g=f.fats_g * scale, carbs_g=f.carbs_g * scale,
+        ))
+    return FoodTable(foods)
+
+
+def meal_week_miss(nutrition_plan, exclude, table):
+    _solve_day.cache_clear()
+    return plan_week(nutrition_plan, exclude, 0, table)
+
+
+def meal_week_update(week, nutrition_plan):
+    _solve_day.cache_clear()
+    return update_week(week, nutrition_plan)
+
+
+def program_week_miss(profile, plan, week):
+    _week_plan.cache_clear()
+    _block_swaps.cache_clear()
+    return Program(plan, profile['goal'], profile['experience_level'], seed=week)[week]
+
+
+def gauge_miss(bmi):
+    _gauge_for.cache_clear()
+    return create_bmi_gauge(bmi)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--inputs", type=int, default=200, help="distinct inputs cycled through (default: 200)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed batches per benchmark (default: 20)")
+    parser.add_argument("--variations", type=int, default=50_000, help="exercises in the large library (default: 50000)")
+    parser.add_argument("--foods", type=int, default=50_000, help="foods in the large food table (default: 50000)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    inputs = make_inputs(args.inputs)
+    profiles = [(profile,) for profile, _, _, _ in inputs]
+    bodies = [(profile['start_weight'], profile['height']) for profile, _, _, _ in inputs]
+    bmis = [(round(calculate_bmi_details(*body)[0], 1),) for body in bodies]
+    create_bmi_gauge(bmis[0][0]) # Build the shared template outside the timings
+    library, large_library = default_library(), make_library(args.variations)
+    plan_exercises = sorted({e.name for _, _, _, plan in inputs for day in plan.weekly_schedule for e in day.exercises if e.sets})
+    swap_calls = [(name,) for name in plan_exercises]
+    find_calls = [(muscle, None, equipment, 10) for muscle in library.values("muscle") for equipment in ("dumbbell", "cable")]
+    food_table, large_food_table = default_table(), make_food_table(args.foods)
+    nutrition_plans = [nutrition for _, _, nutrition, _ in inputs[:20]]
+    week_calls = [(plan, exclude, food_table) for plan in nutrition_plans for exclude in (DIETS["Everything"], DIETS["Vegan"])]
+    # A week planned before the check-in, and the plan the coach made of it
+    update_calls = [(plan_week(args[2]), get_ai_recommendation(*args)[0]) for args in inputs[:20]]
+
+    program_calls = [(profile, plan, i % PROGRAM_WEEKS) for i, (profile, _, _, plan) in enumerate(inputs)]
+    benchmarks = {
+        "calculate_tdee": (calculate_tdee, profiles),
+        "calculate_bmi_details": (calculate_bmi_details, bodies),
+        "create_bmi_gauge": (create_bmi_gauge, bmis[:1]), # Cache hit: a rerun of the same member
+        "create_bmi_gauge_miss": (gauge_miss, bmis),
+        "get_initial_nutrition_plan": (
+            get_initial_nutrition_plan, [(p['tdee'], p['goal'], p['start_weight']) for p, in profiles]),
+        "get_initial_workout_plan": (
+            get_initial_workout_plan, [(p['goal'], p['experience_level']) for p, in profiles]),
+        "get_ai_recommendation": (get_ai_recommendation, inputs),
+        "adapt_maintenance": (
+            adapt_maintenance, [(profile, log, nutrition, nutrition, PRIOR) for profile, log, nutrition, _ in inputs]),
+        "exercise_swaps": (library.swaps, swap_calls),
+        "exercise_swaps_large": (large_library.swaps, swap_calls),
+        "exercise_swaps_large_equipment": (
+            lambda name: large_library.swaps(name, equipment={"dumbbell", "bodyweight"}), swap_calls),
+        "exercise_find_large": (large_library.find, find_calls),
+        "meal_plan_week": (meal_week_miss, week_calls),
+        "meal_plan_week_large": (meal_week_miss, [(plan, exclude, large_food_table) for plan, exclude, _ in week_calls[:8]]),
+        "meal_plan_update_week": (meal_week_update, update_calls),
+        # A 52-week program before any week is read, then one week built from scratch
+        "program_create": (Program, [(plan, p['goal'], p['experience_level']) for p, _, _, plan in inputs]),
+        "program_week_miss": (program_week_miss, program_calls),
+    }
+    results = {name: timed_calls(fn, calls, repeat=args.repeat) for name, (fn, calls) in benchmarks.items()}
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+End-to-end benchmark for the Streamlit pages.
+
+Drives app.py headlessly with Streamlit's AppTest through a full member
+journey and times every script run: the first Onboarding render, an
+Onboarding rerun, the onboarding submit, Dashboard reruns, a check-in
+submit, a rerun of the Dashboard with a history and a projection run.
+The app runs in benchmark mode (MUSCLEMAP_BENCHMARK=1), so its UX pauses
+are skipped, against a throwaway database and telemetry directory.
+
+AppTest always reruns the whole script, even for a widget inside an
+st.fragment, so "sections" also reports the Dashboard's spans from the
+app's own telemetry: the *_section spans are what an interaction with
+that fragment costs in a real browser session.
+
+    python benchmarks/bench_pages.py --output pages.json
+    python benchmarks/bench_pages.py --baseline pages.json --threshold 0.25
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import add_arguments, report, summarize
+
+APP_PATH = os.path.join(os.path.dirname(__file__), "..", "app.py")
+
+STEPS = [
+    "onboarding_first_run", "onboarding_rerun", "onboarding_submit",
+    "dashboard_rerun", "checkin_submit", "dashboard_rerun_with_history", "projection_run",
+]
+
+
+def journey(AppTest, timings):
+    """
+    One member's session, appending each step's run time (ms) to `timings`.
+    """
+    def run(step, at):
+        t = time.perf_counter()
+        at.run()
+        timings[step].append((time.perf_counter() - t) * 1000)
+        if at.exception:
+            raise RuntimeError(f"{step}: {at.exception}")
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    run("onboarding_first_run", at)
+    run("onboarding_rerun", at)
+
+    [box for box in at.selectbox if box.label == "Primary Goal"][0].set_value("Muscle Gain")
+    at.button[0].click()
+    run("onboarding_submit", at) # Includes the st.rerun() into the Dashboard
+    run("dashboard_rerun", at)
+
+    weight = [box for box in at.number_input if box.label.startswith("Your New Current Weight")][0]
+    weight.set_value(weight.value + 0.3)
+    [button for button in at.button if button.label.startswith("Analyze My Week")][0].click()
+    run("checkin_submit", at)
+    run("dashboard_rerun_with_history", at)
+
+    [button for button in at.button if button.label == "Run Projection"][0].click()
+    run("projection_run", at)
+
+
+def dashboard_spans(directory):
+    """
+    The Dashboard's span timings (ms) from the app's telemetry log.
+    """
+    spans = {}
+    with open(os.path.join(directory, "spans.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["page"] == "Dashboard":
+                for name, ms in record["spans"].items():
+                    spans.setdefault(name, []).append(ms)
+    return spans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="member journeys to time (default: 20)")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Read by app.py and musclemap.store at import, so set them first
+        os.environ["MUSCLEMAP_BENCHMARK"] = "1"
+        os.environ["MUSCLEMAP_DB"] = os.path.join(tmp, "bench_pages.db")
+        os.environ["MUSCLEMAP_TELEMETRY_DIR"] = telemetry_dir = os.path.join(tmp, "telemetry")
+        from streamlit.testing.v1 import AppTest
+
+        timings = {step: [] for step in STEPS}
+        t = time.perf_counter()
+        journey(AppTest, timings) # The first session pays for the imports and caches
+        cold_ms = (time.perf_counter() - t) * 1000
+        cold_spans = dashboard_spans(telemetry_dir)
+        timings = {step: [] for step in STEPS}
+        for _ in range(args.sessions):
+            journey(AppTest, timings)
+        spans = {name: times[len(cold_spans.get(name, ())):] for name, times in dashboard_spans(telemetry_dir).items()}
+
+    results = {"sessions": args.sessions, "cold_session_ms": round(cold_ms, 1)}
+    results.update({step: summarize(times) for step, times in timings.items()})
+    results["sections"] = {name: summarize(times) for name, times in sorted(spans.items()) if times}
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
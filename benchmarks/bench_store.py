@@ -0,0 +1,152 @@
+"""
+Benchmark for musclemap.store.
+
+Fills a fresh database with synthetic members (default: 100k users with
+3 years of weekly check-ins each), then times the operations the app runs:
+resuming a session, loading the progress history, rebuilding a past week's
+plan and submitting a check-in. Then renders weekly HTML reports for a
+sample of members (see musclemap.reports) in this process.
+
+    python benchmarks/bench_store.py --users 100000 --weeks 156
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from common import add_arguments, report, timed
+
+from musclemap.brain import (
+    ACTIVITY_LEVELS, DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, EXPERIENCE_LEVELS, GENDERS, GOALS,
+    SLEEP_OPTIONS, STRENGTH_OPTIONS, adjust_nutrition_plan, calculate_bmi_details, calculate_tdee,
+    get_ai_recommendation, get_initial_nutrition_plan, get_initial_workout_plan,
+)
+from musclemap.reports import generate_reports
+from musclemap.store import CHECKIN_FIELDS, PROFILE_FIELDS, Store
+from musclemap.versioning import KEYFRAME_EVERY
+
+
+def fill(store, users, weeks, plan_change_rate, batch=2000):
+    rng = random.Random(42)
+    start = datetime.date(2023, 1, 2)
+    conn = store.connection()
+    user_ids = []
+    for first in range(0, users, batch):
+        profiles, plans, checkins = [], [], []
+        for n in range(first, min(first + batch, users)):
+            user_id = f"user{n:08d}"
+            user_ids.append(user_id)
+            profile = {
+                "age": rng.randint(16, 70), "gender": rng.choice(GENDERS),
+                "activity_level": rng.choice(ACTIVITY_LEVELS), "height": rng.randint(150, 200),
+                "start_weight": round(rng.uniform(50, 130), 1), "goal": rng.choice(GOALS),
+                "experience_level": rng.choice(EXPERIENCE_LEVELS),
+                "plan_start_date": start.isoformat(), "weeks_on_plan": weeks,
+            }
+            profile['tdee'] = calculate_tdee(profile)
+            profile['bmi'], profile['bmi_category'], profile['bmi_color'] = calculate_bmi_details(profile['start_weight'], profile['height'])
+
+            nutrition = get_initial_nutrition_plan(profile['tdee'], profile['goal'], profile['start_weight'])
+            workout = json.dumps(get_initial_workout_plan(profile['goal'], profile['experience_level']).to_dict())
+            weight = profile['start_weight']
+            plan_version, depth = 0, 0
+            plans.append((user_id, 0, start.isoformat(), "{}", json.dumps(nutrition), workout))
+            for week in range(1, weeks + 1):
+                date = (start + datetime.timedelta(weeks=week)).isoformat()
+                if rng.random() < plan_change_rate:
+                    # A typical coaching change: a calorie step taken from carbs
+                    calories = rng.choice([150, -150, -200, 200])
+                    diff = {"calories_kcal": calories, "carbs_g": calories // 4}
+                    nutrition = adjust_nutrition_plan(nutrition, **diff)
+                    plan_version, depth = week, (depth + 1) % KEYFRAME_EVERY
+                    keyframe = (json.dumps(nutrition), workout) if depth == 0 else (None, None)
+                    plans.append((user_id, week, date, json.dumps({"nutrition": diff}), *keyframe))
+                new_weight = round(weight + rng.uniform(-0.8, 0.6), 1)
+                checkins.append((
+                    user_id, week, date, weight, new_weight,
+                    rng.choice(DIET_ADHERENCE_OPTIONS), rng.choice(STRENGTH_OPTIONS),
+                    rng.choice(ENERGY_OPTIONS), rng.choice(SLEEP_OPTIONS),
+                ))
+                weight = new_weight
+            profiles.append([user_id] + [profile[f] for f in PROFILE_FIELDS] + [json.dumps(nutrition), workout, plan_version, depth])
+
+        with conn:
+            conn.executemany(f"INSERT INTO profiles VALUES ({', '.join('?' * (len(PROFILE_FIELDS) + 5))})", profiles)
+            conn.executemany("INSERT INTO plan_versions VALUES (?, ?, ?, ?, ?, ?)", plans)
+            conn.executemany(f"INSERT INTO checkins VALUES ({', '.join('?' * (len(CHECKIN_FIELDS) + 1))})", checkins)
+        print(f"  {len(user_ids)}/{users} users", end="\r", file=sys.stderr)
+    print(file=sys.stderr)
+    return user_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--weeks", type=int, default=156)
+    parser.add_argument("--plan-change-rate", type=float, default=0.25,
+                        help="share of check-ins where the coach changes the plan (default: 0.25)")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--reports", type=int, default=2000, help="members to render weekly reports for (default: 2000)")
+    parser.add_argument("--db", default="bench_store.db")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    store = Store(args.db)
+
+    t = time.perf_counter()
+    user_ids = fill(store, args.users, args.weeks, args.plan_change_rate)
+    fill_s = time.perf_counter() - t
+    store.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    rng = random.Random(7)
+    sample = [(rng.choice(user_ids),) for _ in range(args.samples)]
+    results = {
+        "users": args.users,
+        "weeks": args.weeks,
+        "checkins": args.users * args.weeks,
+        "plan_versions": store.connection().execute("SELECT COUNT(*) FROM plan_versions").fetchone()[0],
+        "fill_s": round(fill_s, 1),
+        "db_mb": round(os.path.getsize(args.db) / 1e6, 1),
+        "load_session": timed(store.load_session, sample),
+        "load_progress_history": timed(store.load_progress_history, sample),
+        "load_plan_version": timed(store.load_plan_version, [(user_id, rng.randint(0, args.weeks)) for user_id, in sample]),
+    }
+
+    def checkin(user_id):
+        profile, nutrition, workout = store.load_session(user_id)
+        week = profile['weeks_on_plan'] + 1
+        log = {
+            "date": datetime.date.today(), "week_number": week, "start_weight_of_week": profile['start_weight'],
+            "current_weight": profile['start_weight'] - 0.4, "diet_adherence": DIET_ADHERENCE_OPTIONS[0],
+            "strength_progress": STRENGTH_OPTIONS[0], "energy_levels": ENERGY_OPTIONS[0], "sleep_quality": SLEEP_OPTIONS[0],
+        }
+        nutrition, workout, _ = get_ai_recommendation(profile, log, nutrition, workout)
+        profile.update(start_weight=log['current_weight'], weeks_on_plan=week)
+        store.record_checkin(user_id, log, profile, nutrition, workout)
+
+    results["submit_checkin"] = timed(checkin, sample[: args.samples // 4])
+
+    out_dir = tempfile.mkdtemp(prefix="bench_reports_")
+    try:
+        t = time.perf_counter()
+        reports = sum(written for written, _ in generate_reports(args.db, out_dir, workers=1, user_ids=user_ids[: args.reports]))
+        elapsed = time.perf_counter() - t
+    finally:
+        shutil.rmtree(out_dir)
+    results["reports"] = {"count": reports, "ms_per_report": round(elapsed * 1000 / max(reports, 1), 3)}
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Shared helpers for the benchmark scripts: timing, JSON results and the
+regression check against a saved baseline.
+
+Every script accepts:
+    --output results.json     write the results (default: print them)
+    --baseline baseline.json  compare against an earlier run
+    --threshold 0.25          fail if a benchmark got more than 25% slower
+
+and exits with status 1 when something regressed, so it can gate CI.
+"""
+
+import json
+import math
+import statistics
+import sys
+import time
+
+DEFAULT_THRESHOLD = 0.25
+
+# The statistic each kind of result is compared on: the median for page and
+# store timings, the best batch for micro-benchmarks (least affected by noise)
+COMPARED = ("p50_ms", "min_us")
+
+
+def timed(fn, samples):
+    """
+    Calls fn(*args) once per entry in `samples`, returns p50/p99 in ms.
+    """
+    times = []
+    for args in samples:
+        t = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - t) * 1000)
+    return summarize(times)
+
+
+def timed_calls(fn, args_cycle, repeat=20, number=None):
+    """
+    Micro-benchmark: times `repeat` batches of `number` calls, cycling
+    through `args_cycle`. Returns per-call min/p50/p99 in microseconds.
+    Without `number`, a batch is sized to take about 10 ms.
+    """
+    calls = len(args_cycle)
+    if number is None:
+        number = calls
+        while True:
+            t = time.perf_counter()
+            for i in range(number):
+                fn(*args_cycle[i % calls])
+            if time.perf_counter() - t > 0.01:
+                break
+            number *= 2
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for i in range(number):
+            fn(*args_cycle[i % calls])
+        times.append((time.perf_counter() - t) * 1e6 / number)
+    times.sort()
+    return {
+        "min_us": round(times[0], 3),
+        **summarize(times, unit="us"),
+        "calls_per_sample": number,
+    }
+
+
+def summarize(times, unit="ms"):
+    times = sorted(times)
+    return {
+        f"p50_{unit}": round(statistics.median(times), 3),
+        f"p99_{unit}": round(times[max(math.ceil(len(times) * 0.99) - 1, 0)], 3),
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"allowed slowdown before a benchmark counts as a regression (default: {DEFAULT_THRESHOLD})")
+
+
+def regressions(results, baseline, threshold, path=""):
+    """
+    Yields (name, statistic, baseline, new) for every COMPARED statistic
+    that is more than `threshold` slower than in `baseline`. Benchmarks
+    missing from either side are skipped.
+    """
+    for key, value in results.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if old is None:
+            continue
+        if isinstance(value, dict):
+            yield from regressions(value, old, threshold, f"{path}{key}.")
+        elif key in COMPARED and old > 0 and value > old * (1 + threshold):
+            yield path.rstrip("."), key, old, value
+
+
+def report(results, args):
+    """
+    Writes the results and runs the regression check. Returns the exit status.
+    """
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    slower = list(regressions(results, baseline, args.threshold))
+    for name, key, old, new in slower:
+        print(f"REGRESSION {name} {key}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)", file=sys.stderr)
+    if not slower:
+        print(f"No regressions over {args.threshold * 100:.0f}% against {args.baseline}", file=sys.stderr)
+    return 1 if slower else 0
@@ -0,0 +1,17 @@
+"""
+MuscleMap AI - the "AI Brain" as an importable package.
+
+These modules hold the fitness and nutrition rules without any Streamlit
+dependency, so they can be used from scripts, batch jobs and the app alike.
+Only the plain-Python rules are re-exported here; the pandas/plotly based
+modules (cohort, coach, gauge) are imported on their own when needed.
+"""
+
+from musclemap.brain import (
+    calculate_tdee,
+    calculate_bmi_details,
+    bmi_category,
+    get_initial_nutrition_plan,
+    get_initial_workout_plan,
+    get_ai_recommendation,
+)
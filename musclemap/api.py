@@ -0,0 +1,350 @@
+"""
+Headless HTTP API for the AI brain.
+
+Serves plans and check-ins to the mobile app and partner gyms without a
+Streamlit session (where every call would re-run the whole page script).
+It calls the same functions as the Onboarding and Dashboard pages:
+
+  POST /plan      a new member's profile
+                  -> {profile (with tdee and BMI), nutrition_plan, workout_plan}
+  POST /checkin   {profile, progress, nutrition_plan, workout_plan}
+                  -> {profile (updated for next week), nutrition_plan, workout_plan, feedback}
+                  progress may carry trend_kg_per_week, the member's
+                  smoothed weight trend (see musclemap.trend)
+                  With a "tdee_estimate" key (null for a member's first
+                  check-in), the learned TDEE is updated too (see
+                  musclemap.tdee): the full profile is needed and the
+                  response carries the new tdee_estimate to send next time
+  POST /batch     many of the above, as a JSON array or NDJSON (one request
+                  per line, each with "op": "plan" or "checkin"). Results
+                  stream back as NDJSON in input order; a bad line gets an
+                  {"error": ...} line instead of failing the batch.
+
+The service is stateless: clients send the current plans with each
+check-in (the workout plan in the dict format /plan returns; the text
+days of plans saved by the old app are only read from the store).
+Every number must be finite and in NUMBER_RANGES; a request that isn't
+gets a 400 with the reason, never a 500.
+
+A single plan or check-in takes a few microseconds, less than handing it
+to another process, so those run on the event loop. Batches are cut into
+chunks that run in a process pool, with a bounded number of chunks in
+flight so a large upload streams through in constant memory.
+
+    python -m musclemap.api --port 8000 --workers 4
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import math
+import os
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from musclemap.brain import (
+    ACTIVITY_LEVELS, AGE_RANGE, DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, EXPERIENCE_LEVELS, GENDERS, GOALS,
+    HEIGHT_RANGE_CM, SLEEP_OPTIONS, STRENGTH_OPTIONS, WEIGHT_RANGE_KG, adapt_maintenance, calculate_bmi_details, calculate_tdee,
+    get_ai_recommendation, get_initial_nutrition_plan, get_initial_workout_plan,
+)
+from musclemap.tdee import Estimate
+from musclemap.workouts import WorkoutPlan
+
+BATCH_CHUNK = 512 # Requests per worker task
+NDJSON = "application/x-ndjson"
+
+PROFILE_OPTIONS = {
+    "gender": GENDERS, "activity_level": ACTIVITY_LEVELS, "goal": GOALS, "experience_level": EXPERIENCE_LEVELS,
+}
+PROFILE_NUMBERS = ["age", "height", "start_weight"]
+# (min, max) of each number a request can carry: the forms' ranges, and
+# bounds no member comes near for the rest (so nothing overflows)
+NUMBER_RANGES = {
+    "age": AGE_RANGE, "height": HEIGHT_RANGE_CM, "start_weight": WEIGHT_RANGE_KG, "current_weight": WEIGHT_RANGE_KG,
+    "weeks_on_plan": (0, 10_000), "trend_kg_per_week": (-10, 10), "tdee": (0, 20_000),
+    "calories_kcal": (0, 20_000), "protein_g": (0, 5_000), "fats_g": (0, 5_000), "carbs_g": (0, 5_000),
+    "offset": (-10_000, 10_000), "variance": (0, 1e9), "weeks": (0, 10_000),
+}
+MAX_WORKOUT_DAYS = 7
+MAX_EXERCISES_PER_DAY = 20
+PROGRESS_OPTIONS = {
+    "diet_adherence": DIET_ADHERENCE_OPTIONS, "strength_progress": STRENGTH_OPTIONS,
+    "energy_levels": ENERGY_OPTIONS, "sleep_quality": SLEEP_OPTIONS,
+}
+
+
+class RequestError(ValueError):
+    """
+    A request body the brain can't work with (reported as HTTP 400).
+    """
+
+
+def _check(body, options, numbers, what):
+    if not isinstance(body, dict):
+        raise RequestError(f"{what} must be a JSON object")
+    for field, allowed in options.items():
+        if body.get(field) not in allowed:
+            raise RequestError(f"{what}.{field} must be one of {allowed}")
+    for field in numbers:
+        value = body.get(field)
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+            raise RequestError(f"{what}.{field} must be a number")
+        low, high = NUMBER_RANGES[field]
+        if not low <= value <= high:
+            raise RequestError(f"{what}.{field} must be between {low} and {high}")
+
+
+def _check_workout_plan(plan):
+    """
+    A workout plan as /plan returns it: at most a week of day objects,
+    each with a list of exercise texts.
+    """
+    days = plan.get('weekly_schedule') if isinstance(plan, dict) else None
+    if not isinstance(days, list) or len(days) > MAX_WORKOUT_DAYS or not all(
+        isinstance(day, dict) and isinstance(day.get('exercises', []), list)
+        and len(day.get('exercises', [])) <= MAX_EXERCISES_PER_DAY
+        and all(isinstance(exercise, str) for exercise in day.get('exercises', []))
+        for day in days
+    ):
+        raise RequestError("workout_plan must be a plan as returned by /plan")
+
+
+def _reject_constant(name):
+    raise RequestError(f"{name} is not a valid number")
+
+
+def _loads(text):
+    """
+    json.loads without NaN and Infinity, which no plan can use and no
+    response could encode.
+    """
+    return json.loads(text, parse_constant=_reject_constant)
+
+
+# --- Operations (plain functions, so they can run in worker processes) ---
+
+def make_plan(profile):
+    """
+    What the Onboarding submit does: metrics plus the first plans.
+    """
+    _check(profile, PROFILE_OPTIONS, PROFILE_NUMBERS, "profile")
+    profile = dict(profile)
+    profile.setdefault('plan_start_date', datetime.date.today().isoformat())
+    profile.setdefault('weeks_on_plan', 0)
+    profile['tdee'] = calculate_tdee(profile)
+    profile['bmi'], profile['bmi_category'], profile['bmi_color'] = calculate_bmi_details(profile['start_weight'], profile['height'])
+    return {
+        "profile": profile,
+        "nutrition_plan": get_initial_nutrition_plan(profile['tdee'], profile['goal'], profile['start_weight']),
+        "workout_plan": get_initial_workout_plan(profile['goal'], profile['experience_level']).to_dict(),
+    }
+
+
+def check_in(body):
+    """
+    What the Dashboard check-in submit does: the coach's new plans and
+    feedback, and the profile rolled forward to the next week.
+    """
+    if not isinstance(body, dict):
+        raise RequestError("check-in must be a JSON object")
+    profile, progress = body.get('profile'), body.get('progress')
+    _check(profile, {"goal": GOALS}, ["start_weight", "height"], "profile")
+    _check(progress, PROGRESS_OPTIONS, ["current_weight"], "progress")
+    if progress.get('trend_kg_per_week') is not None:
+        _check(progress, {}, ["trend_kg_per_week"], "progress")
+    if 'weeks_on_plan' in profile:
+        _check(profile, {}, ["weeks_on_plan"], "profile")
+    nutrition_plan = body.get('nutrition_plan')
+    _check(nutrition_plan, {}, ["calories_kcal", "protein_g", "fats_g", "carbs_g"], "nutrition_plan")
+    _check_workout_plan(body.get('workout_plan'))
+    try:
+        workout_plan = WorkoutPlan.from_dict(body['workout_plan'])
+    except (KeyError, TypeError, AttributeError, ValueError, SyntaxError):
+        raise RequestError("workout_plan must be a plan as returned by /plan") from None
+
+    learns_tdee = 'tdee_estimate' in body
+    if learns_tdee:
+        _check(profile, PROFILE_OPTIONS, PROFILE_NUMBERS + ["tdee"], "profile")
+        estimate = body['tdee_estimate']
+        if estimate is not None:
+            _check(estimate, {}, list(Estimate._fields), "tdee_estimate")
+            if estimate['variance'] == 0:
+                raise RequestError("tdee_estimate must be one returned by /checkin")
+            estimate = Estimate(*(estimate[f] for f in Estimate._fields))
+
+    new_nutrition_plan, workout_plan, feedback = get_ai_recommendation(profile, progress, nutrition_plan, workout_plan)
+    if learns_tdee:
+        tdee, new_nutrition_plan, estimate, tdee_feedback = adapt_maintenance(
+            profile, progress, nutrition_plan, new_nutrition_plan, estimate,
+        )
+        profile, feedback = dict(profile, tdee=tdee), feedback + tdee_feedback
+    profile = dict(profile, start_weight=progress['current_weight'], weeks_on_plan=profile.get('weeks_on_plan', 0) + 1)
+    profile['bmi'], profile['bmi_category'], profile['bmi_color'] = calculate_bmi_details(profile['start_weight'], profile['height'])
+    result = {
+        "profile": profile,
+        "nutrition_plan": new_nutrition_plan,
+        "workout_plan": workout_plan.to_dict(),
+        "feedback": feedback,
+    }
+    if learns_tdee:
+        result["tdee_estimate"] = estimate._asdict() if estimate is not None else None
+    return result
+
+
+OPERATIONS = {"plan": make_plan, "checkin": check_in}
+
+
+def run_batch(lines):
+    """
+    Runs a chunk of batch requests (JSON text, one per line) and returns
+    the NDJSON output for them. A failed request gives an error line.
+    """
+    out = []
+    for line in lines:
+        try:
+            item = _loads(line)
+            op = OPERATIONS.get(item.get('op')) if isinstance(item, dict) else None
+            if op is None:
+                raise RequestError(f"op must be one of {sorted(OPERATIONS)}")
+            body = item['body'] if 'body' in item else {key: value for key, value in item.items() if key != 'op'}
+            result = op(body)
+        except (ValueError, SyntaxError) as e: # RequestError is a ValueError
+            result = {"error": str(e)}
+        out.append(json.dumps(result))
+    return "\n".join(out) + "\n"
+
+
+# --- HTTP ---
+
+async def _json_body(request):
+    try:
+        return _loads(await request.body())
+    except RequestError:
+        raise
+    except ValueError:
+        raise RequestError("body must be valid JSON") from None
+
+
+async def plan_endpoint(request):
+    try:
+        return JSONResponse(make_plan(await _json_body(request)))
+    except (ValueError, SyntaxError) as e: # Bad input the checks didn't catch is still the client's
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+async def checkin_endpoint(request):
+    try:
+        return JSONResponse(check_in(await _json_body(request)))
+    except (ValueError, SyntaxError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+async def _batch_lines(request):
+    """
+    Yields the batch's requests as JSON text, reading NDJSON as it arrives.
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
+        body = await request.body()
+        try:
+            items = _loads(body)
+        except ValueError:
+            yield body # Comes back as an error line
+            return
+        for item in items if isinstance(items, list) else [items]:
+            yield json.dumps(item)
+        return
+    pending = b""
+    async for data in request.stream():
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+async def _batch_results(request):
+    """
+    Yields the NDJSON output chunk by chunk, in input order.
+    """
+    pool = request.app.state.pool
+    loop = asyncio.get_running_loop()
+    max_in_flight = 2 * max(request.app.state.workers, 1)
+    in_flight = [] # Futures in input order
+    chunk = []
+    async for line in _batch_lines(request):
+        chunk.append(line)
+        if len(chunk) == BATCH_CHUNK:
+            in_flight.append(loop.run_in_executor(pool, run_batch, chunk))
+            chunk = []
+            if len(in_flight) >= max_in_flight:
+                yield await in_flight.pop(0)
+    if chunk:
+        in_flight.append(loop.run_in_executor(pool, run_batch, chunk))
+    for future in in_flight:
+        yield await future
+
+
+class BatchEndpoint:
+    """
+    /batch as a plain ASGI app, so results stream back while the upload is
+    still being read. (Starlette's StreamingResponse reads the request
+    channel itself to watch for disconnects, which would eat the body.)
+    """
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", NDJSON.encode())]})
+        async for output in _batch_results(request):
+            await send({"type": "http.response.body", "body": output.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    workers = app.state.workers
+    app.state.pool = concurrent.futures.ProcessPoolExecutor(workers) if workers else None
+    try:
+        yield
+    finally:
+        if app.state.pool is not None:
+            app.state.pool.shutdown(cancel_futures=True)
+
+
+def create_app(workers=None):
+    """
+    The Starlette app. `workers` processes run batch chunks (default: one
+    per CPU; 0 runs them in a thread of this process instead).
+    """
+    app = Starlette(
+        routes=[
+            Route("/plan", plan_endpoint, methods=["POST"]),
+            Route("/checkin", checkin_endpoint, methods=["POST"]),
+            Route("/batch", BatchEndpoint(), methods=["POST"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.workers = os.cpu_count() if workers is None else workers
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the AI brain over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="batch worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(create_app(args.workers), host=args.host, port=args.port, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+The "AI Brain" - fitness & nutrition rules.
+
+Plain Python with no Streamlit, pandas or plotly imports, so the app can
+import it on every rerun for almost nothing and other tools can reuse it.
+"""
+
+import functools
+from types import MappingProxyType
+
+from musclemap import tdee
+from musclemap.rules import RuleFile
+from musclemap.workouts import BODY_PART_SPLIT, FULL_BODY, PUSH_PULL_LEGS, UPPER_LOWER
+
+# --- Form options (the choices offered on the Onboarding and Dashboard pages) ---
+
+ACTIVITY_LEVELS = [
+    "Sedentary (office job)",
+    "Lightly Active (1-2 days/week)",
+    "Moderately Active (3-5 days/week)",
+    "Very Active (6-7 days/week)",
+]
+GENDERS = ["Male", "Female"]
+GOALS = ["Weight Reduction", "Muscle Gain", "General Fitness"]
+EXPERIENCE_LEVELS = ["Beginner (0-1 years)", "Intermediate (1-3 years)", "Advanced (3+ years)"]
+
+DIET_ADHERENCE_OPTIONS = [
+    "Great (I hit my targets)",
+    "Good (I was pretty close)",
+    "Okay (I slipped up a few times)",
+    "Bad (I didn't follow the plan)",
+]
+ENERGY_OPTIONS = ["High", "Normal", "Low"]
+STRENGTH_OPTIONS = [
+    "Got stronger (added weight/reps)",
+    "Stalled (lifted the same)",
+    "Got weaker (had to lower weight)",
+]
+SLEEP_OPTIONS = ["Great (7-8+ hours)", "Okay (6-7 hours)", "Poor (4-5 hours)"]
+
+# The diet adherence answers that mean the member ate about their calorie
+# target, so their week can teach the TDEE estimate (see musclemap.tdee)
+ON_TARGET_ADHERENCE = DIET_ADHERENCE_OPTIONS[:2]
+
+# --- Input ranges (min, max) of the number inputs; imports are validated against them too ---
+
+AGE_RANGE = (16, 100)
+HEIGHT_RANGE_CM = (100, 250)
+WEIGHT_RANGE_KG = (40.0, 200.0)
+
+def calculate_tdee(profile):
+    """
+    Calculates TDEE using the Harris-Benedict formula (revised).
+    Uses real gym/nutrition rules.
+    """
+    age = profile['age']
+    height = profile['height']
+    weight = profile['start_weight']
+    gender = profile['gender']
+    activity_level = profile['activity_level']
+
+    # Revised Harris-Benedict BMR Calculation
+    if gender == "Male":
+        bmr = 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
+    else: # Female
+        bmr = 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
+
+    # Activity Level Multiplier
+    if activity_level == "Sedentary (office job)":
+        multiplier = 1.2
+    elif activity_level == "Lightly Active (1-2 days/week)":
+        multiplier = 1.375
+    elif activity_level == "Moderately Active (3-5 days/week)":
+        multiplier = 1.55
+    else: # Very Active (6-7 days/week)
+        multiplier = 1.725
+    
+    tdee = bmr * multiplier
+    return int(tdee)
+
+def bmi_category(bmi):
+    """
+    Returns the (category, color) pair for a BMI value.
+    Based on the user-provided image.
+    """
+    if bmi < 18.5:
+        return "Underweight", "#007bff" # Blue
+    elif 18.5 <= bmi < 25:
+        return "Normal weight", "#28a745" # Green
+    elif 25 <= bmi < 30:
+        return "Overweight", "#ffc107" # Yellow/Gold
+    elif 30 <= bmi < 35:
+        return "Obese", "#fd7e14" # Orange
+    else: # bmi >= 35
+        return "Extremely Obese", "#dc3545" # Red
+
+def calculate_bmi_details(weight, height_cm):
+    """
+    Calculates BMI, determines the category, and assigns a color.
+    Based on the user-provided image.
+    """
+    if height_cm == 0:
+        return 0, "Unknown", "gray"
+        
+    height_m = height_cm / 100
+    bmi = weight / (height_m ** 2)
+    category, color = bmi_category(bmi)
+    return bmi, category, color
+
+NUTRITION_CACHE_SIZE = 4096 # Recent (tdee, goal, weight) plans kept; least recently used go first
+
+def get_initial_nutrition_plan(tdee, goal, weight):
+    """
+    Generates a structured nutrition plan based on TDEE and goal.
+    Uses real gym rules:
+    - Protein: 1.8g-2.2g per kg for muscle gain, 1.6g-2g for weight loss.
+    - Fats: 20-30% of total calories.
+    - Carbs: Remainder of calories.
+    Memoized; each call returns its own copy of the plan, which the
+    caller may change.
+    """
+    return dict(_build_nutrition_plan(tdee, goal, weight))
+
+@functools.lru_cache(maxsize=NUTRITION_CACHE_SIZE, typed=True)
+def _build_nutrition_plan(tdee, goal, weight):
+    """
+    get_initial_nutrition_plan's plan, shared by every member with the same
+    TDEE, goal and weight: never handed out, only copied.
+    """
+    plan = {
+        "calories_kcal": 0,
+        "protein_g": 0,
+        "fats_g": 0,
+        "carbs_g": 0,
+        "notes": ""
+    }
+
+    if goal == "Weight Reduction":
+        plan['calories_kcal'] = tdee - 400 # 400 kcal deficit
+        plan['protein_g'] = int(weight * 2.0)
+        plan['notes'] = "A 400-calorie deficit is aggressive but effective. Focus on hitting your protein target to maintain muscle while losing fat."
+    
+    elif goal == "Muscle Gain":
+        plan['calories_kcal'] = tdee + 300 # 300 kcal surplus
+        plan['protein_g'] = int(weight * 2.0)
+        plan['notes'] = "A 300-calorie surplus is a lean bulk. This, combined with high protein, will help you build muscle while minimizing fat gain."
+    
+    else: # General Fitness
+        plan['calories_kcal'] = tdee # Maintain weight
+        plan['protein_g'] = int(weight * 1.5)
+        plan['notes'] = "Eating at maintenance calories will fuel your workouts and help you recomp your body (build muscle and lose fat) over time."
+
+    # Calculate Fats (25% of total calories)
+    # 1g fat = 9 calories
+    plan['fats_g'] = int((plan['calories_kcal'] * 0.25) / 9)
+    
+    # Calculate Carbs (Remaining calories)
+    # 1g protein = 4 calories
+    # 1g carb = 4 calories
+    calories_from_protein_and_fats = (plan['protein_g'] * 4) + (plan['fats_g'] * 9)
+    remaining_calories = plan['calories_kcal'] - calories_from_protein_and_fats
+    plan['carbs_g'] = int(remaining_calories / 4)
+
+    return plan
+
+def adjust_nutrition_plan(plan, **deltas):
+    """
+    Returns a copy of a nutrition plan with the given amounts added,
+    e.g. adjust_nutrition_plan(plan, calories_kcal=150, carbs_g=38).
+    """
+    new_plan = dict(plan)
+    for key, delta in deltas.items():
+        new_plan[key] += delta
+    return new_plan
+
+def _build_workout_plan(goal, experience):
+    """
+    Generates a structured workout plan based on goal and experience.
+    Uses real gym rules:
+    - Beginners: Full Body 3x/week to learn form and build a base.
+    - Intermediate: PPL (Push-Pull-Legs) or Upper/Lower splits.
+    - Advanced: Higher frequency, more specialization.
+    - Rep Ranges: 6-10 for strength/hypertrophy, 10-15 for endurance.
+    """
+    # --- Plan for Beginners ---
+    if experience == "Beginner (0-1 years)":
+        plan = FULL_BODY
+
+    # --- Plan for Intermediates ---
+    elif experience == "Intermediate (1-3 years)":
+        if goal == "Muscle Gain":
+            plan = PUSH_PULL_LEGS
+        else: # Weight Reduction or General Fitness: 4-day Upper/Lower
+            plan = UPPER_LOWER
+
+    # --- Plan for Advanced ---
+    else: # Advanced (3+ years)
+        plan = BODY_PART_SPLIT
+
+    # Add cardio based on goal
+    if goal == "Weight Reduction":
+        plan = plan.with_note(" Add 3-4 cardio sessions (30-45 min) on rest days or after workouts.")
+    elif goal == "Muscle Gain":
+        plan = plan.with_note(" Keep cardio minimal (1-2 sessions, 20 min) to maximize recovery.")
+
+    return plan
+
+# The plan catalog: every goal x experience plan, built once at import and
+# shared by all members. Read-only, like the plans in it.
+WORKOUT_PLANS = MappingProxyType({
+    (goal, experience): _build_workout_plan(goal, experience)
+    for goal in GOALS
+    for experience in EXPERIENCE_LEVELS
+})
+
+def get_initial_workout_plan(goal, experience):
+    """
+    Returns the WorkoutPlan (see musclemap.workouts) for a goal and
+    experience level. Plans are immutable and shared, so this is a lookup.
+    """
+    plan = WORKOUT_PLANS.get((goal, experience))
+    return plan if plan is not None else _build_workout_plan(goal, experience)
+
+# --- AI Coach ---
+# The coaching rules are a decision table in coaching_rules.json (see
+# musclemap.rules), reloaded by the running app when the file changes.
+
+# The form fields the rules can look at, with their answers
+COACHING_FIELDS = {
+    "goal": GOALS,
+    "diet_adherence": DIET_ADHERENCE_OPTIONS,
+    "strength_progress": STRENGTH_OPTIONS,
+    "energy_levels": ENERGY_OPTIONS,
+    "sleep_quality": SLEEP_OPTIONS,
+}
+COACHING_RULES = RuleFile(COACHING_FIELDS)
+
+def _coaching_inputs(profile, progress):
+    """
+    The rules' inputs for a check-in: the form answers and the weight
+    change over this 1-week interval. That is the smoothed trend of the
+    member's weigh-ins when it has settled (see musclemap.trend), else the
+    difference from start_weight (the weight at the start of the week).
+    """
+    weight_change = progress.get('trend_kg_per_week')
+    if weight_change is None:
+        weight_change = progress['current_weight'] - profile['start_weight']
+    answers = {
+        "goal": profile['goal'],
+        "diet_adherence": progress['diet_adherence'],
+        "strength_progress": progress['strength_progress'],
+        "energy_levels": progress['energy_levels'],
+        "sleep_quality": progress['sleep_quality'],
+    }
+    return answers, weight_change
+
+def get_ai_recommendation(profile, progress, current_nutrition_plan, current_workout_plan, rules=None):
+    """
+    This is the "AI Coach" brain.
+    It analyzes the user's weekly check-in data (the 'progress' dict)
+    and makes an intelligent decision on how to adapt their plan.
+    `rules` is a RuleTable to coach with instead of the rules in force.
+    """
+    
+    # Copy-on-write: the current plans are never changed. A plan is only
+    # copied when the coach changes it; otherwise the same object is returned.
+    new_nutrition_plan = current_nutrition_plan
+    new_workout_plan = current_workout_plan
+    
+    answers, weight_change = _coaching_inputs(profile, progress)
+    
+    # This list will hold all the AI's feedback messages
+    feedback_log = []
+    
+    # --- AI Coaching Logic: one outcome per stage of the rule table ---
+    # 1. Confounders (adherence, sleep, energy): a real coach knows not to
+    #    change the plan if the user didn't follow it.
+    # 2. Weight change against the goal's target.
+    # 3. Strength progress (progressive overload).
+    rules = rules or COACHING_RULES.current()
+    for outcome in rules.decide(answers, weight_change):
+        for message in outcome.feedback:
+            feedback_log.append(message.format(change=weight_change, abs_change=abs(weight_change)))
+        if outcome.nutrition:
+            new_nutrition_plan = adjust_nutrition_plan(new_nutrition_plan, **outcome.nutrition)
+        if outcome.workout_note:
+            new_workout_plan = new_workout_plan.with_note(outcome.workout_note)
+        if outcome.rep_scheme:
+            new_workout_plan = new_workout_plan.with_rep_scheme(*outcome.rep_scheme)
+        
+    return new_nutrition_plan, new_workout_plan, feedback_log
+
+def adapt_maintenance(profile, progress, current_nutrition_plan, new_nutrition_plan, estimate, rules=None):
+    """
+    Learns the member's maintenance calories from their week (see
+    musclemap.tdee) and moves their nutrition plan with it: the coach's
+    `new_nutrition_plan` shifted by the change of their TDEE, split into
+    fats and carbs like get_initial_nutrition_plan splits calories. Every
+    earlier step of the coach stays in the plan; only the maintenance
+    under it moves. Nothing moves in a week the member did not stick to
+    their target, or when the coach (under `rules`, default the rules in
+    force) kept the plan the same with a final outcome: their TDEE is
+    caught up with at a later check-in. `current_nutrition_plan` is the
+    plan they ate to and `estimate` their tdee.Estimate, or None before
+    their first. Returns (tdee, nutrition plan, estimate, feedback messages).
+    """
+    feedback_log = []
+    if progress['diet_adherence'] not in ON_TARGET_ADHERENCE:
+        return profile['tdee'], new_nutrition_plan, estimate, feedback_log
+    weight_change = progress.get('trend_kg_per_week')
+    noise_std = tdee.TREND_NOISE_STD
+    if weight_change is None:
+        weight_change, noise_std = progress['current_weight'] - profile['start_weight'], tdee.RAW_NOISE_STD
+    estimate = tdee.observe(
+        estimate, calculate_tdee(profile), current_nutrition_plan['calories_kcal'], weight_change, noise_std,
+    )
+    rules = rules or COACHING_RULES.current()
+    if any(outcome.final for outcome in rules.decide(*_coaching_inputs(profile, progress))):
+        return profile['tdee'], new_nutrition_plan, estimate, feedback_log
+    # The formula's part follows the new weight, the learned offset stays
+    new_tdee = tdee.maintenance(estimate, calculate_tdee(dict(profile, start_weight=progress['current_weight'])))
+    change = new_tdee - profile['tdee']
+    if abs(change) < tdee.MIN_CHANGE_KCAL:
+        return profile['tdee'], new_nutrition_plan, estimate, feedback_log
+    feedback_log.append(
+        f"From your weigh-ins and intake, your maintenance is about **{new_tdee} kcal** a day "
+        f"({round(change):+d}). Your calorie target moves with it."
+    )
+    fats = int((change * 0.25) / 9) # 25% of the calories, as in get_initial_nutrition_plan
+    plan = adjust_nutrition_plan(
+        new_nutrition_plan, calories_kcal=change, fats_g=fats, carbs_g=int((change - fats * 9) / 4),
+    )
+    return new_tdee, plan, estimate, feedback_log
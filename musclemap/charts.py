@@ -0,0 +1,119 @@
+"""
+Chart data for the Dashboard.
+
+Long histories are downsampled with LTTB (Largest-Triangle-Three-Buckets),
+which keeps the points that best preserve the visual shape of the line.
+A multi-year history of daily weigh-ins then renders with a fixed number
+of points, so the payload sent to the browser stays bounded.
+"""
+
+import functools
+
+import numpy as np
+import plotly
+import plotly.graph_objects as go
+
+from musclemap.shared_cache import code_digest, default_cache
+
+MAX_CHART_POINTS = 500
+
+_EPOCH_ORDINAL = np.datetime64("1970-01-01", "D").astype(object).toordinal()
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indexes of the `n_out` points (first and last included)
+    that best preserve the shape of the line through (x, y).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges for the n - 2 middle points, split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # The third triangle point is the average of the next bucket
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _weight_points(history, start_date, max_points):
+    """
+    (dates, weights) of the starting weight on `start_date` and every
+    check-in, downsampled to at most `max_points`. Reads the history's
+    weight and date columns directly, without copying.
+    """
+    ordinals = np.empty(len(history) + 1, dtype=np.int64)
+    ordinals[0] = start_date.toordinal()
+    ordinals[1:] = np.frombuffer(history.dates, dtype=np.int64)
+    weights = np.empty(len(history) + 1, dtype=np.float64)
+    weights[0] = history.start_weights[0]
+    weights[1:] = np.frombuffer(history.weights, dtype=np.float64)
+
+    keep = lttb(ordinals, weights, max_points)
+    return (ordinals[keep] - _EPOCH_ORDINAL).astype("datetime64[D]"), weights[keep]
+
+
+@functools.lru_cache(maxsize=1)
+def _weight_figure_template():
+    """
+    The weight chart's static parts, built and validated once per host as
+    a plain figure dict (like the BMI gauge in musclemap.gauge).
+    """
+    return default_cache().get_or_build(
+        "weight_figure_template", _build_weight_figure_template,
+        version=f"{plotly.__version__}:{code_digest(_build_weight_figure_template)}",
+    )
+
+
+def _build_weight_figure_template():
+    fig = go.Figure(go.Scatter(mode="lines+markers", name="Weight (kg)", line_color="rgb(31, 119, 180)"))
+    fig.update_layout(
+        yaxis_title="Weight (kg)", height=350, margin=dict(l=10, r=10, t=10, b=10), hovermode="x unified",
+    )
+    return fig.to_dict()
+
+
+def weight_figure(history, start_date, max_points=MAX_CHART_POINTS):
+    """
+    The Dashboard's weight-over-time chart as a plotly figure dict: the
+    template with only the points filled in. Much cheaper to render than
+    st.line_chart, which builds and validates a new Altair chart each time.
+    """
+    dates, weights = _weight_points(history, start_date, max_points)
+    template = _weight_figure_template()
+    trace = dict(template['data'][0], x=dates.astype(str).tolist(), y=weights.tolist())
+    return {"data": [trace], "layout": template['layout']}
+
+
+def projection_figure(projection, start_date):
+    """
+    Percentile bands of a what-if projection (see musclemap.projection):
+    the median trajectory inside shaded 25-75% and 5-95% ranges.
+    """
+    dates = (start_date.toordinal() - _EPOCH_ORDINAL + 7 * projection.weeks).astype("datetime64[D]")
+    band = dict(zip(projection.percentiles, projection.bands))
+    fig = go.Figure()
+    for low, high, fill in ((5, 95, "rgba(31, 119, 180, 0.15)"), (25, 75, "rgba(31, 119, 180, 0.3)")):
+        fig.add_scatter(x=dates, y=band[high], line_width=0, showlegend=False, hoverinfo="skip")
+        fig.add_scatter(x=dates, y=band[low], line_width=0, fill="tonexty", fillcolor=fill, name=f"{low}-{high}%")
+    fig.add_scatter(x=dates, y=band[50], line_color="rgb(31, 119, 180)", name="Median")
+    fig.update_layout(yaxis_title="Weight (kg)", height=350, margin=dict(l=10, r=10, t=10, b=10))
+    return fig
@@ -0,0 +1,208 @@
+"""
+Batch "AI Coach".
+
+A columnar version of get_ai_recommendation (see musclemap.brain) for reviewing many
+weekly check-ins at once. It runs the same compiled rule table (see
+musclemap.rules): each stage is one NumPy gather over the whole table
+(answer codes -> key, weight change -> interval segment), so there is no
+per-member deepcopy or Python branching. Instead of message strings, each
+row gets the outcome picked by each stage; feedback_messages() turns them
+back into the exact messages the per-user function writes.
+
+Run it from the command line to stream a CSV of check-ins:
+    python -m musclemap.coach checkins.csv results.csv
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from musclemap.brain import (
+    COACHING_RULES, DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, GOALS, SLEEP_OPTIONS, STRENGTH_OPTIONS,
+)
+from musclemap.cohort import option_codes
+from musclemap.rules import NUTRITION_KEYS
+
+# Goal codes (indexes into GOALS)
+WEIGHT_REDUCTION, MUSCLE_GAIN, GENERAL_FITNESS = 0, 1, 2
+
+
+class _RuleArrays:
+    """
+    A RuleTable's stages and outcomes as NumPy arrays. Outcome index -1
+    (nothing decided) picks the extra last row, which changes nothing.
+    """
+
+    def __init__(self, rules):
+        self.tables = [np.array(stage.table, dtype=np.int16) for stage in rules.stages]
+        self.ends = [np.array(stage.ends, dtype=np.float64) for stage in rules.stages]
+        outcomes = rules.outcomes
+        self.deltas = np.array(
+            [[outcome.nutrition.get(key, 0) for key in NUTRITION_KEYS] for outcome in outcomes] + [[0] * len(NUTRITION_KEYS)],
+            dtype=np.int64,
+        ).reshape(-1, len(NUTRITION_KEYS))
+        self.final = np.array([outcome.final for outcome in outcomes] + [False])
+        self.notes = np.array([outcome.workout_note for outcome in outcomes] + [""], dtype=object)
+        self.rep_scheme = np.array([outcome.rep_scheme is not None for outcome in outcomes] + [False])
+
+
+def rule_arrays(rules):
+    """
+    The NumPy form of a compiled RuleTable, built once per table.
+    """
+    arrays = rules.cache.get("coach")
+    if arrays is None:
+        arrays = rules.cache["coach"] = _RuleArrays(rules)
+    return arrays
+
+
+def coach_codes(goal, weight_change, adherence, strength, energy, sleep, rules=None):
+    """
+    The coaching rules on integer-coded NumPy arrays (indexes into the form
+    options; any other value is len(options)). Returns the outcome index
+    per check-in and stage, shape (n, stages): -1 where the stage decided
+    nothing or was skipped after a final outcome.
+    """
+    rules = rules or COACHING_RULES.current()
+    arrays = rule_arrays(rules)
+    codes = {
+        "goal": goal, "diet_adherence": adherence, "strength_progress": strength,
+        "energy_levels": energy, "sleep_quality": sleep,
+    }
+    weight_change = np.asarray(weight_change, dtype=np.float64)
+    n = weight_change.shape[0]
+    outcomes = np.full((n, len(rules.stages)), -1, dtype=np.int16)
+    done = np.zeros(n, dtype=bool)
+
+    for s, (stage, table, ends) in enumerate(zip(rules.stages, arrays.tables, arrays.ends)):
+        key = np.zeros(n, dtype=np.int64)
+        for field, radix in zip(stage.fields, stage.radixes):
+            key = key * radix + np.asarray(codes[field], dtype=np.int64)
+        # Same segments as musclemap.rules.weight_segment: odd ones are exactly on an end
+        i = np.searchsorted(ends, weight_change, side="left")
+        segment = 2 * i
+        if len(ends):
+            segment += ends[np.minimum(i, len(ends) - 1)] == weight_change
+        decided = table[key * (2 * len(ends) + 1) + segment]
+        outcomes[:, s] = np.where(done, -1, decided)
+        done |= arrays.final[outcomes[:, s]]
+    return outcomes
+
+
+def nutrition_deltas(outcomes, rules=None):
+    """
+    The total change to each NUTRITION_KEYS amount per check-in, shape (n, 4).
+    """
+    return rule_arrays(rules or COACHING_RULES.current()).deltas[outcomes].sum(axis=1)
+
+
+def evaluate_checkins(checkins, rules=None):
+    """
+    Batch get_ai_recommendation.
+    Takes a DataFrame with one check-in per row and these columns:
+      - profile: goal, start_weight
+      - progress: current_weight, diet_adherence, strength_progress,
+        energy_levels, sleep_quality
+      - current nutrition plan: calories_kcal, protein_g, fats_g, carbs_g
+      - optionally trend_kg_per_week: the smoothed weight trend, used
+        instead of the weight difference where it is set
+    Returns a DataFrame with the updated plan columns, weight_change, an
+    outcome_<stage> column per rule stage (the outcome's name, or empty),
+    workout_note (the text appended to the workout notes) and
+    rep_scheme_change.
+    """
+    rules = rules or COACHING_RULES.current()
+    arrays = rule_arrays(rules)
+    weight_change = (checkins['current_weight'] - checkins['start_weight']).to_numpy(dtype=np.float64)
+    if 'trend_kg_per_week' in checkins:
+        trend = checkins['trend_kg_per_week'].to_numpy(dtype=np.float64)
+        weight_change = np.where(np.isnan(trend), weight_change, trend)
+    outcomes = coach_codes(
+        option_codes(checkins['goal'], GOALS, len(GOALS)),
+        weight_change,
+        option_codes(checkins['diet_adherence'], DIET_ADHERENCE_OPTIONS, len(DIET_ADHERENCE_OPTIONS)),
+        option_codes(checkins['strength_progress'], STRENGTH_OPTIONS, len(STRENGTH_OPTIONS)),
+        option_codes(checkins['energy_levels'], ENERGY_OPTIONS, len(ENERGY_OPTIONS)),
+        option_codes(checkins['sleep_quality'], SLEEP_OPTIONS, len(SLEEP_OPTIONS)),
+        rules,
+    )
+    deltas = arrays.deltas[outcomes].sum(axis=1)
+
+    # Only a few outcome combinations occur, so the notes are built per
+    # combination (numbered in base len(outcomes) + 1, with -1 as digit 0)
+    base = len(rules.outcomes) + 1
+    combination = ((outcomes.astype(np.int64) + 1) * base ** np.arange(outcomes.shape[1])).sum(axis=1)
+    present = np.flatnonzero(np.bincount(combination))
+    notes = ["".join(arrays.notes[(c // base ** np.arange(outcomes.shape[1])) % base - 1]) for c in present]
+    categories = sorted(set(notes))
+    note_codes = np.zeros(present[-1] + 1 if len(present) else 1, dtype=np.int64)
+    note_codes[present] = [categories.index(note) for note in notes]
+    names = [outcome.name for outcome in rules.outcomes]
+
+    results = {
+        key: checkins[key].to_numpy() + deltas[:, k] for k, key in enumerate(NUTRITION_KEYS)
+    }
+    results["weight_change"] = weight_change
+    for s, stage in enumerate(rules.stages):
+        results[f"outcome_{stage.name}"] = pd.Categorical.from_codes(outcomes[:, s], names)
+    results["workout_note"] = pd.Categorical.from_codes(note_codes[combination], categories)
+    results["rep_scheme_change"] = arrays.rep_scheme[outcomes].any(axis=1)
+    return pd.DataFrame(results, index=checkins.index)
+
+
+def feedback_messages(outcomes, weight_change, rules=None):
+    """
+    Rebuilds the feedback_log list that get_ai_recommendation returns from
+    one check-in's outcome indexes (a row of coach_codes).
+    """
+    rules = rules or COACHING_RULES.current()
+    return [
+        text.format(change=weight_change, abs_change=abs(weight_change))
+        for index in outcomes if index >= 0
+        for text in rules.outcomes[index].feedback
+    ]
+
+
+# --- Command line: stream a CSV of check-ins through the batch coach ---
+
+def _with_messages(results, rules):
+    columns = [results[f"outcome_{stage.name}"].cat.codes.to_numpy() for stage in rules.stages]
+    results['feedback'] = [
+        "\n".join(feedback_messages(outcomes, w, rules))
+        for outcomes, w in zip(zip(*columns), results['weight_change'])
+    ]
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the AI Coach over a CSV of weekly check-ins.")
+    parser.add_argument("input", help="check-ins CSV ('-' for stdin)")
+    parser.add_argument("output", help="results CSV ('-' for stdout)")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="rows per chunk (default: 100000)")
+    parser.add_argument("--messages", action="store_true", help="also write the rendered feedback text")
+    parser.add_argument("--keep", nargs="*", default=[], help="input columns to copy to the output (e.g. a member id)")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else args.input
+    target = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    rows = 0
+    try:
+        for i, chunk in enumerate(pd.read_csv(source, chunksize=args.chunksize)):
+            rules = COACHING_RULES.current() # The same rules for a chunk's results and messages
+            results = evaluate_checkins(chunk, rules)
+            if args.messages:
+                results = _with_messages(results, rules)
+            if args.keep:
+                results = pd.concat([chunk[args.keep], results], axis=1)
+            results.to_csv(target, header=(i == 0), index=False)
+            rows += len(results)
+    finally:
+        if target is not sys.stdout:
+            target.close()
+    print(f"Coached {rows} check-ins.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Vectorized cohort onboarding.
+
+Batch versions of calculate_tdee, calculate_bmi_details and
+get_initial_nutrition_plan (see musclemap.brain). They take a pandas DataFrame of
+profiles and compute every row in one pass with NumPy instead of calling
+the scalar functions in a Python loop. The arithmetic is done in the same
+order as the scalar functions, so the results are identical number for number.
+update_trends_batch and weekly_change_batch do the same for
+musclemap.trend's weigh-in update and weekly change, and refit_tdee_batch refits musclemap.tdee's learned TDEE from whole
+check-in histories.
+"""
+
+import numpy as np
+import pandas as pd
+
+from musclemap import tdee
+from musclemap.brain import ACTIVITY_LEVELS, GOALS, ON_TARGET_ADHERENCE
+from musclemap.trend import SETTLED_STD_KG_PER_WEEK, SLOPE_CHANGE, SLOPE_PRIOR_STD, WEIGH_IN_NOISE_KG, Trend
+
+# --- Rule tables (same values as the if/elif chains in musclemap.brain) ---
+
+# Revised Harris-Benedict coefficients: (constant, weight, height, age)
+BMR_MALE = (88.362, 13.397, 4.799, 5.677)
+BMR_FEMALE = (447.593, 9.247, 3.098, 4.330)
+
+ACTIVITY_MULTIPLIERS = np.array([1.2, 1.375, 1.55, 1.725]) # In ACTIVITY_LEVELS order
+DEFAULT_ACTIVITY = 3 # The scalar 'else' branch (Very Active)
+
+# BMI bins: a value goes into the first bin whose upper edge it is below
+BMI_EDGES = np.array([18.5, 25, 30, 35])
+BMI_CATEGORIES = ["Underweight", "Normal weight", "Overweight", "Obese", "Extremely Obese", "Unknown"]
+BMI_COLORS = ["#007bff", "#28a745", "#ffc107", "#fd7e14", "#dc3545", "gray"]
+BMI_UNKNOWN = 5 # Index of the "Unknown"/"gray" entry (height of 0)
+
+# Goal (in GOALS order) -> calorie offset, protein g per kg, notes
+GOAL_CALORIE_OFFSETS = np.array([-400, 300, 0])
+GOAL_PROTEIN_PER_KG = np.array([2.0, 2.0, 1.5])
+GOAL_NOTES = [
+    "A 400-calorie deficit is aggressive but effective. Focus on hitting your protein target to maintain muscle while losing fat.",
+    "A 300-calorie surplus is a lean bulk. This, combined with high protein, will help you build muscle while minimizing fat gain.",
+    "Eating at maintenance calories will fuel your workouts and help you recomp your body (build muscle and lose fat) over time.",
+]
+DEFAULT_GOAL = 2 # Anything unrecognised is treated as General Fitness
+
+
+def _to_int(values):
+    """
+    Truncates towards zero, exactly like Python's int() on a float.
+    """
+    return np.trunc(values).astype(np.int64)
+
+
+def option_codes(values, options, default):
+    """
+    Maps option strings to their index in `options`.
+    Anything not in the list gets `default`, like the final 'else' branches.
+    """
+    codes = pd.Categorical(values, categories=options).codes.astype(np.int8)
+    codes[codes == -1] = default
+    return codes
+
+
+def goal_codes(goal):
+    """
+    Maps goal strings to indexes into GOALS.
+    """
+    return option_codes(goal, GOALS, DEFAULT_GOAL)
+
+
+def calculate_tdee_batch(profiles):
+    """
+    Vectorized calculate_tdee.
+    Needs the columns: age, height, start_weight, gender, activity_level.
+    Returns an int64 Series aligned with the profiles.
+    """
+    age = profiles['age'].to_numpy(dtype=np.float64)
+    height = profiles['height'].to_numpy(dtype=np.float64)
+    weight = profiles['start_weight'].to_numpy(dtype=np.float64)
+    is_male = (profiles['gender'] == "Male").to_numpy()
+
+    # Same operation order as the scalar formula, so floats round identically
+    male_bmr = BMR_MALE[0] + (BMR_MALE[1] * weight) + (BMR_MALE[2] * height) - (BMR_MALE[3] * age)
+    female_bmr = BMR_FEMALE[0] + (BMR_FEMALE[1] * weight) + (BMR_FEMALE[2] * height) - (BMR_FEMALE[3] * age)
+    bmr = np.where(is_male, male_bmr, female_bmr)
+
+    multiplier = ACTIVITY_MULTIPLIERS[option_codes(profiles['activity_level'], ACTIVITY_LEVELS, DEFAULT_ACTIVITY)]
+
+    return pd.Series(_to_int(bmr * multiplier), index=profiles.index, name="tdee")
+
+
+def calculate_bmi_details_batch(weight, height_cm):
+    """
+    Vectorized calculate_bmi_details.
+    Takes array-likes of weights (kg) and heights (cm) and returns a DataFrame
+    with the columns bmi, bmi_category and bmi_color. Category and color are
+    pandas Categoricals, so a million rows cost one byte each.
+    """
+    index = weight.index if isinstance(weight, pd.Series) else None
+    weight = np.asarray(weight, dtype=np.float64)
+    height_cm = np.asarray(height_cm, dtype=np.float64)
+
+    unknown = height_cm == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        height_m = height_cm / 100
+        bmi = weight / (height_m ** 2)
+    bmi[unknown] = 0
+
+    # side="right" puts 18.5 in "Normal weight", matching the `18.5 <= bmi` checks.
+    # NaN sorts last, which is the scalar 'else' branch (Extremely Obese).
+    codes = np.searchsorted(BMI_EDGES, bmi, side="right").astype(np.int8)
+    codes[unknown] = BMI_UNKNOWN
+
+    return pd.DataFrame({
+        "bmi": bmi,
+        "bmi_category": pd.Categorical.from_codes(codes, BMI_CATEGORIES),
+        "bmi_color": pd.Categorical.from_codes(codes, BMI_COLORS),
+    }, index=index)
+
+
+def get_initial_nutrition_plan_batch(tdee, goal, weight):
+    """
+    Vectorized get_initial_nutrition_plan.
+    Returns a DataFrame with the columns calories_kcal, protein_g, fats_g,
+    carbs_g and notes (one row per plan).
+    """
+    index = tdee.index if isinstance(tdee, pd.Series) else None
+    tdee = np.asarray(tdee, dtype=np.int64)
+    weight = np.asarray(weight, dtype=np.float64)
+    codes = goal_codes(goal)
+
+    calories = tdee + GOAL_CALORIE_OFFSETS[codes]
+    protein = _to_int(weight * GOAL_PROTEIN_PER_KG[codes])
+
+    # Fats: 25% of total calories (1g fat = 9 calories)
+    fats = _to_int((calories * 0.25) / 9)
+
+    # Carbs: remaining calories (1g protein/carb = 4 calories)
+    calories_from_protein_and_fats = (protein * 4) + (fats * 9)
+    remaining_calories = calories - calories_from_protein_and_fats
+    carbs = _to_int(remaining_calories / 4)
+
+    return pd.DataFrame({
+        "calories_kcal": calories,
+        "protein_g": protein,
+        "fats_g": fats,
+        "carbs_g": carbs,
+        "notes": pd.Categorical.from_codes(codes, GOAL_NOTES),
+    }, index=index)
+
+
+def update_trends_batch(trends, day, weight, replaces=None):
+    """
+    Vectorized musclemap.trend.update: one weigh-in per row.
+    `trends` is a DataFrame with the Trend fields as columns, where
+    weigh_ins == 0 means the member has no trend yet. `replaces` is the
+    replaced same-day weight per row (NaN for none). Returns the updated
+    trends as a new DataFrame with the same index.
+    """
+    day = np.asarray(day, dtype=np.int64)
+    weight = np.asarray(weight, dtype=np.float64)
+    old = {field: trends[field].to_numpy() for field in Trend._fields}
+    dt = day - old['day']
+
+    # Same operations and order as trend.update
+    level = old['level'] + dt * old['slope']
+    p00 = old['p00'] + 2 * dt * old['p01'] + dt * dt * old['p11'] + SLOPE_CHANGE * dt ** 3 / 3
+    p01 = old['p01'] + dt * old['p11'] + SLOPE_CHANGE * dt * dt / 2
+    p11 = old['p11'] + SLOPE_CHANGE * dt
+    s = p00 + WEIGH_IN_NOISE_KG ** 2
+    k0, k1 = p00 / s, p01 / s
+    residual = weight - level
+    new = {
+        "day": day, "level": level + k0 * residual, "slope": old['slope'] + k1 * residual,
+        "p00": (1 - k0) * p00, "p01": (1 - k0) * p01, "p11": p11 - k1 * p01, "weigh_ins": old['weigh_ins'] + 1,
+    }
+    first = old['weigh_ins'] == 0 # trend.start
+    starts = {
+        "day": day, "level": weight, "slope": 0.0, "p00": WEIGH_IN_NOISE_KG ** 2, "p01": 0.0,
+        "p11": SLOPE_PRIOR_STD ** 2, "weigh_ins": 1,
+    }
+    older = (dt < 0) & ~first # Ignored, like the scalar update
+    if replaces is not None:
+        replaces = np.asarray(replaces, dtype=np.float64)
+        swapped = (dt == 0) & ~np.isnan(replaces) & ~first
+        change = np.where(swapped, weight - replaces, 0.0) / WEIGH_IN_NOISE_KG ** 2
+        new['level'] = np.where(swapped, old['level'] + old['p00'] * change, new['level'])
+        new['slope'] = np.where(swapped, old['slope'] + old['p01'] * change, new['slope'])
+        for field in ("day", "p00", "p01", "p11", "weigh_ins"):
+            new[field] = np.where(swapped, old[field], new[field])
+    return pd.DataFrame({
+        field: np.where(first, starts[field], np.where(older, old[field], new[field])) for field in Trend._fields
+    }, index=trends.index)
+
+
+def weekly_change_batch(trends):
+    """
+    Vectorized musclemap.trend.weekly_change over a DataFrame of trends
+    (as update_trends_batch returns): kg per week, NaN where it is None.
+    """
+    settled = (trends['weigh_ins'].to_numpy() >= 2) & (np.sqrt(trends['p11'].to_numpy()) * 7 <= SETTLED_STD_KG_PER_WEEK)
+    return np.where(settled, trends['slope'].to_numpy() * 7, np.nan)
+
+
+def refit_tdee_batch(checkins):
+    """
+    The tdee.Estimate that feeding every check-in to tdee.observe (as
+    adapt_maintenance does) ends with, for many members at once. The
+    forgetting-factor recursion has a closed form: each week's residual is
+    weighted by FORGETTING ** (weeks after it) / its noise variance. So a
+    whole history is one weighted sum per member, with no loop over weeks.
+    Takes a DataFrame with one check-in per row, each member's in week
+    order, and the columns:
+      - profile: user_id, age, gender, activity_level, height, start_weight
+        (the weight at the start of the week)
+      - progress: current_weight, diet_adherence
+      - calories_kcal: the calorie target the member ate to that week
+      - optionally trend_kg_per_week, used where it is set
+    Returns a DataFrame indexed by user_id with the Estimate fields and
+    tdee, the learned maintenance at the member's last weight. The
+    estimates match the incremental ones to floating-point rounding.
+    """
+    weight_change = (checkins['current_weight'] - checkins['start_weight']).to_numpy(dtype=np.float64)
+    variance = np.full(len(checkins), float(tdee.RAW_NOISE_STD ** 2))
+    if 'trend_kg_per_week' in checkins:
+        trend = checkins['trend_kg_per_week'].to_numpy(dtype=np.float64)
+        settled = ~np.isnan(trend)
+        weight_change = np.where(settled, trend, weight_change)
+        variance[settled] = tdee.TREND_NOISE_STD ** 2
+    residual = (
+        checkins['calories_kcal'].to_numpy(dtype=np.float64) - weight_change * tdee.KCAL_PER_KG / 7
+        - calculate_tdee_batch(checkins).to_numpy()
+    )
+
+    observed = checkins['diet_adherence'].isin(ON_TARGET_ADHERENCE).to_numpy()
+    users = checkins['user_id'][observed]
+    later = users.groupby(users, sort=False).cumcount(ascending=False).to_numpy() # Observations after each one
+    weight = tdee.FORGETTING ** later / variance[observed]
+    sums = pd.DataFrame({
+        "information": weight, "weighted": weight * residual[observed], "weeks": 1,
+    }, index=users.to_numpy()).groupby(level=0, sort=False).sum()
+
+    last = checkins.groupby("user_id", sort=False).tail(1)
+    estimates = pd.DataFrame(index=pd.Index(last['user_id'].to_numpy(), name="user_id"))
+    sums = sums.reindex(estimates.index)
+    weeks = sums['weeks'].fillna(0).astype(np.int64).to_numpy()
+    information = tdee.FORGETTING ** weeks / tdee.PRIOR.variance + sums['information'].fillna(0).to_numpy()
+    estimates['offset'] = sums['weighted'].fillna(0).to_numpy() / information
+    estimates['variance'] = 1 / information
+    estimates['weeks'] = weeks
+    formula = calculate_tdee_batch(last.assign(start_weight=last['current_weight'])).to_numpy()
+    estimates['tdee'] = np.round(formula + estimates['offset'].to_numpy()).astype(np.int64)
+    return estimates
+
+
+def onboard_cohort(profiles):
+    """
+    Runs the whole onboarding step for a cohort in one vectorized pass.
+    Takes a DataFrame with one profile per row (the same keys as the
+    onboarding form) and returns it with tdee, bmi, bmi_category, bmi_color
+    and the nutrition plan columns added.
+    """
+    tdee = calculate_tdee_batch(profiles)
+    bmi = calculate_bmi_details_batch(profiles['start_weight'], profiles['height'])
+    nutrition = get_initial_nutrition_plan_batch(tdee, profiles['goal'], profiles['start_weight'])
+    return pd.concat([profiles, tdee, bmi, nutrition], axis=1)
+
+
+def read_roster(path, chunksize=None):
+    """
+    Loads a roster CSV with the dtypes onboard_cohort expects.
+    With a chunksize this returns an iterator of DataFrames instead.
+    """
+    dtypes = {
+        "age": "int64",
+        "height": "float64",
+        "start_weight": "float64",
+        "gender": "category",
+        "activity_level": "category",
+        "goal": "category",
+        "experience_level": "category",
+    }
+    return pd.read_csv(path, dtype=dtypes, chunksize=chunksize)
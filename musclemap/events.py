@@ -0,0 +1,256 @@
+"""
+Event-sourced member state.
+
+Every onboarding and check-in is kept as an immutable event (the events
+table, written by musclemap.store in the same transaction as the rest of
+the submit), and a member's profile and plans are a fold over them:
+
+    onboarding  the form -> TDEE, BMI and the first plans
+                (calculate_tdee, get_initial_nutrition_plan, ...)
+    checkin     get_ai_recommendation and adapt_maintenance (the learned
+                TDEE), then the profile moves on to the new weight and week
+    weigh_in    an imported check-in: the profile moves on, the plans
+                stay as they were (imports are not coached)
+
+So any member's state can be rebuilt, and their history re-run under a
+different rule set. A replay saves a snapshot of the state every
+SNAPSHOT_EVERY events, keyed by the rule set's digest (see
+musclemap.rules) and SNAPSHOT_VERSION, and the next rebuild under the same
+rules starts from the latest one: a member three years in replays only
+the last few weeks.
+
+    python -m musclemap.events backfill
+    python -m musclemap.events rebuild <user_id> [--rules rules.json]
+    python -m musclemap.events recoach --rules new_rules.json --output changes.csv --workers 4
+
+`backfill` writes the events of members saved before there was an event
+log. `recoach` replays every member under a rule set across a process
+pool and reports whose plans would come out different from their current
+ones. It only writes snapshots, never the members' live plans.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import functools
+import json
+import sys
+from collections import namedtuple
+
+from musclemap.brain import (
+    COACHING_FIELDS, COACHING_RULES, adapt_maintenance, calculate_bmi_details, calculate_tdee,
+    get_ai_recommendation, get_initial_nutrition_plan, get_initial_workout_plan,
+)
+from musclemap.rules import DEFAULT_PATH as DEFAULT_RULES_PATH, load_rules
+from musclemap.store import DEFAULT_DB_PATH, Store
+from musclemap.tdee import Estimate
+from musclemap.workouts import WorkoutPlan
+
+SNAPSHOT_EVERY = 12 # Events (weeks of check-ins) between snapshots
+SNAPSHOT_VERSION = 3 # Part of the snapshots' key; bump it when apply() changes so older ones are not resumed from
+RECOACH_CHUNK = 200 # Members per worker task
+
+NUTRITION_FIELDS = ["calories_kcal", "protein_g", "fats_g", "carbs_g"]
+
+State = namedtuple("State", ["profile", "nutrition_plan", "workout_plan", "tdee_estimate"], defaults=[None])
+State.__doc__ = """
+A member's state after some of their events: the profile as the Dashboard
+shows it, the plans in force and their learned TDEE (a tdee.Estimate, None
+before their first check-in).
+"""
+
+
+def _to_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+# --- Transitions ---
+
+def onboard(form):
+    """
+    What the Onboarding submit does: metrics plus the first plans.
+    """
+    profile = dict(form, plan_start_date=_to_date(form['plan_start_date']))
+    profile['tdee'] = calculate_tdee(profile)
+    profile['bmi'], profile['bmi_category'], profile['bmi_color'] = calculate_bmi_details(profile['start_weight'], profile['height'])
+    return State(
+        profile,
+        get_initial_nutrition_plan(profile['tdee'], profile['goal'], profile['start_weight']),
+        get_initial_workout_plan(profile['goal'], profile['experience_level']),
+    )
+
+
+def _moved_on(profile, progress_log):
+    """
+    The profile for the week after a check-in: its weight, week and BMI.
+    """
+    profile = dict(profile, start_weight=progress_log['current_weight'], weeks_on_plan=progress_log['week_number'])
+    profile['bmi'], profile['bmi_category'], profile['bmi_color'] = calculate_bmi_details(profile['start_weight'], profile['height'])
+    return profile
+
+
+def apply(state, kind, data, rules=None):
+    """
+    The state after one event, with `data` as stored. Check-ins are
+    coached with `rules` (default: the rules in force).
+    """
+    if kind == "onboarding":
+        return onboard(data)
+    progress_log = dict(data, date=_to_date(data['date']))
+    profile, nutrition_plan, workout_plan, estimate = state
+    if kind == "weigh_in" and progress_log['week_number'] < profile['weeks_on_plan']:
+        return state # Like the import, an older week never moves the profile back
+    if kind == "checkin":
+        nutrition_plan, workout_plan, _ = get_ai_recommendation(
+            profile, progress_log, nutrition_plan, workout_plan, rules,
+        )
+        tdee, nutrition_plan, estimate, _ = adapt_maintenance(
+            profile, progress_log, state.nutrition_plan, nutrition_plan, estimate, rules,
+        )
+        profile = dict(profile, tdee=tdee)
+    return State(_moved_on(profile, progress_log), nutrition_plan, workout_plan, estimate)
+
+
+# --- Snapshots ---
+
+def _dump(state):
+    return json.dumps({
+        "profile": dict(state.profile, plan_start_date=state.profile['plan_start_date'].isoformat()),
+        "nutrition_plan": state.nutrition_plan,
+        "workout_plan": state.workout_plan.to_dict(),
+        "tdee_estimate": state.tdee_estimate,
+    })
+
+
+def _load(snapshot):
+    return State(
+        dict(snapshot['profile'], plan_start_date=_to_date(snapshot['profile']['plan_start_date'])),
+        snapshot['nutrition_plan'],
+        WorkoutPlan.from_dict(snapshot['workout_plan']),
+        None if snapshot.get('tdee_estimate') is None else Estimate(*snapshot['tdee_estimate']),
+    )
+
+
+# --- Replay ---
+
+def replay(store, user_id, rules, snapshot_every=SNAPSHOT_EVERY):
+    """
+    Rebuilds a member's state under `rules` (a RuleTable) from their
+    latest snapshot under it and the events since. Returns (state, events
+    replayed, new snapshot rows for Store.save_snapshots), or None for a
+    member without events.
+    """
+    key = f"{rules.digest}.{SNAPSHOT_VERSION}"
+    snapshot = store.load_snapshot(user_id, key)
+    seq, state = (-1, None) if snapshot is None else (snapshot[0], _load(snapshot[1]))
+    events = store.load_events(user_id, after=seq)
+    if state is None and not events:
+        return None
+    snapshots, last = [], max(seq, 0)
+    for seq, kind, data in events:
+        state = apply(state, kind, data, rules)
+        if seq >= last + snapshot_every:
+            snapshots.append((user_id, key, seq, _dump(state)))
+            last = seq
+    return state, len(events), snapshots
+
+
+def rebuild(store, user_id, rules=None):
+    """
+    A member's State rebuilt from their events (under `rules`, default the
+    rules in force), saving any new snapshots. None for an unknown member.
+    """
+    replayed = replay(store, user_id, rules or COACHING_RULES.current())
+    if replayed is None:
+        return None
+    state, _, snapshots = replayed
+    if snapshots:
+        store.save_snapshots(snapshots)
+    return state
+
+
+@functools.lru_cache(maxsize=None)
+def _worker_setup(db_path, rules_path):
+    """
+    One store connection and compiled rule set per worker process.
+    """
+    return Store(db_path), load_rules(rules_path, COACHING_FIELDS)
+
+
+def _recoach_chunk(args):
+    db_path, rules_path, user_ids = args
+    store, rules = _worker_setup(db_path, rules_path)
+    results, snapshots = [], []
+    for user_id in user_ids:
+        replayed = replay(store, user_id, rules)
+        if replayed is None:
+            continue
+        state, events, new_snapshots = replayed
+        snapshots += new_snapshots
+        live = store.load_session(user_id)
+        changed = live is None or (live[1], live[2]) != (state.nutrition_plan, state.workout_plan)
+        results.append((user_id, state.profile['weeks_on_plan'], events, changed, state.nutrition_plan))
+    store.save_snapshots(snapshots)
+    return results
+
+
+def recoach(db_path, rules_path, workers=None, chunksize=RECOACH_CHUNK):
+    """
+    Replays every member under the rules file at `rules_path`, `chunksize`
+    members per task across `workers` processes (default: one per core;
+    1 runs in this process). Yields (user_id, weeks_on_plan, events
+    replayed, changed, nutrition_plan) per member, where `changed` means
+    the replayed plans differ from the member's current ones.
+    """
+    user_ids = Store(db_path).user_ids()
+    jobs = [(db_path, rules_path, user_ids[i:i + chunksize]) for i in range(0, len(user_ids), chunksize)]
+    if workers == 1:
+        for job in jobs:
+            yield from _recoach_chunk(job)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for results in pool.map(_recoach_chunk, jobs):
+            yield from results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild members from their event logs.")
+    parser.add_argument("command", choices=["backfill", "rebuild", "recoach"])
+    parser.add_argument("user_id", nargs="?", help="rebuild: the member to rebuild")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file (default: $MUSCLEMAP_DB or musclemap.db)")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help="rules file to coach with (default: the rules in force)")
+    parser.add_argument("--workers", type=int, default=None, help="recoach: worker processes (default: one per core)")
+    parser.add_argument("--output", help="recoach: write one CSV row per member here")
+    args = parser.parse_args(argv)
+
+    store = Store(args.db)
+    if args.command == "backfill":
+        print(f"Backfilled the events of {store.backfill_events()} members.", file=sys.stderr)
+    elif args.command == "rebuild":
+        if not args.user_id:
+            parser.error("rebuild needs a user_id")
+        state = rebuild(store, args.user_id, load_rules(args.rules, COACHING_FIELDS))
+        if state is None:
+            parser.exit(1, f"No events for member {args.user_id}\n")
+        print(_dump(state))
+    else:
+        members = events = changed = 0
+        out = open(args.output, "w", newline="", encoding="utf-8") if args.output else None
+        try:
+            writer = csv.writer(out) if out else None
+            if writer:
+                writer.writerow(["user_id", "weeks_on_plan", "events_replayed", "changed", *NUTRITION_FIELDS])
+            for user_id, weeks, replayed, differs, nutrition_plan in recoach(args.db, args.rules, args.workers):
+                members, events, changed = members + 1, events + replayed, changed + differs
+                if writer:
+                    writer.writerow([user_id, weeks, replayed, int(differs), *(nutrition_plan[f] for f in NUTRITION_FIELDS)])
+        finally:
+            if out:
+                out.close()
+        print(f"Re-coached {members} members ({events} events replayed); {changed} would get different plans.",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
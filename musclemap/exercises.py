@@ -0,0 +1,157 @@
+"""
+The exercise library.
+
+What each exercise in the plans works and needs, from a JSON file
+(exercise_library.json next to this module, or the file named by
+MUSCLEMAP_EXERCISES):
+
+    {"name": "Romanian Deadlift", "pattern": "hinge", "equipment": "barbell",
+     "muscles": ["hamstrings", "glutes", "lower_back"], "aliases": ["RDL"]}
+
+muscles are listed primary first. The library keeps an inverted index per
+attribute (muscle, movement pattern, equipment -> exercise ids, in file
+order) and one per (pattern, primary muscle) for swaps, so a lookup only
+walks the exercises that could match, however big the library is:
+
+    library = default_library()
+    library.get("RDL").muscles                          # by name or alias
+    library.find(muscle="hamstrings", equipment="dumbbell")
+    library.swaps("Barbell Row", equipment={"dumbbell", "cable"})
+
+A swap is an exercise with the same movement pattern and primary muscle,
+suggested in file order. Only the standard library is used.
+"""
+
+import functools
+import heapq
+import json
+import os
+from collections import namedtuple
+
+DEFAULT_PATH = os.environ.get("MUSCLEMAP_EXERCISES", os.path.join(os.path.dirname(__file__), "exercise_library.json"))
+
+ATTRIBUTES = ["muscle", "pattern", "equipment"]
+
+ExerciseInfo = namedtuple("ExerciseInfo", ["name", "pattern", "equipment", "muscles", "aliases"])
+ExerciseInfo.__doc__ = """
+One exercise in the library. muscles is a tuple, primary muscle first.
+"""
+
+
+def _key(name):
+    return " ".join(name.casefold().split())
+
+
+class ExerciseLibrary:
+    """
+    An immutable, indexed set of exercises. Build it once and share it:
+    every lookup only reads the indexes.
+    """
+
+    def __init__(self, exercises):
+        self.exercises = tuple(exercises)
+        self._ids = {} # Name or alias (case- and space-insensitive) -> id
+        index = {attribute: {} for attribute in ATTRIBUTES}
+        swaps = {}
+        for i, exercise in enumerate(self.exercises):
+            for name in (exercise.name, *exercise.aliases):
+                if self._ids.setdefault(_key(name), i) != i:
+                    raise ValueError(f"Exercise name {name!r} is used twice")
+            for muscle in dict.fromkeys(exercise.muscles):
+                index["muscle"].setdefault(muscle, []).append(i)
+            index["pattern"].setdefault(exercise.pattern, []).append(i)
+            index["equipment"].setdefault(exercise.equipment, []).append(i)
+            swaps.setdefault((exercise.pattern, exercise.muscles[0]), []).append(i)
+        # Id tuples for ordered scans, frozensets for membership tests
+        self._index = {attribute: {value: tuple(ids) for value, ids in values.items()} for attribute, values in index.items()}
+        self._sets = {attribute: {value: frozenset(ids) for value, ids in values.items()} for attribute, values in index.items()}
+        self._swaps = {key: tuple(ids) for key, ids in swaps.items()}
+
+    def __len__(self):
+        return len(self.exercises)
+
+    def values(self, attribute):
+        """
+        Every muscle, pattern or equipment in the library.
+        """
+        return sorted(self._index[attribute])
+
+    def get(self, name):
+        """
+        The ExerciseInfo for a name or alias, or None if it's not in the library.
+        """
+        i = self._ids.get(_key(name))
+        return None if i is None else self.exercises[i]
+
+    def find(self, muscle=None, pattern=None, equipment=None, limit=None):
+        """
+        The exercises that work `muscle` (primary or not), follow `pattern`
+        and use `equipment`, in file order. Unset criteria match anything;
+        `equipment` may also be a set of what's available.
+        """
+        criteria = [self._criterion(attribute, value) for attribute, value in
+                    (("muscle", muscle), ("pattern", pattern), ("equipment", equipment)) if value is not None]
+        if not criteria:
+            return self._take(range(len(self.exercises)), limit)
+        # Walk the shortest id lists in order; test the other criteria by set membership
+        criteria.sort(key=lambda criterion: criterion[0])
+        _, lists, _ = criteria[0]
+        others = [sets for _, _, sets in criteria[1:]]
+        ids = heapq.merge(*lists) if len(lists) > 1 else lists[0]
+        return self._take((i for i in ids if all(any(i in s for s in sets) for sets in others)), limit)
+
+    def swaps(self, name, equipment=None, limit=3):
+        """
+        Up to `limit` exercises that can replace `name`: the same movement
+        pattern and primary muscle, optionally only with the `equipment`
+        (one or a set) available. Empty for an exercise not in the library.
+        """
+        exercise_id = self._ids.get(_key(name))
+        if exercise_id is None:
+            return []
+        exercise = self.exercises[exercise_id]
+        ids = (i for i in self._swaps[(exercise.pattern, exercise.muscles[0])] if i != exercise_id)
+        if equipment is not None:
+            allowed = {equipment} if isinstance(equipment, str) else set(equipment)
+            ids = (i for i in ids if self.exercises[i].equipment in allowed)
+        return self._take(ids, limit)
+
+    def _criterion(self, attribute, value):
+        """
+        (matches, ordered id lists, id sets) for one value or a set of them.
+        """
+        values = [value] if isinstance(value, str) else list(value)
+        lists = [self._index[attribute].get(v, ()) for v in values]
+        return sum(map(len, lists)), lists, [self._sets[attribute].get(v, frozenset()) for v in values]
+
+    def _take(self, ids, limit):
+        found = []
+        for i in ids:
+            if limit is not None and len(found) >= limit:
+                break
+            found.append(self.exercises[i])
+        return found
+
+
+def load_library(path=DEFAULT_PATH):
+    """
+    Reads an exercise library file.
+    """
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    try:
+        return ExerciseLibrary(
+            ExerciseInfo(e['name'], e['pattern'], e['equipment'], tuple(e['muscles']), tuple(e.get('aliases', ())))
+            for e in spec['exercises']
+        )
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"{path}: every exercise needs a name, pattern, equipment and muscles ({e!r})") from None
+
+
+@functools.lru_cache(maxsize=1)
+def default_library():
+    """
+    The library from DEFAULT_PATH, loaded once per process and shared by
+    every session.
+    """
+    return load_library()
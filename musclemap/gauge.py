@@ -0,0 +1,165 @@
+"""
+The BMI gauge shown on the Dashboard.
+
+Kept out of musclemap.brain because it needs plotly, which only the
+Dashboard page should pay to import.
+
+Building and validating a go.Figure is the most expensive part of a
+Dashboard rerun, and most of the figure never changes. So the static gauge
+(colored steps, pivot circle, layout) is built once as a template, and
+each BMI only patches the value, the title and the needle path. Finished
+figures are kept in a bounded LRU cache keyed on BMI rounded to 0.1, the
+precision the gauge displays, and its category (from the unrounded BMI, so
+24.96 is still "Normal weight" as the profile says). The template is built once per host: other
+processes load it from musclemap.shared_cache.
+"""
+
+import functools
+import math # Import Math for needle calculations
+
+import plotly
+import plotly.graph_objects as go
+
+from musclemap.brain import bmi_category
+from musclemap.shared_cache import code_digest, default_cache
+
+GAUGE_CACHE_SIZE = 512 # Distinct (BMI at 0.1 precision, category) gauges kept in memory
+
+# Define the ranges and colors
+# Standard colors based on user's first image
+GAUGE_RANGES = [0, 18.5, 25, 30, 35, 50]
+GAUGE_COLORS = ["#007bff", "#28a745", "#ffc107", "#fd7e14", "#dc3545"]
+MAX_BMI = 50
+
+# Needle geometry
+# 1. Pivot point is at (0.5, -0.1), below the gauge arc
+# 2. Thin needle base
+CENTER_X, CENTER_Y = 0.5, -0.1
+NEEDLE_LENGTH = 0.5
+NEEDLE_BASE_WIDTH = 0.02
+
+
+def needle_path(bmi):
+    """
+    Returns the SVG path of the triangular needle pointing at `bmi`.
+    """
+    clipped_bmi = max(0, min(bmi, MAX_BMI))
+    angle_rad = (1 - (clipped_bmi / MAX_BMI)) * math.pi
+
+    # Tip
+    tip_x = CENTER_X + NEEDLE_LENGTH * math.cos(angle_rad)
+    tip_y = CENTER_Y + NEEDLE_LENGTH * math.sin(angle_rad)
+
+    # Base corners
+    base_x1 = CENTER_X - NEEDLE_BASE_WIDTH * math.sin(angle_rad)
+    base_y1 = CENTER_Y + NEEDLE_BASE_WIDTH * math.cos(angle_rad)
+    base_x2 = CENTER_X + NEEDLE_BASE_WIDTH * math.sin(angle_rad)
+    base_y2 = CENTER_Y - NEEDLE_BASE_WIDTH * math.cos(angle_rad)
+
+    return f'M {base_x1},{base_y1} L {base_x2},{base_y2} L {tip_x},{tip_y} Z'
+
+
+@functools.lru_cache(maxsize=1)
+def gauge_template():
+    """
+    The static gauge as a plain figure dict, built once per host (see
+    _build_gauge_template).
+    """
+    return default_cache().get_or_build(
+        "gauge_template", _build_gauge_template, version=f"{plotly.__version__}:{code_digest(_build_gauge_template)}",
+    )
+
+
+def _build_gauge_template():
+    """
+    Builds the static gauge and returns it as a plain figure dict.
+    The value, title text and needle path are left empty for patching.
+    """
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number",
+        value = 0,
+
+        # Format number to look like "BMI = 23.0"
+        number = {
+            'prefix': "BMI = ",
+            'font': {'size': 36, 'color': "black"},
+            'valueformat': ".1f"
+        },
+
+        # We put the category (e.g., "Normal") in the title
+        title = {
+            'text': "",
+            'font': {'size': 24, 'color': "gray"}
+        },
+
+        gauge = {
+            'axis': {'range': [None, MAX_BMI], 'tickwidth': 1, 'tickcolor': "darkgray"},
+            'bar': {'color': "rgba(0,0,0,0)"}, # Make the default bar invisible
+            'bgcolor': "white",
+            'borderwidth': 2,
+            'bordercolor': "gray",
+            'steps': [
+                {'range': [GAUGE_RANGES[i], GAUGE_RANGES[i + 1]], 'color': color}
+                for i, color in enumerate(GAUGE_COLORS)
+            ]
+        }
+    ))
+
+    # The needle (shape 0) - its path is filled in per BMI
+    fig.add_shape(
+        type="path",
+        path="M 0,0 Z",
+        fillcolor="gray",
+        line_width=0,
+        layer="above"
+    )
+
+    # A small circle for the pivot point, centered at (0.5, -0.1)
+    fig.add_shape(
+        type="circle",
+        x0=0.48, y0=-0.12, x1=0.52, y1=-0.08,
+        fillcolor="gray",
+        line_width=0,
+        layer="above"
+    )
+
+    fig.update_layout(
+        height=350,
+        margin={'t': 50, 'b': 30, 'l': 30, 'r': 30},
+        paper_bgcolor="rgba(0,0,0,0)",
+    )
+    return fig.to_dict()
+
+
+def gauge_figure_dict(bmi, category=None):
+    """
+    The gauge for `bmi` as a plain figure dict: the template with the
+    value, title and needle patched in. `category` is the title (default:
+    the category of `bmi`). Shares the template's parts, so treat it as
+    read-only. For callers that only need the JSON (e.g. musclemap.reports).
+    """
+    if category is None:
+        category = bmi_category(bmi)[0]
+    template = gauge_template()
+    indicator = template['data'][0]
+    needle, *other_shapes = template['layout']['shapes']
+    return {
+        'data': [dict(indicator, value=bmi, title=dict(indicator['title'], text=category))],
+        'layout': dict(template['layout'], shapes=[dict(needle, path=needle_path(bmi))] + other_shapes),
+    }
+
+
+@functools.lru_cache(maxsize=GAUGE_CACHE_SIZE)
+def _gauge_for(bmi, category):
+    # The template was validated when it was built and only plain values
+    # are patched in, so skip plotly's (slow) validation here.
+    return go.Figure(gauge_figure_dict(bmi, category), _validate=False)
+
+
+def create_bmi_gauge(bmi):
+    """
+    Creates a Plotly gauge chart with a custom-drawn needle and text.
+    The figure is cached and shared between reruns and sessions, so
+    treat it as read-only.
+    """
+    return _gauge_for(round(bmi, 1), bmi_category(bmi)[0])
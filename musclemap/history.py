@@ -0,0 +1,93 @@
+"""
+Columnar progress history.
+
+Each member's check-ins are kept as one growable array per field instead of
+a list of dicts, so appending a check-in is O(1) and the weight column can be
+handed to NumPy without copying (see musclemap.charts). The check-in form
+answers are stored as one-byte codes (their index in the form's options)
+rather than a reference to a string per check-in. Only the standard library
+and the plain-Python brain are used here, so the Onboarding page can import
+it for free.
+"""
+
+import datetime
+from array import array
+
+from musclemap.brain import DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, SLEEP_OPTIONS, STRENGTH_OPTIONS
+
+# Answers from the check-in form, stored as codes into their options
+ANSWER_FIELDS = ["diet_adherence", "strength_progress", "energy_levels", "sleep_quality"]
+ANSWER_OPTIONS = dict(zip(ANSWER_FIELDS, [DIET_ADHERENCE_OPTIONS, STRENGTH_OPTIONS, ENERGY_OPTIONS, SLEEP_OPTIONS]))
+
+NOT_RECORDED = -1 # The code for a blank answer (e.g. an imported weigh-in); decodes to ""
+_CODES = {field: {option: code for code, option in enumerate(options)} for field, options in ANSWER_OPTIONS.items()}
+_ANSWERS = {field: options + [""] for field, options in ANSWER_OPTIONS.items()} # [NOT_RECORDED] is ""
+
+
+class ProgressHistory:
+    """
+    An append-only log of weekly check-ins for one member.
+    Iterating gives back the same progress_log dicts that were appended.
+    """
+
+    def __init__(self, logs=()):
+        self.dates = array('q')        # date.toordinal()
+        self.week_numbers = array('i')
+        self.start_weights = array('d') # start_weight_of_week
+        self.weights = array('d')      # current_weight
+        self.answers = {field: array('b') for field in ANSWER_FIELDS} # Codes, see ANSWER_OPTIONS
+        for log in logs:
+            self.append(log)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __bool__(self):
+        return len(self.dates) > 0
+
+    def append(self, progress_log):
+        self.dates.append(progress_log['date'].toordinal())
+        self.week_numbers.append(progress_log['week_number'])
+        self.start_weights.append(progress_log['start_weight_of_week'])
+        self.weights.append(progress_log['current_weight'])
+        for field in ANSWER_FIELDS:
+            self.answers[field].append(_CODES[field].get(progress_log[field], NOT_RECORDED))
+
+    def __getitem__(self, i):
+        log = {
+            "date": datetime.date.fromordinal(self.dates[i]),
+            "week_number": self.week_numbers[i],
+            "start_weight_of_week": self.start_weights[i],
+            "current_weight": self.weights[i],
+        }
+        for field in ANSWER_FIELDS:
+            log[field] = _ANSWERS[field][self.answers[field][i]]
+        return log
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a history from (week_number, date, start_weight_of_week,
+        current_weight, *answers) rows, with dates as ISO strings (the
+        checkins table's column order).
+        """
+        history = cls()
+        for week_number, date, start_weight, weight, *answers in rows:
+            history.dates.append(datetime.date.fromisoformat(date).toordinal())
+            history.week_numbers.append(week_number)
+            history.start_weights.append(start_weight)
+            history.weights.append(weight)
+            for field, answer in zip(ANSWER_FIELDS, answers):
+                history.answers[field].append(_CODES[field].get(answer, NOT_RECORDED))
+        return history
+
+    def nbytes(self):
+        """
+        The memory held by the columns' data (not counting object overhead).
+        """
+        columns = [self.dates, self.week_numbers, self.start_weights, self.weights, *self.answers.values()]
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
@@ -0,0 +1,357 @@
+"""
+Meal plans: what to eat to hit the nutrition plan's targets.
+
+Picks a week of daily meals from a food table (foods.csv next to this
+module, or the file named by MUSCLEMAP_FOODS), one row per food with its
+macros per serving, the meals it suits and what it contains:
+
+    name,serving,kcal,protein_g,fats_g,carbs_g,meals,tags
+    Chicken breast,150 g cooked,248,46,5.4,0,lunch dinner,poultry
+
+A member can leave out anything tagged (meat, dairy, gluten...) or follow
+one of the DIETS:
+
+    week = plan_week(nutrition_plan, exclude=DIETS["Vegetarian"], seed=member_seed(user_id))
+    week = update_week(week, new_nutrition_plan, ...)   # after a check-in
+
+The table keeps its macros as one NumPy array, each food's role (protein,
+carb or fat source) and an index of food ids per meal and per tag, so the
+candidates for a meal are a lookup. Each meal is filled greedily from its
+MEAL_ROLES (a protein source, a carb source, then anything): every step
+scores all candidates at every serving size at once (two matrix-vector
+products) and adds the one that brings the day closest to its targets. A
+pass over the serving sizes then trims what is left of the error.
+
+Each day draws from its own seeded share of the foods (VARIETY), so the
+days differ but are solved independently and memoized. A share that
+leaves the day outside TOLERANCE of its targets is drawn again, up to
+DRAWS times. update_week keeps every day that still fits the new targets
+and only re-solves the others.
+"""
+
+import csv
+import functools
+import os
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_PATH = os.environ.get("MUSCLEMAP_FOODS", os.path.join(os.path.dirname(__file__), "foods.csv"))
+
+DAYS = [f"Day {day}" for day in range(1, 8)] # Like the days of the workout plans
+MEALS = ["breakfast", "lunch", "dinner", "snack"]
+MEAL_SHARES = [0.25, 0.35, 0.30, 0.10] # Of the day's targets, before what earlier meals missed
+SERVINGS = np.arange(1, 7) / 2 # 0.5 to 3 servings, in halves
+PORTION_PENALTY = 0.0005 # Error added per (servings - 1)^2, so usual portions win close calls
+VARIETY = 0.6 # Share of the foods each day draws from
+DRAWS = 4 # Shares a day tries in turn until one fits its targets (else the closest is kept)
+
+# What a food mainly provides, from its share of the energy in it: at
+# least PROTEIN_SHARE (and PROTEIN_MIN_G a serving) from protein makes a
+# protein source, at least FAT_SHARE from fat a fat source, the rest carbs
+ROLES = ["protein", "carb", "fat"]
+PROTEIN_SHARE, PROTEIN_MIN_G, FAT_SHARE = 0.3, 5, 0.5
+# The foods each meal is built from, in the order they are picked
+# (None: any food that suits the meal)
+MEAL_ROLES = [("protein", "carb", None), ("protein", "carb", None), ("protein", "carb", None), (None, None)]
+
+MACROS = ["calories_kcal", "protein_g", "fats_g", "carbs_g"] # The nutrition plan's targets
+MACRO_WEIGHTS = np.array([1.0, 1.0, 0.5, 0.5]) # Of each target's relative error
+# How far a day's totals may be from a target (relative) and still fit it
+TOLERANCE = {"calories_kcal": 0.05, "protein_g": 0.10, "fats_g": 0.15, "carbs_g": 0.15}
+POLISH_STEPS = 12 # Serving-size changes tried after the meals are filled
+
+# Tags to leave out for each diet
+DIETS = {
+    "Everything": frozenset(),
+    "Pescatarian": frozenset({"meat", "poultry"}),
+    "Vegetarian": frozenset({"meat", "poultry", "fish", "shellfish"}),
+    "Vegan": frozenset({"meat", "poultry", "fish", "shellfish", "dairy", "egg"}),
+}
+
+DAY_CACHE_SIZE = 1024 # Solved days kept (each is a few hundred bytes)
+OPTIONS_CACHE_SIZE = 64 # Candidate arrays kept, per (meal, exclusions, role); 72 bytes a food
+
+Food = namedtuple("Food", ["name", "serving", "kcal", "protein_g", "fats_g", "carbs_g", "meals", "tags"])
+Food.__doc__ = """
+One food in the table, with its macros per serving. meals and tags are tuples.
+"""
+
+
+class Portion(namedtuple("Portion", ["food", "servings"])):
+    """
+    An amount of one food, e.g. 1.5 servings of chicken breast.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.servings:g} x {self.food.name} ({self.food.serving})"
+
+
+Meal = namedtuple("Meal", ["name", "portions"])
+Meal.__doc__ = """
+One meal of a day: its name (from MEALS) and a tuple of Portions.
+"""
+
+
+class DayPlan(namedtuple("DayPlan", ["day", "meals", "totals"])):
+    """
+    One day's meals. totals maps each of MACROS to what the day adds up to.
+    """
+    __slots__ = ()
+
+    def foods(self):
+        return [portion.food for meal in self.meals for portion in meal.portions]
+
+    def fits(self, nutrition_plan, exclude=()):
+        """
+        Whether the day is within TOLERANCE of the plan's targets and has
+        nothing tagged with `exclude`.
+        """
+        for key, tolerance in TOLERANCE.items():
+            target = nutrition_plan[key]
+            if abs(self.totals[key] - target) > tolerance * max(abs(target), 1):
+                return False
+        excluded = set(exclude)
+        return not any(excluded.intersection(food.tags) for food in self.foods())
+
+
+def food_role(food):
+    """
+    What a food mainly provides: "protein", "carb" or "fat" (see ROLES).
+    """
+    energy = 4 * food.protein_g + 9 * food.fats_g + 4 * food.carbs_g
+    if energy <= 0:
+        return "carb"
+    if 4 * food.protein_g >= PROTEIN_SHARE * energy and food.protein_g >= PROTEIN_MIN_G:
+        return "protein"
+    return "fat" if 9 * food.fats_g >= FAT_SHARE * energy else "carb"
+
+
+class FoodTable:
+    """
+    An immutable, indexed food table. Build it once and share it: solving
+    only reads the arrays and indexes.
+    """
+
+    def __init__(self, foods):
+        self.foods = tuple(foods)
+        self.macros = np.array(
+            [(food.kcal, food.protein_g, food.fats_g, food.carbs_g) for food in self.foods], dtype=float,
+        ).reshape(-1, len(MACROS))
+        self.macros.flags.writeable = False
+        self.roles = np.array([ROLES.index(food_role(food)) for food in self.foods], dtype=np.int8)
+        self.roles.flags.writeable = False
+        meal_ids, tag_ids = {meal: [] for meal in MEALS}, {}
+        for i, food in enumerate(self.foods):
+            for meal in food.meals:
+                if meal not in meal_ids:
+                    raise ValueError(f"{food.name}: unknown meal {meal!r} (one of {MEALS})")
+                meal_ids[meal].append(i)
+            for tag in food.tags:
+                tag_ids.setdefault(tag, []).append(i)
+        self._meal_ids = {meal: np.array(ids, dtype=np.intp) for meal, ids in meal_ids.items()}
+        self._tag_masks = {}
+        for tag, ids in tag_ids.items():
+            mask = np.zeros(len(self.foods), dtype=bool)
+            mask[ids] = True
+            self._tag_masks[tag] = mask
+
+    def __len__(self):
+        return len(self.foods)
+
+    def tags(self):
+        """
+        Every tag in the table (what a member can leave out).
+        """
+        return sorted(self._tag_masks)
+
+    def candidates(self, meal, exclude=(), role=None):
+        """
+        The ids of the foods that suit `meal`, have none of the tags in
+        `exclude` and (unless `role` is None) play that role.
+        """
+        ids = self._meal_ids[meal]
+        masks = [self._tag_masks[tag] for tag in exclude if tag in self._tag_masks]
+        if masks:
+            ids = ids[~np.logical_or.reduce(masks)[ids]]
+        if role is not None:
+            ids = ids[self.roles[ids] == ROLES.index(role)]
+        return ids
+
+
+def load_table(path=DEFAULT_PATH):
+    """
+    Reads a food table file.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    try:
+        return FoodTable(
+            Food(row['name'], row['serving'], float(row['kcal']), float(row['protein_g']), float(row['fats_g']),
+                 float(row['carbs_g']), tuple(row['meals'].split()), tuple(row['tags'].split()))
+            for row in rows
+        )
+    except (KeyError, AttributeError, ValueError) as e:
+        raise ValueError(f"{path}: every food needs a name, serving, kcal, protein_g, fats_g, carbs_g, meals and tags ({e})") from None
+
+
+@functools.lru_cache(maxsize=1)
+def default_table():
+    """
+    The table from DEFAULT_PATH, loaded once per process and shared by
+    every session.
+    """
+    return load_table()
+
+
+def member_seed(user_id):
+    """
+    A stable seed for a member's meal plans, so their days don't change
+    from one rerun (or server process) to the next.
+    """
+    return zlib.crc32(user_id.encode())
+
+
+# --- Solving ---
+
+@functools.lru_cache(maxsize=OPTIONS_CACHE_SIZE)
+def _options(table, meal, exclude, role):
+    """
+    The candidates for one pick of a meal: their food ids, macros and
+    macros squared.
+    """
+    ids = table.candidates(meal, exclude, role)
+    macros = table.macros[ids]
+    return ids, macros, macros * macros
+
+
+def _fill_meal(table, m, exclude, today, weights, target):
+    """
+    Greedily picks one (food id, servings) per role of MEAL_ROLES[m] that
+    brings `target` closest to zero, by weighted squared error, from the
+    foods `today` (a mask over the table) allows. A pick that would make it
+    worse is left out.
+    """
+    # With r what's still missing, adding s servings of food i changes the
+    # error by s^2 q_i - 2 s l_i + PORTION_PENALTY (s - 1)^2, where
+    # q_i = m_i^2 . w and l_i = m_i . w r: a parabola in s, so the best
+    # serving size is the one nearest its vertex
+    picked = []
+    remaining = target.copy()
+    for role in MEAL_ROLES[m]:
+        ids, macros, squares = _options(table, MEALS[m], exclude, role)
+        if len(ids) == 0:
+            continue
+        q, linear = squares @ weights, macros @ (weights * remaining)
+        servings = np.clip(np.round(2 * (linear + PORTION_PENALTY) / (q + PORTION_PENALTY)) / 2, SERVINGS[0], SERVINGS[-1])
+        change = servings * servings * q - 2 * servings * linear + PORTION_PENALTY * (servings - 1) ** 2
+        change[~today[ids]] = np.inf
+        for food_id, _ in picked: # Only one portion of a food
+            i = np.searchsorted(ids, food_id)
+            if i < len(ids) and ids[i] == food_id:
+                change[i] = np.inf
+        best = np.argmin(change)
+        if not change[best] < 0:
+            continue
+        picked.append((ids[best], servings[best]))
+        remaining -= servings[best] * macros[best]
+    return picked
+
+
+def _polish(macros, servings, weights, missing):
+    """
+    Moves serving sizes up or down half a serving at a time while that
+    brings the day closer to its targets. Changes `servings` in place.
+    """
+    steps = np.array([-0.5, 0.5])
+    quadratic = (macros * macros) @ weights
+    for _ in range(POLISH_STEPS):
+        # change[k, j]: error change for step k on portion j
+        linear = macros @ (weights * missing)
+        new_servings = servings[None, :] + steps[:, None]
+        change = np.outer(steps * steps, quadratic) - 2 * np.outer(steps, linear)
+        change += PORTION_PENALTY * ((new_servings - 1) ** 2 - (servings - 1) ** 2)
+        change[(new_servings < SERVINGS[0]) | (new_servings > SERVINGS[-1])] = np.inf
+        k, j = np.unravel_index(np.argmin(change), change.shape)
+        if change[k, j] >= 0:
+            return
+        servings[j] += steps[k]
+        missing -= steps[k] * macros[j]
+
+
+def _fill_day(table, target, exclude, weights, today):
+    """
+    Fills every meal of a day from the foods `today` allows, then polishes
+    the serving sizes. Returns the DayPlan's meals and what is still
+    missing from `target`.
+    """
+    ids, servings, meal_of = [], [], []
+    missing = target.copy()
+    for m in range(len(MEALS)):
+        # This meal's part of what the day still needs
+        share = MEAL_SHARES[m] / sum(MEAL_SHARES[m:])
+        for food_id, amount in _fill_meal(table, m, exclude, today, weights, share * missing):
+            ids.append(food_id)
+            servings.append(amount)
+            meal_of.append(m)
+            missing -= amount * table.macros[food_id]
+    servings = np.array(servings)
+    if ids:
+        _polish(table.macros[ids], servings, weights, missing)
+    meals = [[] for _ in MEALS]
+    for food_id, amount, m in zip(ids, servings, meal_of):
+        meals[m].append(Portion(table.foods[food_id], float(amount)))
+    return tuple(Meal(meal, tuple(portions)) for meal, portions in zip(MEALS, meals)), missing
+
+
+@functools.lru_cache(maxsize=DAY_CACHE_SIZE)
+def _solve_day(table, targets, exclude, seed, day):
+    target = np.array(targets, dtype=float)
+    nutrition_plan = dict(zip(MACROS, targets))
+    weights = MACRO_WEIGHTS / np.maximum(np.abs(target), 1) ** 2
+    best, best_error = None, np.inf
+    for draw in range(DRAWS):
+        # This day's share of the foods; the first draw is the day's own
+        rng = np.random.default_rng([seed, day, draw] if draw else [seed, day])
+        meals, missing = _fill_day(table, target, exclude, weights, rng.random(len(table)) < VARIETY)
+        totals = target - missing
+        day_plan = DayPlan(DAYS[day], meals, {key: round(float(value), 1) for key, value in zip(MACROS, totals)})
+        if day_plan.fits(nutrition_plan):
+            return day_plan
+        error = weights @ (missing * missing)
+        if error < best_error:
+            best, best_error = day_plan, error
+    return best
+
+
+def solve_day(nutrition_plan, day=0, exclude=(), seed=0, table=None):
+    """
+    The DayPlan for one day (0-6) of the week. Memoized: the same targets,
+    exclusions, seed and day give the same (shared, read-only) plan.
+    """
+    if table is None:
+        table = default_table()
+    return _solve_day(table, tuple(nutrition_plan[key] for key in MACROS), frozenset(exclude), seed, day)
+
+
+def plan_week(nutrition_plan, exclude=(), seed=0, table=None):
+    """
+    A week of DayPlans for the plan's targets, leaving out foods tagged
+    with anything in `exclude`. `seed` (e.g. member_seed) varies the days.
+    """
+    return tuple(solve_day(nutrition_plan, day, exclude, seed, table) for day in range(len(DAYS)))
+
+
+def update_week(week, nutrition_plan, exclude=(), seed=0, table=None):
+    """
+    The week for new targets (or exclusions): the days of `week` that still
+    fit them are kept as they are, the others are solved again.
+    """
+    if week is None:
+        return plan_week(nutrition_plan, exclude, seed, table)
+    return tuple(
+        day_plan if day_plan.fits(nutrition_plan, exclude) else solve_day(nutrition_plan, day, exclude, seed, table)
+        for day, day_plan in enumerate(week)
+    )
@@ -0,0 +1,190 @@
+"""
+Periodized training programs.
+
+A member's WorkoutPlan (see musclemap.workouts) is one week of training;
+a Program runs it as repeating blocks (mesocycles) of three phases:
+
+    accumulation     volume: an extra set on the main lifts each week
+    intensification  heavier: fewer reps per set, same sets
+    deload           recovery: half the sets at lighter weights
+
+How long each phase lasts depends on the member's experience level and
+goal (BLOCK_WEEKS). Each new block after the first also swaps some
+accessory exercises for alternatives from the exercise library (same
+movement and main muscle), picked by the program's seed.
+
+    program = Program(plan, goal, experience_level, seed=user_id)
+    program[profile['weeks_on_plan']].plan    # this week's WorkoutPlan
+    for week in program.weeks(start=10):      # built as they are read
+
+A Program only holds its parameters: a week's plan is built when it is
+read, from (phase, week of the phase, block, seed) alone, so any week can
+be rebuilt on its own and always comes out the same. Built weeks are
+memoized and shared, like the plan templates. The coach keeps changing
+the plan the program is built on; the program only shapes each week of it.
+"""
+
+import functools
+import random
+from collections import namedtuple
+
+from musclemap.exercises import default_library
+
+PROGRAM_WEEKS = 52
+
+PHASES = ["accumulation", "intensification", "deload"]
+# Weeks of each phase in a block, per experience level: beginners progress
+# on volume for longer, advanced lifters need heavier blocks and deload sooner
+BLOCK_WEEKS = {
+    "Beginner (0-1 years)": {"accumulation": 4, "intensification": 1, "deload": 1},
+    "Intermediate (1-3 years)": {"accumulation": 3, "intensification": 2, "deload": 1},
+    "Advanced (3+ years)": {"accumulation": 2, "intensification": 2, "deload": 1},
+}
+# Goals change how long the volume phase runs: longer when building
+# muscle, shorter in a calorie deficit, where recovery is slower
+GOAL_ACCUMULATION_WEEKS = {"Muscle Gain": 1, "Weight Reduction": -1, "General Fitness": 0}
+
+MAX_EXTRA_SETS = 2 # On a main lift in accumulation, however long the phase
+INTENSIFICATION_REPS = 3 # Fewer reps per set in the first intensification week, one more each week after
+MIN_REPS = 3
+DELOAD_SETS = 0.5 # Share of the sets kept in a deload week
+ACCESSORY_SWAP_SHARE = 0.5 # Of the accessories with a swap in the library, changed each block
+
+PHASE_NOTES = {
+    "accumulation": " Accumulation week: build volume. Keep the weights from last week and do the extra sets.",
+    "intensification": " Intensification week: fewer reps, heavier weights. Add 2.5-5kg to your main lifts.",
+    "deload": " Deload week: half the sets at about 60% of your usual weights, so you recover for the next block.",
+}
+
+PROGRAM_CACHE_SIZE = 512 # Built weeks kept; members on the same plan, phase and block share them
+
+ProgramWeek = namedtuple("ProgramWeek", ["week", "block", "phase", "plan"])
+ProgramWeek.__doc__ = """
+One week of a Program: its number (0 is the first), its block, its phase
+and the WorkoutPlan to train.
+"""
+
+
+def block_phases(goal, experience):
+    """
+    The phase of each week of a block, e.g. ("accumulation", "accumulation",
+    "intensification", "deload").
+    """
+    weeks = dict(BLOCK_WEEKS.get(experience, BLOCK_WEEKS["Intermediate (1-3 years)"]))
+    weeks["accumulation"] = max(1, weeks["accumulation"] + GOAL_ACCUMULATION_WEEKS.get(goal, 0))
+    return tuple(phase for phase in PHASES for _ in range(weeks[phase]))
+
+
+class Program:
+    """
+    A periodized program of `weeks` weeks (None: no end) built on
+    `base_plan`. Creating one costs nothing; weeks are built when read.
+    """
+
+    def __init__(self, base_plan, goal, experience, seed=0, weeks=PROGRAM_WEEKS):
+        self.base_plan = base_plan
+        self.seed = seed
+        self.length = weeks
+        self.phases = block_phases(goal, experience)
+
+    def __len__(self):
+        if self.length is None:
+            raise TypeError("An open-ended program has no length")
+        return self.length
+
+    def phase(self, week):
+        """
+        (block, phase, week of the phase) for a week, without building it.
+        """
+        block, i = divmod(week, len(self.phases))
+        phase = self.phases[i]
+        return block, phase, i - self.phases.index(phase)
+
+    def next_phase(self, week):
+        """
+        (week, phase) of the first week after `week` in another phase.
+        """
+        phase = self.phase(week)[1]
+        for later in range(week + 1, week + len(self.phases) + 1):
+            if self.phase(later)[1] != phase:
+                return later, self.phase(later)[1]
+        return week + 1, phase # A block of one phase
+
+    def __getitem__(self, week):
+        if week < 0 or (self.length is not None and week >= self.length):
+            raise IndexError(f"Week {week} is not in this program")
+        block, phase, step = self.phase(week)
+        return ProgramWeek(week, block, phase, _week_plan(self.base_plan, phase, step, block, self.seed))
+
+    def weeks(self, start=0, stop=None):
+        """
+        Yields the ProgramWeeks from `start` up to `stop` (default: the end),
+        building each one only when it is reached.
+        """
+        week = start
+        while (stop is None or week < stop) and (self.length is None or week < self.length):
+            yield self[week]
+            week += 1
+
+    __iter__ = weeks
+
+
+# --- Building a week ---
+
+def _map_exercises(plan, change):
+    """
+    The plan with change(exercise, is_main_lift) applied to every exercise
+    with sets. The first of a day is its main lift. Unchanged days are shared.
+    """
+    days = []
+    for day in plan.weekly_schedule:
+        exercises, main = [], True
+        for exercise in day.exercises:
+            if exercise.sets:
+                exercise, main = change(exercise, main), False
+            exercises.append(exercise)
+        days.append(day if tuple(exercises) == day.exercises else day._replace(exercises=tuple(exercises)))
+    return plan._replace(weekly_schedule=tuple(days))
+
+
+@functools.lru_cache(maxsize=PROGRAM_CACHE_SIZE)
+def _block_swaps(base_plan, seed, block):
+    """
+    {exercise name: replacement name} for one block. The first block
+    keeps the plan's own exercises.
+    """
+    if block == 0:
+        return {}
+    rng = random.Random(f"{seed}:{block}")
+    library = default_library()
+    swaps = {}
+    for day in base_plan.weekly_schedule:
+        for exercise in day.exercises[1:]: # Main lifts stay
+            if exercise.sets and exercise.name not in swaps:
+                info = library.get(exercise.name)
+                # Alternatives with the same equipment first, so a barbell lift stays one
+                options = info and (library.swaps(exercise.name, equipment=info.equipment, limit=None)
+                                    or library.swaps(exercise.name, limit=None))
+                swaps[exercise.name] = rng.choice(options).name if options and rng.random() < ACCESSORY_SWAP_SHARE else None
+    return {name: new for name, new in swaps.items() if new}
+
+
+@functools.lru_cache(maxsize=PROGRAM_CACHE_SIZE)
+def _week_plan(base_plan, phase, step, block, seed):
+    swaps = _block_swaps(base_plan, seed, block)
+
+    def change(exercise, main):
+        if not main and exercise.name in swaps:
+            exercise = exercise._replace(name=swaps[exercise.name])
+        if phase == "accumulation" and main:
+            return exercise._replace(sets=exercise.sets + min(step, MAX_EXTRA_SETS))
+        if phase == "intensification" and exercise.unit == "reps":
+            fewer = INTENSIFICATION_REPS + step
+            return exercise._replace(
+                reps_low=max(MIN_REPS, exercise.reps_low - fewer), reps_high=max(MIN_REPS, exercise.reps_high - fewer),
+            )
+        if phase == "deload":
+            return exercise._replace(sets=max(1, round(exercise.sets * DELOAD_SETS)))
+        return exercise
+
+    return _map_exercises(base_plan, change).with_note(PHASE_NOTES[phase])
@@ -0,0 +1,188 @@
+"""
+Monte Carlo "what-if" projections.
+
+Answers "when will I hit my goal weight?" by rolling the AI Coach forward
+week by week for thousands of simulated futures at once. Each week, every
+scenario:
+  1. draws random check-in answers (diet adherence, sleep, energy, strength),
+  2. eats the plan's calories scaled by how well it was followed,
+  3. changes weight by simple energy balance (7700 kcal per kg), using a
+     TDEE that is recalculated from the new weight,
+  4. weighs in with some day-to-day water-weight noise, which moves their
+     smoothed weight trend (see musclemap.trend), and
+  5. gets coached like a live check-in: the same rules as
+     get_ai_recommendation, run over all scenarios with
+     musclemap.coach.coach_codes on the trend's weekly change once it has
+     settled (the raw weekly difference before), then adapt_maintenance's
+     learned TDEE (see musclemap.tdee) moving the calorie target.
+
+Everything is NumPy arrays over the scenarios, so 10k scenarios x 52 weeks
+take well under a second. project() can also split the scenarios across a
+process pool.
+"""
+
+import concurrent.futures
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from musclemap import tdee, trend
+from musclemap.brain import ACTIVITY_LEVELS, COACHING_RULES, DIET_ADHERENCE_OPTIONS, GOALS, ON_TARGET_ADHERENCE
+from musclemap.coach import MUSCLE_GAIN, WEIGHT_REDUCTION, coach_codes, rule_arrays
+from musclemap.cohort import (
+    ACTIVITY_MULTIPLIERS, BMR_FEMALE, BMR_MALE, DEFAULT_ACTIVITY, DEFAULT_GOAL, option_codes, update_trends_batch,
+    weekly_change_batch,
+)
+
+KCAL_PER_KG = tdee.KCAL_PER_KG # Energy in 1 kg of body weight
+WEIGH_IN_NOISE_KG = trend.WEIGH_IN_NOISE_KG # Std. dev. of day-to-day (water weight) swings
+
+# How often each check-in answer comes up (in the form's option order)
+ADHERENCE_ODDS = [0.45, 0.35, 0.15, 0.05]
+STRENGTH_ODDS = [0.45, 0.40, 0.15]
+ENERGY_ODDS = [0.30, 0.55, 0.15]
+SLEEP_ODDS = [0.50, 0.35, 0.15]
+
+# Calories actually eaten, relative to the target, per adherence answer: (mean, std. dev.)
+ADHERENCE_INTAKE = np.array([
+    [1.00, 0.02], # Great
+    [1.04, 0.03], # Good
+    [1.10, 0.05], # Okay
+    [1.25, 0.10], # Bad
+])
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+Projection = namedtuple("Projection", ["weeks", "percentiles", "bands", "calorie_bands", "weeks_to_goal"])
+Projection.__doc__ = """
+Result of project():
+  - weeks:         0..N
+  - percentiles:   the PERCENTILES the bands are for
+  - bands:         weight (kg) per percentile and week, shape (len(percentiles), N + 1)
+  - calorie_bands: calorie target per percentile and week, same shape
+  - weeks_to_goal: weeks until the goal weight per percentile (inf = not within N weeks), or None
+"""
+
+
+def simulate(profile, calories_kcal, weeks=52, scenarios=10_000, seed=None, weight_trend=None, tdee_estimate=None):
+    """
+    Runs the scenarios and returns (weights, calories), both arrays of shape
+    (scenarios, weeks + 1). Weights are true body weight, without weigh-in
+    noise. `weight_trend` and `tdee_estimate` are the member's Trend and
+    tdee.Estimate (default: a trend from start_weight, and none).
+    """
+    rng = np.random.default_rng(seed)
+    rules = COACHING_RULES.current() # The same rules for every week
+    arrays = rule_arrays(rules)
+    goal = np.full(scenarios, option_codes([profile['goal']], GOALS, DEFAULT_GOAL)[0], dtype=np.int8)
+    on_target = np.array([option in ON_TARGET_ADHERENCE for option in DIET_ADHERENCE_OPTIONS])
+
+    # Revised Harris-Benedict, recalculated every week as the weight changes
+    coef = BMR_MALE if profile['gender'] == "Male" else BMR_FEMALE
+    bmr_base = coef[0] + (coef[2] * profile['height']) - (coef[3] * profile['age'])
+    multiplier = ACTIVITY_MULTIPLIERS[option_codes([profile['activity_level']], ACTIVITY_LEVELS, DEFAULT_ACTIVITY)[0]]
+
+    def formula_tdee(weight): # calculate_tdee at each scenario's weight
+        return np.trunc((coef[0] + (coef[1] * weight) + (coef[2] * profile['height']) - (coef[3] * profile['age'])) * multiplier)
+
+    weights = np.empty((scenarios, weeks + 1))
+    calories = np.empty((scenarios, weeks + 1))
+    weight = np.full(scenarios, float(profile['start_weight']))
+    last_weigh_in = weight.copy()
+    target = np.full(scenarios, float(calories_kcal))
+    weights[:, 0], calories[:, 0] = weight, target
+
+    # What the live coach keeps per member: the weight trend, the learned
+    # TDEE (offset and variance, see tdee.observe) and the profile's tdee
+    first = weight_trend or trend.start(0, profile['start_weight'])
+    trends = pd.DataFrame({field: np.full(scenarios, value) for field, value in first._asdict().items()})
+    estimate = tdee_estimate or tdee.PRIOR
+    offset, variance = np.full(scenarios, float(estimate.offset)), np.full(scenarios, float(estimate.variance))
+    profile_tdee = formula_tdee(weight) if profile.get('tdee') is None else np.full(scenarios, float(profile['tdee']))
+
+    for week in range(1, weeks + 1):
+        adherence = rng.choice(len(ADHERENCE_ODDS), size=scenarios, p=ADHERENCE_ODDS)
+        strength = rng.choice(len(STRENGTH_ODDS), size=scenarios, p=STRENGTH_ODDS)
+        energy = rng.choice(len(ENERGY_ODDS), size=scenarios, p=ENERGY_ODDS)
+        sleep = rng.choice(len(SLEEP_ODDS), size=scenarios, p=SLEEP_ODDS)
+
+        intake = target * (ADHERENCE_INTAKE[adherence, 0] + ADHERENCE_INTAKE[adherence, 1] * rng.standard_normal(scenarios))
+        burned = (bmr_base + coef[1] * weight) * multiplier # The true TDEE
+        weight = weight + (intake - burned) * 7 / KCAL_PER_KG
+
+        weigh_in = weight + WEIGH_IN_NOISE_KG * rng.standard_normal(scenarios)
+        trends = update_trends_batch(trends, first.day + 7 * week, weigh_in)
+        weight_change = weekly_change_batch(trends)
+        settled = ~np.isnan(weight_change)
+        weight_change = np.where(settled, weight_change, weigh_in - last_weigh_in)
+        outcomes = coach_codes(goal, weight_change, adherence, strength, energy, sleep, rules)
+        coached = target + arrays.deltas[outcomes, 0].sum(axis=1)
+
+        # adapt_maintenance: weeks on target teach the estimate (as tdee.observe),
+        # and the target moves with the learned TDEE unless the coach held the plan
+        observed = on_target[adherence]
+        noise_variance = np.where(settled, tdee.TREND_NOISE_STD ** 2, tdee.RAW_NOISE_STD ** 2)
+        prior = variance / tdee.FORGETTING
+        gain = prior / (prior + noise_variance)
+        residual = tdee.observed_tdee(target, weight_change) - formula_tdee(last_weigh_in) - offset
+        offset = np.where(observed, offset + gain * residual, offset)
+        variance = np.where(observed, (1 - gain) * prior, variance)
+        new_tdee = np.round(formula_tdee(weigh_in) + offset)
+        change = new_tdee - profile_tdee
+        moves = observed & ~arrays.final[outcomes].any(axis=1) & (np.abs(change) >= tdee.MIN_CHANGE_KCAL)
+        target = np.where(moves, coached + change, coached)
+        profile_tdee = np.where(moves, new_tdee, profile_tdee)
+        last_weigh_in = weigh_in
+
+        weights[:, week], calories[:, week] = weight, target
+    return weights, calories
+
+
+def _weeks_to_goal(weights, goal, goal_weight):
+    if goal == GOALS[MUSCLE_GAIN]:
+        reached = weights >= goal_weight
+    elif goal == GOALS[WEIGHT_REDUCTION]:
+        reached = weights <= goal_weight
+    else:
+        reached = np.abs(weights - goal_weight) <= 0.5
+    # A scenario that never gets there counts as one week past the end: an
+    # inf would make the interpolated percentiles next to it NaN
+    never = weights.shape[1]
+    first = np.where(reached.any(axis=1), reached.argmax(axis=1), never)
+    weeks = np.percentile(first, PERCENTILES)
+    return np.where(weeks > never - 1, np.inf, weeks)
+
+
+def _simulate_chunk(args):
+    return simulate(*args)
+
+
+def project(profile, nutrition_plan, goal_weight=None, weeks=52, scenarios=10_000, seed=None, workers=None,
+            weight_trend=None, tdee_estimate=None):
+    """
+    Projects a member's weight from their current profile and nutrition
+    plan, and their weight Trend and tdee.Estimate if they have them. With
+    `workers`, the scenarios are split across that many processes (each
+    with an independent random stream); results stay reproducible for a
+    given seed and number of workers.
+    """
+    calories_kcal = nutrition_plan['calories_kcal']
+    if workers and workers > 1:
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        sizes = [len(part) for part in np.array_split(np.arange(scenarios), workers)]
+        jobs = [(profile, calories_kcal, weeks, size, s, weight_trend, tdee_estimate) for size, s in zip(sizes, seeds)]
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_simulate_chunk, jobs))
+        weights = np.concatenate([w for w, _ in parts])
+        calories = np.concatenate([c for _, c in parts])
+    else:
+        weights, calories = simulate(profile, calories_kcal, weeks, scenarios, seed, weight_trend, tdee_estimate)
+
+    return Projection(
+        weeks=np.arange(weeks + 1),
+        percentiles=PERCENTILES,
+        bands=np.percentile(weights, PERCENTILES, axis=0),
+        calorie_bands=np.percentile(calories, PERCENTILES, axis=0),
+        weeks_to_goal=None if goal_weight is None else _weeks_to_goal(weights, profile['goal'], goal_weight),
+    )
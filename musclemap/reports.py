@@ -0,0 +1,248 @@
+"""
+Weekly HTML reports for the whole member base.
+
+Renders each member's Sunday summary offline, without Streamlit: their
+nutrition plan, this week of their workout program, BMI gauge and weight
+chart, with the same figures the Dashboard draws (musclemap.gauge,
+musclemap.charts).
+One HTML file per member, named after their user_id:
+
+    python -m musclemap.reports reports/ --workers 4
+
+Members are rendered REPORT_CHUNK at a time across a process pool. Each
+worker opens the store once and shares one gauge template (and a cache of
+rendered gauges) across all its members, and writes every report to disk
+as soon as it is rendered, so memory use stays flat however many members
+there are.
+
+The figures are embedded as plotly JSON and drawn by plotly.js, which is
+written once as plotly.min.js next to the reports, so they open offline
+from the directory. --plotlyjs inline puts plotly.js into every file
+instead (about 5 MB each); cdn loads it from the plotly CDN.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import html
+import json
+import logging
+import os
+import string
+import sys
+
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+from musclemap.brain import bmi_category
+from musclemap.charts import weight_figure
+from musclemap.gauge import GAUGE_CACHE_SIZE, gauge_figure_dict
+from musclemap.periodization import Program
+from musclemap.store import DEFAULT_DB_PATH, Store, is_user_id
+from musclemap.trend import weekly_change
+
+REPORT_CHUNK = 200 # Members per worker task
+PLOTLYJS_FILE = "plotly.min.js"
+PLOTLYJS_MODES = ["directory", "inline", "cdn"]
+
+log = logging.getLogger(__name__)
+
+PAGE = string.Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>MuscleMap weekly summary - $date</title>
+$script
+<style>
+body { font-family: sans-serif; max-width: 960px; margin: 2em auto; color: #222; }
+.box { border: 1px solid #ddd; border-radius: 8px; padding: 1em; margin-bottom: 1em; }
+.metrics { display: flex; gap: 2em; }
+.metric b { display: block; font-size: 1.6em; }
+</style>
+</head>
+<body>
+<h1>Your weekly summary: $goal</h1>
+<p><i>$date</i> - week $week of your plan (started $start)</p>
+<h2>Your AI Nutrition Plan</h2>
+<div class="box">
+<div class="metrics">
+<div class="metric">Target Calories<b>$calories kcal</b></div>
+<div class="metric">Protein<b>$protein g</b></div>
+<div class="metric">Fats<b>$fats g</b></div>
+<div class="metric">Carbs<b>$carbs g</b></div>
+</div>
+<p><b>Notes:</b> $nutrition_notes</p>
+</div>
+<h2>Your Health Metrics</h2>
+<div class="box">
+<div id="bmi-gauge"></div>
+<div class="metrics">
+<div class="metric">Maintenance Calories (TDEE)<b>$tdee kcal</b></div>
+<div class="metric">Current Weight<b>$weight kg</b></div>
+<div class="metric">Weight Trend<b>$trend</b></div>
+</div>
+<p><b>Height:</b> $height cm | <b>Age:</b> $age</p>
+</div>
+<h2>Your AI Workout Plan</h2>
+<div class="box">
+<p><b>Split Type:</b> $split_type ($frequency days/week)</p>
+<p><b>Notes:</b> $workout_notes</p>
+$schedule
+</div>
+<h2>Your Progress</h2>
+<div class="box">
+$progress
+</div>
+<script>
+var config = {displayModeBar: false, responsive: true};
+$plots
+</script>
+</body>
+</html>
+""")
+
+
+def _script_json(figure):
+    """
+    A figure dict as JSON that is safe inside a <script> element.
+    """
+    return json.dumps(figure).replace("</", "<\\/")
+
+
+@functools.lru_cache(maxsize=GAUGE_CACHE_SIZE)
+def _gauge_json(bmi, category):
+    return _script_json(gauge_figure_dict(bmi, category))
+
+
+def _schedule_html(workout_plan):
+    days = []
+    for day in workout_plan.weekly_schedule:
+        items = "".join(f"<li>{html.escape(str(exercise))}</li>" for exercise in day.exercises) or "<li><i>Rest Day</i></li>"
+        days.append(f"<h3>{html.escape(day.day)}: {html.escape(day.focus)}</h3>\n<ul>{items}</ul>")
+    return "\n".join(days)
+
+
+def render_report(profile, nutrition_plan, workout_plan, history, trend, script, date):
+    """
+    One member's weekly summary as an HTML page. `history` is their
+    ProgressHistory, `trend` their weight Trend (or None) and `script`
+    the <script> element that loads plotly.js.
+    """
+    plots = [f"Plotly.newPlot('bmi-gauge', {_gauge_json(round(profile['bmi'], 1), bmi_category(profile['bmi'])[0])}, config);"]
+    if history:
+        plots.append(f"Plotly.newPlot('weight-chart', {_script_json(weight_figure(history, profile['plan_start_date']))}, config);")
+        progress = '<div id="weight-chart"></div>'
+    else:
+        progress = "<p>No check-ins yet. Your weight chart starts with your first weekly check-in.</p>"
+    change = weekly_change(trend)
+    return PAGE.substitute(
+        script=script,
+        date=date.strftime("%B %d, %Y"),
+        goal=html.escape(profile['goal']),
+        week=profile['weeks_on_plan'],
+        start=profile['plan_start_date'].strftime("%B %d, %Y"),
+        calories=nutrition_plan['calories_kcal'],
+        protein=nutrition_plan['protein_g'],
+        fats=nutrition_plan['fats_g'],
+        carbs=nutrition_plan['carbs_g'],
+        nutrition_notes=html.escape(nutrition_plan['notes']),
+        tdee=profile['tdee'],
+        weight=profile['start_weight'],
+        trend="Not enough weigh-ins yet" if change is None else f"{change:+.2f} kg/week",
+        height=profile['height'],
+        age=profile['age'],
+        split_type=html.escape(workout_plan.split_type),
+        frequency=workout_plan.frequency_per_week,
+        workout_notes=html.escape(workout_plan.notes),
+        schedule=_schedule_html(workout_plan),
+        progress=progress,
+        plots="\n".join(plots),
+    )
+
+
+def _script_tag(plotlyjs):
+    if plotlyjs == "inline":
+        return f"<script>{get_plotlyjs()}</script>"
+    if plotlyjs == "cdn":
+        return f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    return f'<script src="{PLOTLYJS_FILE}"></script>'
+
+
+# --- Batch generation ---
+
+@functools.lru_cache(maxsize=None)
+def _worker_setup(db_path, plotlyjs):
+    """
+    One store connection and <script> element per worker process.
+    """
+    return Store(db_path), _script_tag(plotlyjs)
+
+
+def _render_chunk(args):
+    db_path, out_dir, plotlyjs, date, user_ids = args
+    store, script = _worker_setup(db_path, plotlyjs)
+    trends = store.trends(user_ids)
+    written = size = 0
+    for user_id in user_ids:
+        if not is_user_id(user_id): # It names the file: never write outside out_dir
+            log.warning("Skipping member %r: not a valid user_id", user_id)
+            continue
+        session = store.load_session(user_id)
+        if session is None:
+            continue
+        profile, nutrition_plan, workout_plan = session
+        # The week of their program the Dashboard shows (see musclemap.periodization)
+        program = Program(workout_plan, profile['goal'], profile['experience_level'], seed=user_id, weeks=None)
+        page = render_report(
+            profile, nutrition_plan, program[profile['weeks_on_plan']].plan, store.load_progress_history(user_id),
+            trends.get(user_id), script, date,
+        )
+        path = os.path.join(out_dir, f"{user_id}.html")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(page)
+        os.replace(path + ".tmp", path) # A rerun never leaves a half-written report behind
+        written, size = written + 1, size + len(page)
+    return written, size
+
+
+def generate_reports(db_path, out_dir, workers=None, chunksize=REPORT_CHUNK, plotlyjs="directory", date=None, user_ids=None):
+    """
+    Writes a report for every member (or just `user_ids`) into `out_dir`,
+    `chunksize` members per task across `workers` processes (default: one
+    per core; 1 renders in this process). Yields (reports written, HTML
+    characters) per finished chunk.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if plotlyjs == "directory":
+        with open(os.path.join(out_dir, PLOTLYJS_FILE), "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+    date = date or datetime.date.today()
+    if user_ids is None:
+        user_ids = Store(db_path).user_ids()
+    jobs = ((db_path, out_dir, plotlyjs, date, user_ids[i:i + chunksize]) for i in range(0, len(user_ids), chunksize))
+    if workers == 1:
+        for job in jobs:
+            yield _render_chunk(job)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(_render_chunk, jobs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write every member's weekly summary as HTML.")
+    parser.add_argument("out_dir", help="directory to write the reports to (one <user_id>.html each)")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file (default: $MUSCLEMAP_DB or musclemap.db)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--chunksize", type=int, default=REPORT_CHUNK, help=f"members per task (default: {REPORT_CHUNK})")
+    parser.add_argument("--plotlyjs", choices=PLOTLYJS_MODES, default="directory",
+                        help="how reports load plotly.js (default: one shared copy in the directory)")
+    args = parser.parse_args(argv)
+
+    reports = size = 0
+    for written, chars in generate_reports(args.db, args.out_dir, args.workers, args.chunksize, args.plotlyjs):
+        reports, size = reports + written, size + chars
+    print(f"Wrote {reports} reports ({size / 1e6:.1f} MB of HTML) to {args.out_dir}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+The AI Coach's rules as data.
+
+The coaching decisions are a decision table in a JSON file
+(coaching_rules.json next to this module, or the file named by
+MUSCLEMAP_RULES), so coaches can tune thresholds and messages without a
+code change. The file has two parts:
+
+  outcomes  what the coach does, by name:
+              feedback      messages; {change} and {abs_change} are the
+                            week's weight change in kg
+              nutrition     amounts added to the nutrition plan
+              workout_note  text appended to the workout plan's notes
+              rep_scheme    [[old low, old high], [new low, new high]]
+              final         true to skip the remaining stages
+  stages    evaluated in order. In each stage the first rule whose "when"
+            conditions all hold picks the outcome ("then"; null means
+            nothing). A condition is a list of allowed answers for a form
+            field (goal, diet_adherence, strength_progress, energy_levels,
+            sleep_quality), or an interval for weight_change such as
+            "[-0.8, -0.3)" (brackets include the end, parentheses don't).
+
+Each stage is compiled into a lookup table indexed by the answer codes of
+the fields it uses and by which interval the weight change falls in (a
+bisect over the stage's interval ends), with the first matching rule
+resolved up front. A check-in then costs one lookup per stage no matter
+how many rules there are. A table's digest names its rule set (e.g. for
+the replay snapshots in musclemap.events). RuleFile reloads the file when it changes; a
+file with mistakes is reported and the previous rules stay in force.
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_PATH = os.environ.get("MUSCLEMAP_RULES", os.path.join(os.path.dirname(__file__), "coaching_rules.json"))
+RELOAD_INTERVAL = 2.0 # Seconds between checks of the file's modification time
+
+NUTRITION_KEYS = ["calories_kcal", "protein_g", "fats_g", "carbs_g"]
+
+_INTERVAL_PATTERN = re.compile(r"^\s*([\[(])\s*([^,\s]+)\s*,\s*([^\]\)\s]+)\s*([\])])\s*$")
+
+log = logging.getLogger(__name__)
+
+
+class RuleError(ValueError):
+    """
+    A rules file that can't be compiled.
+    """
+
+
+Outcome = namedtuple("Outcome", ["name", "feedback", "nutrition", "workout_note", "rep_scheme", "final"])
+Outcome.__doc__ = """
+One thing the coach can do. nutrition is a {plan key: amount} dict and
+rep_scheme an (old, new) pair of (low, high) rep ranges, or None.
+"""
+
+Stage = namedtuple("Stage", ["name", "fields", "radixes", "ends", "table"])
+Stage.__doc__ = """
+A compiled stage:
+  - fields:  the form fields its rules look at
+  - radixes: how many codes each field has (its options plus "anything else")
+  - ends:    the sorted interval ends of its weight_change conditions
+  - table:   outcome index (-1 for none) per [answer key, weight segment],
+             flattened; there are 2 * len(ends) + 1 weight segments
+"""
+
+
+class Interval(namedtuple("Interval", ["low", "high", "low_closed", "high_closed"])):
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, text):
+        match = _INTERVAL_PATTERN.match(text) if isinstance(text, str) else None
+        if match is None:
+            raise RuleError(f"weight_change must be an interval like \"[-0.8, -0.3)\", not {text!r}")
+        try:
+            low, high = float(match[2]), float(match[3])
+        except ValueError:
+            raise RuleError(f"weight_change interval {text!r} has an end that is not a number") from None
+        if low > high:
+            raise RuleError(f"weight_change interval {text!r} is empty")
+        return cls(low, high, match[1] == "[", match[4] == "]")
+
+    def __contains__(self, x):
+        above = x >= self.low if self.low_closed else x > self.low
+        below = x <= self.high if self.high_closed else x < self.high
+        return above and below
+
+
+def weight_segment(ends, weight_change):
+    """
+    Which of the 2 * len(ends) + 1 segments a weight change falls in:
+    even segments are between ends, odd ones are exactly on an end.
+    """
+    i = bisect.bisect_left(ends, weight_change)
+    return 2 * i + 1 if i < len(ends) and ends[i] == weight_change else 2 * i
+
+
+def _segment_points(ends):
+    """
+    One weight change inside each segment, to test the rules with.
+    """
+    if not ends:
+        return [0.0]
+    points = [ends[0] - 1.0]
+    for i, end in enumerate(ends):
+        points.append(end)
+        points.append((end + ends[i + 1]) / 2 if i + 1 < len(ends) else end + 1.0)
+    return points
+
+
+class RuleTable:
+    """
+    A compiled rules file. `options` maps each form field to its answers
+    (see musclemap.brain.COACHING_FIELDS); any other answer gets the code
+    len(options).
+    """
+
+    def __init__(self, spec, options, source="<rules>"):
+        self.source = source
+        self.options = options
+        self.codes = {field: {answer: code for code, answer in enumerate(answers)} for field, answers in options.items()}
+        self.cache = {} # Derived forms of this table (e.g. the batch coach's NumPy arrays)
+        if not isinstance(spec, dict) or not isinstance(spec.get("outcomes"), dict) or not isinstance(spec.get("stages"), list):
+            raise RuleError(f"{source}: needs an \"outcomes\" object and a \"stages\" list")
+        self.outcomes = [self._outcome(name, outcome) for name, outcome in spec["outcomes"].items()]
+        self.outcome_index = {outcome.name: i for i, outcome in enumerate(self.outcomes)}
+        self.stages = [self._stage(i, stage) for i, stage in enumerate(spec["stages"])]
+        # Same rules, same digest, whatever the file's formatting or comments
+        canonical = json.dumps({"outcomes": spec["outcomes"], "stages": spec["stages"]}, sort_keys=True)
+        self.digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+        # What decide() walks: per stage, (field, answer codes, "anything else" code, stride) and the table
+        self._lookups = []
+        for stage in self.stages:
+            stride, strides = 2 * len(stage.ends) + 1, []
+            for radix in reversed(stage.radixes):
+                strides.append(stride)
+                stride *= radix
+            fields = [(field, self.codes[field], radix - 1, stride)
+                      for field, radix, stride in zip(stage.fields, stage.radixes, reversed(strides))]
+            self._lookups.append((fields, stage.ends, stage.table))
+
+    # --- Compiling ---
+
+    def _outcome(self, name, outcome):
+        where = f"{self.source}: outcome {name!r}"
+        if not isinstance(outcome, dict):
+            raise RuleError(f"{where} must be an object")
+        unknown = set(outcome) - {"feedback", "nutrition", "workout_note", "rep_scheme", "final"}
+        if unknown:
+            raise RuleError(f"{where} has unknown keys {sorted(unknown)}")
+        feedback = outcome.get("feedback", [])
+        if not isinstance(feedback, list) or not all(isinstance(text, str) for text in feedback):
+            raise RuleError(f"{where}: feedback must be a list of messages")
+        for text in feedback:
+            try:
+                text.format(change=0.0, abs_change=0.0)
+            except (KeyError, IndexError, ValueError) as e:
+                raise RuleError(f"{where}: bad message {text!r} ({e})") from None
+        nutrition = outcome.get("nutrition", {})
+        if not isinstance(nutrition, dict) or set(nutrition) - set(NUTRITION_KEYS) or not all(
+            isinstance(amount, int) and not isinstance(amount, bool) for amount in nutrition.values()
+        ):
+            raise RuleError(f"{where}: nutrition must map {NUTRITION_KEYS} to whole numbers")
+        rep_scheme = outcome.get("rep_scheme")
+        if rep_scheme is not None:
+            try:
+                (old_low, old_high), (new_low, new_high) = rep_scheme
+                rep_scheme = ((int(old_low), int(old_high)), (int(new_low), int(new_high)))
+            except (TypeError, ValueError):
+                raise RuleError(f"{where}: rep_scheme must be [[old low, old high], [new low, new high]]") from None
+        workout_note = outcome.get("workout_note", "")
+        if not isinstance(workout_note, str):
+            raise RuleError(f"{where}: workout_note must be text")
+        return Outcome(name, tuple(feedback), nutrition, workout_note, rep_scheme, bool(outcome.get("final", False)))
+
+    def _stage(self, number, stage):
+        name = stage.get("name", str(number)) if isinstance(stage, dict) else str(number)
+        where = f"{self.source}: stage {name!r}"
+        if not isinstance(stage, dict) or not isinstance(stage.get("rules"), list):
+            raise RuleError(f"{where} needs a \"rules\" list")
+
+        rules = [] # (answer sets by field, interval or None, outcome index or -1)
+        for i, rule in enumerate(stage["rules"]):
+            if not isinstance(rule, dict) or not isinstance(rule.get("when", {}), dict) or "then" not in rule:
+                raise RuleError(f"{where}, rule {i + 1}: needs \"when\" conditions and a \"then\" outcome")
+            answers, interval = {}, None
+            for field, condition in rule.get("when", {}).items():
+                if field == "weight_change":
+                    interval = Interval.parse(condition)
+                elif field in self.options:
+                    if not isinstance(condition, list):
+                        raise RuleError(f"{where}, rule {i + 1}: {field} must be a list of answers")
+                    unknown = [answer for answer in condition if answer not in self.codes[field]]
+                    if unknown:
+                        raise RuleError(f"{where}, rule {i + 1}: {unknown} are not {field} answers {self.options[field]}")
+                    answers[field] = {self.codes[field][answer] for answer in condition}
+                else:
+                    raise RuleError(f"{where}, rule {i + 1}: unknown field {field!r}")
+            then = rule["then"]
+            if then is not None and then not in self.outcome_index:
+                raise RuleError(f"{where}, rule {i + 1}: unknown outcome {then!r}")
+            rules.append((answers, interval, -1 if then is None else self.outcome_index[then]))
+
+        fields = [field for field in self.options if any(field in answers for answers, _, _ in rules)]
+        radixes = [len(self.options[field]) + 1 for field in fields]
+        ends = sorted({end for _, interval, _ in rules if interval is not None
+                       for end in (interval.low, interval.high) if math.isfinite(end)})
+        points = _segment_points(ends)
+
+        table = []
+        for key in range(math.prod(radixes)):
+            codes, rest = {}, key
+            for field, radix in zip(reversed(fields), reversed(radixes)):
+                rest, codes[field] = divmod(rest, radix)
+            candidates = [(interval, outcome) for answers, interval, outcome in rules
+                          if all(codes[field] in allowed for field, allowed in answers.items())]
+            for point in points:
+                table.append(next((outcome for interval, outcome in candidates
+                                   if interval is None or point in interval), -1))
+        return Stage(name, fields, radixes, ends, table)
+
+    # --- Evaluating ---
+
+    def decide(self, answers, weight_change):
+        """
+        The outcomes for one check-in, in stage order. `answers` has the
+        form fields (the goal and the check-in answers).
+        """
+        decided = []
+        for fields, ends, table in self._lookups:
+            key = 0
+            for field, codes, other, stride in fields:
+                key += codes.get(answers[field], other) * stride
+            if ends:
+                key += weight_segment(ends, weight_change)
+            index = table[key]
+            if index >= 0:
+                outcome = self.outcomes[index]
+                decided.append(outcome)
+                if outcome.final:
+                    break
+        return decided
+
+
+def load_rules(path, options):
+    """
+    Reads and compiles a rules file.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except ValueError as e:
+        raise RuleError(f"{path}: not valid JSON ({e})") from None
+    return RuleTable(spec, options, source=path)
+
+
+class RuleFile:
+    """
+    The rules from a file, recompiled when the file changes (checked at
+    most every `reload_interval` seconds), so a running server picks up
+    edits without a restart.
+    """
+
+    def __init__(self, options, path=DEFAULT_PATH, reload_interval=RELOAD_INTERVAL):
+        self.path = path
+        self.options = options
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = os.stat(path).st_mtime_ns
+        self._rules = load_rules(path, options) # A broken file at startup is an error
+        self._next_check = time.monotonic() + reload_interval
+
+    def current(self):
+        """
+        The rules in force.
+        """
+        if time.monotonic() >= self._next_check:
+            self._reload_if_changed()
+        return self._rules
+
+    def _reload_if_changed(self):
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return # Another thread just checked
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self._mtime:
+                    return
+                self._mtime = mtime
+                self._rules = load_rules(self.path, self.options)
+                log.info("Reloaded coaching rules from %s", self.path)
+            except (OSError, RuleError) as e:
+                log.error("Keeping the previous coaching rules: %s", e)
@@ -0,0 +1,167 @@
+"""
+Server-side cache of the members with an open Dashboard.
+
+Streamlit keeps a session's st.session_state for as long as its browser tab
+is open, idle or not, so thousands of open tabs would each keep a profile,
+two plans and a check-in history in memory for good. app.py keeps only the
+page and the member id in st.session_state and gets the rest from one
+cache shared by every session on the server:
+
+    member = members.get(user_id)        # reloaded from the store if needed
+    member.profile['weeks_on_plan'] += 1
+    members.touch(member)                # at the end of each rerun
+
+The cache has a memory budget. When it is over budget, the members idle
+for at least `idle_seconds` are dropped, least recently used first. The
+page writes every change through to the SQLite store as it happens, so the
+store is the spill file: a member who comes back is reloaded from it by
+their next get() without noticing.
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+from musclemap.history import ProgressHistory
+
+DEFAULT_BUDGET_BYTES = int(os.environ.get("MUSCLEMAP_SESSION_BUDGET_MB", "256")) * 1024 * 1024
+DEFAULT_IDLE_SECONDS = 300
+
+
+def estimate_size(value, seen=None):
+    """
+    Rough deep size in bytes of a member's plain data: dicts, lists,
+    tuples (the workout plan), strings, numbers, dates and ProgressHistory.
+    Objects shared within `value` are counted once.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item, seen) for item in value)
+    elif isinstance(value, ProgressHistory):
+        size += value.nbytes()
+    return size
+
+
+class Member:
+    """
+    One member's Dashboard state. The check-in history is read from the
+    store the first time it is used.
+    """
+    __slots__ = ("user_id", "profile", "nutrition_plan", "workout_plan", "_history", "_store", "nbytes", "last_used")
+
+    def __init__(self, user_id, profile, nutrition_plan, workout_plan, history=None, store=None):
+        self.user_id = user_id
+        self.profile = profile
+        self.nutrition_plan = nutrition_plan
+        self.workout_plan = workout_plan
+        self._history = history
+        self._store = store
+        self.nbytes = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def history(self):
+        if self._history is None:
+            self._history = self._store.load_progress_history(self.user_id)
+        return self._history
+
+    def estimate_size(self):
+        parts = [self.profile, self.nutrition_plan, self.workout_plan]
+        if self._history is not None:
+            parts.append(self._history)
+        seen = set()
+        return sys.getsizeof(self) + sum(estimate_size(part, seen) for part in parts)
+
+
+class MemberCache:
+    """
+    The members in use on this server, with a memory budget. Safe to share
+    between Streamlit's script threads.
+    """
+
+    def __init__(self, store, budget_bytes=DEFAULT_BUDGET_BYTES, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.store = store
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.nbytes = 0  # Sum of the cached members' estimated sizes
+        self.spilled = 0 # Members dropped to stay within the budget so far
+        self._members = collections.OrderedDict() # user_id -> Member, least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._members)
+
+    def get(self, user_id):
+        """
+        Returns the member, loading them from the store if they are not
+        cached (or were spilled). None if the member is unknown.
+        """
+        with self._lock:
+            member = self._use(user_id)
+        if member is not None:
+            return member
+        saved = self.store.load_session(user_id)
+        if saved is None:
+            return None
+        with self._lock:
+            # Another session may have loaded them meanwhile; keep one copy
+            return self._use(user_id) or self._insert(Member(user_id, *saved, store=self.store))
+
+    def add(self, member):
+        """
+        Caches a member who was just created (e.g. by onboarding).
+        """
+        with self._lock:
+            old = self._members.pop(member.user_id, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._insert(member)
+            self._spill()
+        return member
+
+    def touch(self, member):
+        """
+        Marks the member as just used and re-measures them. Call this at
+        the end of each rerun, after their state may have changed.
+        """
+        size = member.estimate_size() # Outside the lock, other sessions need not wait for it
+        with self._lock:
+            if self._members.get(member.user_id) is not member:
+                return # Spilled or replaced meanwhile; the store has the changes
+            self._use(member.user_id)
+            self.nbytes += size - member.nbytes
+            member.nbytes = size
+            self._spill()
+
+    def _use(self, user_id):
+        member = self._members.get(user_id)
+        if member is not None:
+            member.last_used = time.monotonic()
+            self._members.move_to_end(user_id)
+        return member
+
+    def _insert(self, member):
+        member.nbytes = member.estimate_size()
+        member.last_used = time.monotonic()
+        self._members[member.user_id] = member
+        self.nbytes += member.nbytes
+        return member
+
+    def _spill(self):
+        idle_before = time.monotonic() - self.idle_seconds
+        while self.nbytes > self.budget_bytes and self._members:
+            user_id, member = next(iter(self._members.items()))
+            if member.last_used > idle_before:
+                break # Everyone left was used recently; allow going over rather than drop an active member
+            del self._members[user_id]
+            self.nbytes -= member.nbytes
+            self.spilled += 1
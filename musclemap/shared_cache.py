@@ -0,0 +1,244 @@
+"""
+A cache shared by every MuscleMap process on the host.
+
+Each Streamlit server process would otherwise build the same plotly
+templates (the BMI gauge, the weight chart) on its first Dashboard, and
+keep its own copy. This keeps built values in one SQLite file on local
+disk, memory-mapped by every process that reads it, so the OS page cache
+holds one copy per host and a worker's first Dashboard loads the template
+instead of building it:
+
+    cache = default_cache()
+    template = cache.get_or_build("gauge_template", build_template, version=code_digest(build_template))
+
+Keys are content hashes of the name, a version and the arguments, so a
+value built by a different version of the code (see code_digest) is never
+returned; it just ages out. Values are stored as JSON (the templates are
+plain figure dicts), so reading the file never runs code. Readers never
+block each other or the writer (WAL). The file is kept under MAX_BYTES
+by dropping the oldest values first.
+
+Only what is slow to build belongs here. The plan catalog and nutrition
+plans (musclemap.brain) take microseconds to build, less than a read from
+this file, so they stay in each process's own memo.
+
+The cache is only ever a shortcut: if the file can't be used (read-only,
+locked for too long, corrupt), the value is built in-process as if it
+were not there. It lives at MUSCLEMAP_SHARED_CACHE (default: under
+$XDG_CACHE_HOME/musclemap, a directory only its user can open); set that
+to "off" to disable it. A file or directory owned by someone else, or
+that others can write to, is not used.
+
+    python -m musclemap.shared_cache stats
+    python -m musclemap.shared_cache clear
+"""
+
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import stat
+import sys
+import threading
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "musclemap",
+)
+DEFAULT_PATH = os.environ.get("MUSCLEMAP_SHARED_CACHE") or os.path.join(CACHE_DIR, "shared-cache.sqlite")
+MAX_BYTES = int(os.environ.get("MUSCLEMAP_SHARED_CACHE_MB", "64")) * 1024 * 1024
+BUSY_TIMEOUT_MS = 200 # How long a process waits for another's write before building the value itself
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY, -- Write order; the oldest are evicted first
+    key BLOB NOT NULL UNIQUE, -- Content hash of (name, version, arguments)
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL -- JSON
+);
+"""
+
+log = logging.getLogger(__name__)
+
+
+def code_digest(*functions):
+    """
+    A short hash of the functions' source code, as the version of what
+    they build: editing a builder invalidates what it built before.
+    """
+    digest = hashlib.sha256()
+    for fn in functions:
+        try:
+            digest.update(inspect.getsource(fn).encode())
+        except (OSError, TypeError):
+            digest.update(f"{fn.__module__}.{fn.__qualname__}".encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(name, version, args):
+    return hashlib.sha256(repr((name, version, args)).encode()).digest()[:16]
+
+
+def _check_private(path):
+    """
+    Raises PermissionError unless `path` is owned by this user and no one
+    else can write to it.
+    """
+    if not hasattr(os, "getuid"):
+        return
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} is not private to this user")
+
+
+def _ensure_private(path):
+    """
+    Creates the cache's directory (mode 0700) if needed and checks that
+    it and the file are this user's own before anything is read from them.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_private(directory)
+    if os.path.exists(path):
+        _check_private(path)
+
+
+class SharedCache:
+    """
+    A size-bounded key/value cache in a memory-mapped SQLite file. Safe to
+    share between threads and processes: each thread of each process gets
+    its own connection.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def connection(self):
+        """
+        Returns this thread's connection, opening it on first use (and
+        again in a forked child, which must not reuse its parent's).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            _ensure_private(self.path)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF") # A cache: losing the last writes in a crash is fine
+            conn.execute(f"PRAGMA mmap_size={self.max_bytes * 2}") # Reads come straight from the shared mapping
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, name, version="", args=()):
+        """
+        The cached value, or None if there is none (or the cache can't be read).
+        """
+        try:
+            row = self.connection().execute(
+                "SELECT value FROM entries WHERE key = ?", (cache_key(name, version, args),),
+            ).fetchone()
+            return None if row is None else json.loads(row[0])
+        except (sqlite3.Error, OSError, ValueError) as e:
+            log.warning("Shared cache %s unreadable, building %s locally: %s", self.path, name, e)
+            return None
+
+    def put(self, name, value, version="", args=()):
+        """
+        Stores a value, then drops the oldest values until the cache is
+        back under max_bytes. A value that can't be written is skipped.
+        """
+        try:
+            data = json.dumps(value, separators=(",", ":")).encode()
+        except (TypeError, ValueError) as e:
+            log.warning("Shared cache can't store %s: %s", name, e)
+            return
+        if len(data) > self.max_bytes:
+            return
+        try:
+            conn = self.connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, name, size, value) VALUES (?, ?, ?, ?)",
+                    (cache_key(name, version, args), name, len(data), data),
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                if total > self.max_bytes:
+                    self._evict(conn, total - self.max_bytes)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError) as e:
+            log.warning("Shared cache %s not written (%s): %s", self.path, name, e)
+
+    def _evict(self, conn, excess):
+        freed, last = 0, None
+        for seq, size in conn.execute("SELECT seq, size FROM entries ORDER BY seq"):
+            freed, last = freed + size, seq
+            if freed >= excess:
+                break
+        conn.execute("DELETE FROM entries WHERE seq <= ?", (last,))
+
+    def get_or_build(self, name, build, *args, version=""):
+        """
+        build(*args), from the cache if any process on the host already
+        built it with the same `version`, else built now and cached.
+        """
+        value = self.get(name, version, args)
+        if value is None:
+            value = build(*args)
+            self.put(name, value, version, args)
+        return value
+
+    def stats(self):
+        """
+        {name: (entries, bytes)} of what's in the cache.
+        """
+        rows = self.connection().execute("SELECT name, COUNT(*), SUM(size) FROM entries GROUP BY name ORDER BY name")
+        return {name: (count, size) for name, count, size in rows}
+
+    def clear(self):
+        self.connection().execute("DELETE FROM entries")
+
+
+class _NoCache:
+    """
+    Stands in for the SharedCache when MUSCLEMAP_SHARED_CACHE is "off".
+    """
+
+    def get_or_build(self, name, build, *args, version=""):
+        return build(*args)
+
+
+@functools.lru_cache(maxsize=1)
+def default_cache():
+    """
+    The host's shared cache at DEFAULT_PATH, one per process.
+    """
+    return _NoCache() if DEFAULT_PATH == "off" else SharedCache()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the host's shared cache.")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--path", default=DEFAULT_PATH, help="cache file (default: $MUSCLEMAP_SHARED_CACHE)")
+    args = parser.parse_args(argv)
+
+    cache = SharedCache(args.path)
+    if args.command == "clear":
+        cache.clear()
+        print(f"Cleared {args.path}.", file=sys.stderr)
+        return
+    for name, (count, size) in cache.stats().items():
+        print(f"{name}: {count} values, {size / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,608 @@
+"""
+Durable storage for profiles, plans and check-ins.
+
+A small SQLite layer so a member's data outlives their Streamlit session.
+The database runs in WAL mode, so many readers (one per Streamlit session
+thread) can load dashboards while a check-in is being written.
+
+Tables:
+  - profiles:      one row per member, including their current plans
+  - plan_versions: every coaching change, keyed by the week it took effect
+                   (unchanged weeks add no row). Each row stores only the
+                   PlanDiff from the previous version, plus full plans every
+                   KEYFRAME_EVERY versions (see musclemap.versioning).
+  - checkins:      the weekly progress logs
+  - events:        the append-only log every other table can be rebuilt
+                   from: each member's onboarding and check-ins, as they
+                   were submitted (see musclemap.events)
+  - snapshots:     member states saved while replaying the events, per
+                   rule set, so a rebuild starts from the latest one
+  - weigh_ins:     daily weigh-ins (the last one of a day counts)
+  - trends:        each member's smoothed weight trend, updated by every
+                   weigh-in (see musclemap.trend)
+  - tdee_estimates: each member's learned maintenance calories, updated
+                   by every check-in (see musclemap.tdee)
+
+All of them are keyed by user_id first (WITHOUT ROWID, so rows for the same
+member sit together on disk). Loading a dashboard is a single primary-key
+lookup on profiles. The progress history is only read when the weight chart
+needs it.
+"""
+
+import datetime
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import uuid
+
+from musclemap import tdee, trend
+from musclemap.history import ProgressHistory
+from musclemap.versioning import KEYFRAME_EVERY, PlanDiff
+from musclemap.workouts import WorkoutPlan
+
+DEFAULT_DB_PATH = os.environ.get("MUSCLEMAP_DB", "musclemap.db")
+# Member ids are used as file names (e.g. by musclemap.reports), so only these
+USER_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id TEXT PRIMARY KEY,
+    age INTEGER NOT NULL,
+    gender TEXT NOT NULL,
+    activity_level TEXT NOT NULL,
+    height REAL NOT NULL,
+    start_weight REAL NOT NULL,
+    goal TEXT NOT NULL,
+    experience_level TEXT NOT NULL,
+    plan_start_date TEXT NOT NULL,
+    weeks_on_plan INTEGER NOT NULL,
+    tdee INTEGER,
+    bmi REAL,
+    bmi_category TEXT,
+    bmi_color TEXT,
+    nutrition_plan TEXT NOT NULL,
+    workout_plan TEXT NOT NULL,
+    plan_version INTEGER NOT NULL DEFAULT 0,
+    plan_depth INTEGER NOT NULL DEFAULT 0 -- diffs since the last keyframe
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS plan_versions (
+    user_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    created_on TEXT NOT NULL,
+    diff TEXT NOT NULL,
+    nutrition_plan TEXT, -- Full plans on keyframe rows only
+    workout_plan TEXT,
+    PRIMARY KEY (user_id, version)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS checkins (
+    user_id TEXT NOT NULL,
+    week_number INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    start_weight_of_week REAL NOT NULL,
+    current_weight REAL NOT NULL,
+    diet_adherence TEXT NOT NULL,
+    strength_progress TEXT NOT NULL,
+    energy_levels TEXT NOT NULL,
+    sleep_quality TEXT NOT NULL,
+    PRIMARY KEY (user_id, week_number)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS events (
+    user_id TEXT NOT NULL,
+    seq INTEGER NOT NULL, -- 0 for the onboarding, then the check-in's week number
+    kind TEXT NOT NULL, -- onboarding, checkin, or weigh_in (an imported check-in; not coached)
+    recorded_on TEXT NOT NULL,
+    data TEXT NOT NULL, -- The form as submitted (JSON)
+    PRIMARY KEY (user_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    user_id TEXT NOT NULL,
+    rules TEXT NOT NULL, -- Digest of the rule set the events were replayed under
+    seq INTEGER NOT NULL, -- The last event included
+    state TEXT NOT NULL,
+    PRIMARY KEY (user_id, rules, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS weigh_ins (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS trends (
+    user_id TEXT PRIMARY KEY,
+    day INTEGER NOT NULL, -- date.toordinal() of the last weigh-in
+    level REAL NOT NULL, -- kg
+    slope REAL NOT NULL, -- kg/day
+    p00 REAL NOT NULL, -- Covariance of (level, slope)
+    p01 REAL NOT NULL,
+    p11 REAL NOT NULL,
+    weigh_ins INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS tdee_estimates (
+    user_id TEXT PRIMARY KEY,
+    offset_kcal REAL NOT NULL, -- Learned on top of calculate_tdee, per day
+    variance REAL NOT NULL,
+    weeks INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+PROFILE_FIELDS = [
+    "age", "gender", "activity_level", "height", "start_weight", "goal", "experience_level",
+    "plan_start_date", "weeks_on_plan", "tdee", "bmi", "bmi_category", "bmi_color",
+]
+CHECKIN_FIELDS = [
+    "week_number", "date", "start_weight_of_week", "current_weight",
+    "diet_adherence", "strength_progress", "energy_levels", "sleep_quality",
+]
+# Optional parts of a progress log, kept in its event only
+CHECKIN_EXTRAS = ["trend_kg_per_week"]
+# The Onboarding form, as recorded in a member's first event
+ONBOARDING_FIELDS = [
+    "age", "gender", "activity_level", "height", "start_weight", "goal", "experience_level",
+    "plan_start_date", "weeks_on_plan",
+]
+# Profile fields that take one of a few values; loaded as interned strings, shared by every session
+CATEGORY_FIELDS = ["gender", "activity_level", "goal", "experience_level", "bmi_category", "bmi_color"]
+
+
+def new_user_id():
+    """
+    Returns a fresh, URL-safe member id.
+    """
+    return uuid.uuid4().hex
+
+
+def is_user_id(user_id):
+    """
+    Whether `user_id` is a valid member id: 1-64 letters, digits, - or _,
+    so it is always a plain file name.
+    """
+    return isinstance(user_id, str) and USER_ID_PATTERN.fullmatch(user_id) is not None
+
+
+def _to_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _to_text(value):
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def _event_data(record, fields):
+    return json.dumps({f: _to_text(record[f]) for f in fields})
+
+
+class Store:
+    """
+    SQLite-backed store. Safe to share between threads: each thread gets
+    its own connection to the same database file.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        """
+        Returns this thread's connection, opening it on first use.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL") # Durable at checkpoints; safe with WAL
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Writes ---
+
+    def save_onboarding(self, user_id, profile, nutrition_plan, workout_plan):
+        """
+        Stores a new member's profile and first plan (version 0, a keyframe).
+        Their starting weight is their first weigh-in. Onboarding an
+        existing member again starts them over.
+        """
+        nutrition_json, workout_json = json.dumps(nutrition_plan), json.dumps(workout_plan.to_dict())
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO profiles (user_id, {', '.join(PROFILE_FIELDS)}, "
+                f"nutrition_plan, workout_plan, plan_version, plan_depth) "
+                f"VALUES (?, {', '.join('?' * len(PROFILE_FIELDS))}, ?, ?, 0, 0)",
+                [user_id] + [_to_text(profile.get(f)) for f in PROFILE_FIELDS] + [nutrition_json, workout_json],
+            )
+            conn.execute("DELETE FROM plan_versions WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM checkins WHERE user_id = ?", (user_id,))
+            conn.execute(
+                "INSERT INTO plan_versions VALUES (?, 0, ?, '{}', ?, ?)",
+                (user_id, _to_text(profile['plan_start_date']), nutrition_json, workout_json),
+            )
+            self._start_events(conn, [(
+                user_id, _to_text(profile['plan_start_date']), _event_data(profile, ONBOARDING_FIELDS),
+            )])
+            conn.execute("DELETE FROM weigh_ins WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM trends WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM tdee_estimates WHERE user_id = ?", (user_id,))
+            self._weigh_in(conn, user_id, _to_date(profile['plan_start_date']), profile['start_weight'])
+
+    def record_checkin(self, user_id, progress_log, profile, nutrition_plan, workout_plan, tdee_estimate=None):
+        """
+        Saves everything a check-in submit changes in one transaction:
+        the progress log and its event, the coach's changes as a new plan version (only if
+        the plan actually changed), the updated profile and the member's
+        tdee.Estimate, if there is one.
+        """
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO checkins (user_id, {', '.join(CHECKIN_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(CHECKIN_FIELDS))})",
+                [user_id] + [_to_text(progress_log[f]) for f in CHECKIN_FIELDS],
+            )
+            # Like its checkins row, a check-in replaces an earlier one (or an import) of the same week
+            conn.execute(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, 'checkin', ?, ?)",
+                (user_id, progress_log['week_number'], _to_text(progress_log['date']),
+                 _event_data(progress_log, CHECKIN_FIELDS + [f for f in CHECKIN_EXTRAS if f in progress_log])),
+            )
+            version, depth, current_nutrition, current_workout = conn.execute(
+                "SELECT plan_version, plan_depth, nutrition_plan, workout_plan FROM profiles WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+            diff = PlanDiff.between(
+                json.loads(current_nutrition), WorkoutPlan.from_dict(json.loads(current_workout)),
+                nutrition_plan, workout_plan,
+            )
+            if diff:
+                version = progress_log['week_number']
+                current_nutrition, current_workout = json.dumps(nutrition_plan), json.dumps(workout_plan.to_dict())
+                depth = (depth + 1) % KEYFRAME_EVERY
+                keyframe = (current_nutrition, current_workout) if depth == 0 else (None, None)
+                conn.execute(
+                    "INSERT OR REPLACE INTO plan_versions VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, version, _to_text(progress_log['date']), json.dumps(diff.to_dict()), *keyframe),
+                )
+            conn.execute(
+                "UPDATE profiles SET start_weight = ?, weeks_on_plan = ?, tdee = ?, bmi = ?, bmi_category = ?, bmi_color = ?, "
+                "nutrition_plan = ?, workout_plan = ?, plan_version = ?, plan_depth = ? WHERE user_id = ?",
+                (profile['start_weight'], profile['weeks_on_plan'], profile['tdee'], profile['bmi'], profile['bmi_category'],
+                 profile['bmi_color'], current_nutrition, current_workout, version, depth, user_id),
+            )
+            if tdee_estimate is not None:
+                conn.execute("INSERT OR REPLACE INTO tdee_estimates VALUES (?, ?, ?, ?)", (user_id, *tdee_estimate))
+
+    def record_weigh_in(self, user_id, date, weight):
+        """
+        Saves a weigh-in and moves the member's trend on by it, in one
+        transaction. Returns the new Trend.
+        """
+        conn = self.connection()
+        with conn:
+            return self._weigh_in(conn, user_id, date, weight)
+
+    def _weigh_in(self, conn, user_id, date, weight):
+        earlier = conn.execute(
+            "SELECT weight FROM weigh_ins WHERE user_id = ? AND date = ?", (user_id, _to_text(date)),
+        ).fetchone()
+        conn.execute("INSERT OR REPLACE INTO weigh_ins VALUES (?, ?, ?)", (user_id, _to_text(date), weight))
+        row = conn.execute(f"SELECT {', '.join(trend.Trend._fields)} FROM trends WHERE user_id = ?", (user_id,)).fetchone()
+        new_trend = trend.update(
+            None if row is None else trend.Trend(*row), date.toordinal(), weight, None if earlier is None else earlier[0],
+        )
+        conn.execute("INSERT OR REPLACE INTO trends VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (user_id, *new_trend))
+        return new_trend
+
+    # --- Bulk import (see musclemap.transfer) ---
+
+    def import_members(self, rows):
+        """
+        Bulk save_onboarding for one chunk of members, in one transaction.
+        Each row is (user_id, *PROFILE_FIELDS, nutrition_json, workout_json).
+        Importing a member again starts them over.
+        """
+        rows = list(rows)
+        profile_start = 1 + PROFILE_FIELDS.index("plan_start_date")
+        onboarding = [PROFILE_FIELDS.index(f) for f in ONBOARDING_FIELDS]
+        weight = 1 + PROFILE_FIELDS.index("start_weight")
+        conn = self.connection()
+        with conn:
+            conn.executemany("DELETE FROM plan_versions WHERE user_id = ?", [(row[0],) for row in rows])
+            conn.executemany("DELETE FROM checkins WHERE user_id = ?", [(row[0],) for row in rows])
+            conn.executemany(
+                f"INSERT OR REPLACE INTO profiles (user_id, {', '.join(PROFILE_FIELDS)}, "
+                f"nutrition_plan, workout_plan, plan_version, plan_depth) "
+                f"VALUES (?, {', '.join('?' * len(PROFILE_FIELDS))}, ?, ?, 0, 0)",
+                rows,
+            )
+            conn.executemany(
+                "INSERT INTO plan_versions VALUES (?, 0, ?, '{}', ?, ?)",
+                [(row[0], row[profile_start], row[-2], row[-1]) for row in rows],
+            )
+            self._start_events(conn, [
+                (row[0], row[profile_start], json.dumps(dict(zip(ONBOARDING_FIELDS, [row[1 + i] for i in onboarding]))))
+                for row in rows
+            ])
+            # Their starting weight is their first weigh-in
+            conn.executemany("DELETE FROM weigh_ins WHERE user_id = ?", [(row[0],) for row in rows])
+            conn.executemany(
+                "INSERT INTO weigh_ins VALUES (?, ?, ?)", [(row[0], row[profile_start], row[weight]) for row in rows],
+            )
+            conn.executemany("INSERT OR REPLACE INTO trends VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+                (row[0], *trend.start(_to_date(row[profile_start]).toordinal(), row[weight])) for row in rows
+            ])
+            conn.executemany("DELETE FROM tdee_estimates WHERE user_id = ?", [(row[0],) for row in rows])
+
+    def import_checkins(self, rows, latest):
+        """
+        Bulk-inserts one chunk of check-ins, (user_id, *CHECKIN_FIELDS) each,
+        with their events, and rolls the members' profiles forward in the same transaction.
+        `latest` has one (start_weight, weeks_on_plan, bmi, bmi_category,
+        bmi_color, user_id) row per member; a profile is only moved forward,
+        never back to an older week. A week the member checked in on in the
+        app keeps that check-in; an earlier import of the week is replaced.
+        """
+        rows = list(rows)
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO checkins (user_id, {', '.join(CHECKIN_FIELDS)}) "
+                f"SELECT {', '.join(f'?{i}' for i in range(1, len(CHECKIN_FIELDS) + 2))} WHERE NOT EXISTS "
+                f"(SELECT 1 FROM events WHERE user_id = ?1 AND seq = ?2 AND kind = 'checkin')",
+                rows,
+            )
+            # Replays from a snapshot after an imported week would miss it
+            conn.executemany("DELETE FROM snapshots WHERE user_id = ? AND seq >= ?", [row[:2] for row in rows])
+            # Imported check-ins were not coached, so they are replayed as weigh-ins
+            conn.executemany(
+                "INSERT INTO events VALUES (?, ?, 'weigh_in', ?, ?) ON CONFLICT (user_id, seq) DO UPDATE "
+                "SET recorded_on = excluded.recorded_on, data = excluded.data WHERE kind = 'weigh_in'",
+                [(row[0], row[1], row[2], json.dumps(dict(zip(CHECKIN_FIELDS, row[1:])))) for row in rows],
+            )
+            conn.executemany(
+                "UPDATE profiles SET start_weight = ?1, weeks_on_plan = ?2, bmi = ?3, bmi_category = ?4, bmi_color = ?5 "
+                "WHERE user_id = ?6 AND weeks_on_plan <= ?2",
+                latest,
+            )
+
+    @staticmethod
+    def _start_events(conn, rows):
+        """
+        Starts the event logs of (user_id, plan_start_date, onboarding JSON)
+        members over, dropping any earlier events and snapshots.
+        """
+        conn.executemany("DELETE FROM events WHERE user_id = ?", [(row[0],) for row in rows])
+        conn.executemany("DELETE FROM snapshots WHERE user_id = ?", [(row[0],) for row in rows])
+        conn.executemany("INSERT INTO events VALUES (?, 0, 'onboarding', ?, ?)", rows)
+
+    def save_snapshots(self, rows):
+        """
+        Saves (user_id, rules digest, seq, state JSON) snapshots in one transaction.
+        """
+        conn = self.connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)", rows)
+
+    def backfill_events(self):
+        """
+        Writes the events of members saved before there was an event log,
+        from their profile and check-ins: the onboarding (with the weight
+        and week before their first check-in) and every check-in. Returns
+        the number of members backfilled.
+        """
+        conn = self.connection()
+        with conn:
+            onboarding = ", ".join(f"'{f}', {f}" for f in ONBOARDING_FIELDS
+                                   if f not in ("start_weight", "weeks_on_plan"))
+            members = conn.execute(
+                f"INSERT INTO events "
+                f"SELECT p.user_id, 0, 'onboarding', p.plan_start_date, json_object({onboarding}, "
+                f"  'start_weight', COALESCE(c.start_weight_of_week, p.start_weight), "
+                f"  'weeks_on_plan', COALESCE(c.week_number - 1, p.weeks_on_plan)) "
+                f"FROM profiles p LEFT JOIN checkins c ON c.user_id = p.user_id AND c.week_number = "
+                f"  (SELECT MIN(week_number) FROM checkins WHERE user_id = p.user_id) "
+                f"WHERE NOT EXISTS (SELECT 1 FROM events e WHERE e.user_id = p.user_id)"
+            ).rowcount
+            checkin = ", ".join(f"'{f}', c.{f}" for f in CHECKIN_FIELDS)
+            conn.execute(
+                f"INSERT INTO events "
+                f"SELECT c.user_id, c.week_number, 'checkin', c.date, json_object({checkin}) FROM checkins c "
+                f"WHERE NOT EXISTS (SELECT 1 FROM events e WHERE e.user_id = c.user_id AND e.seq > 0)"
+            )
+        return members
+
+    def save_weigh_ins(self, weigh_ins, trends):
+        """
+        Bulk record_weigh_in: (user_id, date, weight) rows and the members'
+        updated trends, (user_id, *Trend) rows, in one transaction.
+        """
+        conn = self.connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO weigh_ins VALUES (?, ?, ?)", weigh_ins)
+            conn.executemany("INSERT OR REPLACE INTO trends VALUES (?, ?, ?, ?, ?, ?, ?, ?)", trends)
+
+    def trends(self, user_ids):
+        """
+        Returns {user_id: Trend} for the members that have one.
+        """
+        trends = {}
+        user_ids = list(user_ids)
+        conn = self.connection()
+        for first in range(0, len(user_ids), 500):
+            part = user_ids[first:first + 500]
+            rows = conn.execute(
+                f"SELECT user_id, {', '.join(trend.Trend._fields)} FROM trends "
+                f"WHERE user_id IN ({', '.join('?' * len(part))})", part,
+            )
+            trends.update((row[0], trend.Trend(*row[1:])) for row in rows)
+        return trends
+
+    def weigh_ins_on(self, days):
+        """
+        Returns {user_id: weight} of the members' weigh-ins on the given
+        days, from {user_id: date} (a date or ISO string).
+        """
+        weights = {}
+        days = list(days.items())
+        conn = self.connection()
+        for first in range(0, len(days), 250):
+            part = days[first:first + 250]
+            weights.update(conn.execute(
+                f"SELECT user_id, weight FROM weigh_ins WHERE (user_id, date) IN "
+                f"(VALUES {', '.join(['(?, ?)'] * len(part))})",
+                [value for user_id, day in part for value in (user_id, _to_text(day))],
+            ).fetchall())
+        return weights
+
+    def heights(self, user_ids):
+        """
+        Returns {user_id: height} for the members that exist.
+        """
+        heights = {}
+        user_ids = list(user_ids)
+        conn = self.connection()
+        for first in range(0, len(user_ids), 500): # Stay under SQLite's bound-parameter limit
+            part = user_ids[first:first + 500]
+            heights.update(conn.execute(
+                f"SELECT user_id, height FROM profiles WHERE user_id IN ({', '.join('?' * len(part))})", part,
+            ).fetchall())
+        return heights
+
+    # --- Reads ---
+
+    def load_session(self, user_id):
+        """
+        Loads what the Dashboard needs to resume a session with one indexed
+        query. Returns (profile, nutrition_plan, workout_plan), or None if
+        the member is unknown.
+        """
+        row = self.connection().execute(
+            f"SELECT {', '.join(PROFILE_FIELDS)}, nutrition_plan, workout_plan FROM profiles WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        profile = {f: row[f] for f in PROFILE_FIELDS}
+        profile['plan_start_date'] = _to_date(profile['plan_start_date'])
+        for f in CATEGORY_FIELDS:
+            if profile[f] is not None:
+                profile[f] = sys.intern(profile[f])
+        nutrition_plan = json.loads(row['nutrition_plan'])
+        nutrition_plan['notes'] = sys.intern(nutrition_plan['notes'])
+        return profile, nutrition_plan, WorkoutPlan.from_dict(json.loads(row['workout_plan']))
+
+    def load_trend(self, user_id):
+        """
+        The member's weight Trend, or None before their first weigh-in.
+        """
+        return self.trends([user_id]).get(user_id)
+
+    def load_tdee_estimate(self, user_id):
+        """
+        The member's learned tdee.Estimate, or None before their first check-in.
+        """
+        row = self.connection().execute(
+            "SELECT offset_kcal, variance, weeks FROM tdee_estimates WHERE user_id = ?", (user_id,),
+        ).fetchone()
+        return None if row is None else tdee.Estimate(*row)
+
+    def load_progress_history(self, user_id):
+        """
+        Returns the member's check-ins (oldest first) as a ProgressHistory.
+        """
+        rows = self.connection().execute(
+            f"SELECT {', '.join(CHECKIN_FIELDS)} FROM checkins WHERE user_id = ? ORDER BY week_number",
+            (user_id,),
+        )
+        return ProgressHistory.from_rows(rows)
+
+    def load_plan_version(self, user_id, week_number):
+        """
+        Rebuilds (nutrition_plan, workout_plan) as they were after the
+        check-in of `week_number` (0 is the onboarding plan): the nearest
+        keyframe plus at most KEYFRAME_EVERY diffs, read in one range scan.
+        """
+        rows = self.connection().execute(
+            "SELECT diff, nutrition_plan, workout_plan FROM plan_versions "
+            "WHERE user_id = ? AND version <= ? AND version >= ("
+            "  SELECT MAX(version) FROM plan_versions"
+            "  WHERE user_id = ? AND version <= ? AND nutrition_plan IS NOT NULL"
+            ") ORDER BY version",
+            (user_id, week_number, user_id, week_number),
+        ).fetchall()
+        if not rows:
+            return None
+        nutrition_plan, workout_plan = json.loads(rows[0][1]), WorkoutPlan.from_dict(json.loads(rows[0][2]))
+        for diff, _, _ in rows[1:]:
+            nutrition_plan, workout_plan = PlanDiff.from_dict(json.loads(diff)).apply(nutrition_plan, workout_plan)
+        return nutrition_plan, workout_plan
+
+    def load_plan_changes(self, user_id):
+        """
+        The audit trail: (week_number, PlanDiff) for every coaching change.
+        """
+        rows = self.connection().execute(
+            "SELECT version, diff FROM plan_versions WHERE user_id = ? AND version > 0 ORDER BY version",
+            (user_id,),
+        ).fetchall()
+        return [(version, PlanDiff.from_dict(json.loads(diff))) for version, diff in rows]
+
+    def user_ids(self):
+        """
+        Every member's id, in primary-key order.
+        """
+        return [row[0] for row in self.connection().execute("SELECT user_id FROM profiles ORDER BY user_id")]
+
+    def load_events(self, user_id, after=-1):
+        """
+        The member's events after sequence number `after`, oldest first,
+        as (seq, kind, data) with data as stored (dates as ISO strings).
+        """
+        rows = self.connection().execute(
+            "SELECT seq, kind, data FROM events WHERE user_id = ? AND seq > ? ORDER BY seq", (user_id, after),
+        )
+        return [(seq, kind, json.loads(data)) for seq, kind, data in rows]
+
+    def load_snapshot(self, user_id, rules):
+        """
+        The member's latest snapshot under a rule set, as (seq, state dict),
+        or None.
+        """
+        row = self.connection().execute(
+            "SELECT seq, state FROM snapshots WHERE user_id = ? AND rules = ? ORDER BY seq DESC LIMIT 1",
+            (user_id, rules),
+        ).fetchone()
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def iter_table(self, table, chunksize=10_000):
+        """
+        Streams a whole table in primary-key order, `chunksize` rows at a
+        time, for exports. Yields (column names, list of rows).
+        """
+        keys = {"profiles": "user_id", "plan_versions": "user_id, version", "checkins": "user_id, week_number"}
+        if table not in keys:
+            raise ValueError(f"Unknown table: {table}")
+        cursor = self.connection().execute(f"SELECT * FROM {table} ORDER BY {keys[table]}")
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                return
+            yield columns, rows
@@ -0,0 +1,62 @@
+"""
+Adaptive maintenance calories (TDEE) learned from check-ins.
+
+calculate_tdee's Harris-Benedict estimate can be a few hundred kcal off for
+any one member. Their check-ins say by how much: a member who ate their
+calorie target for a week and lost 0.5 kg burned about
+target + 0.5 * KCAL_PER_KG / 7 kcal a day. Each member has an Estimate of
+their offset from the formula, updated by recursive least squares (a
+scalar Kalman filter with forgetting) in O(1) per check-in:
+
+    estimate = observe(estimate, formula_tdee, intake_kcal, weight_change, noise_std)
+    maintenance(estimate, formula_tdee)   # formula + learned offset, kcal/day
+
+Older weeks count for FORGETTING less per check-in, so the estimate follows
+a member whose metabolism or activity changes. A week is noisier when the
+weight change is the raw weekly difference than when it is the smoothed
+trend (see musclemap.trend), and it is skipped when the member says they
+did not stick to their target. musclemap.cohort refits many members' full
+histories at once. Only the standard library is used.
+"""
+
+from collections import namedtuple
+
+KCAL_PER_KG = 7700 # Energy in a kilo of body weight change
+OFFSET_PRIOR_STD = 300 # kcal/day; how far off the formula is before any check-in
+TREND_NOISE_STD = 250 # kcal/day; one week's observation from the smoothed trend
+RAW_NOISE_STD = 800 # kcal/day; from the raw weekly difference (water weight swings)
+FORGETTING = 0.95 # Weight of an observation per check-in since (about 20 weeks of memory)
+MIN_CHANGE_KCAL = 25 # Smaller moves of the learned TDEE leave the nutrition plan as it is
+
+Estimate = namedtuple("Estimate", ["offset", "variance", "weeks"])
+Estimate.__doc__ = """
+One member's learned TDEE: the offset (kcal/day) from the formula, its
+variance and how many weeks went into it.
+"""
+
+PRIOR = Estimate(0.0, float(OFFSET_PRIOR_STD ** 2), 0)
+
+
+def observed_tdee(intake_kcal, weight_change):
+    """
+    The maintenance calories a week's intake and weight change (kg/week) imply.
+    """
+    return intake_kcal - weight_change * KCAL_PER_KG / 7
+
+
+def observe(estimate, formula_tdee, intake_kcal, weight_change, noise_std):
+    """
+    The estimate after one week. Starts from PRIOR if `estimate` is None.
+    """
+    estimate = estimate or PRIOR
+    variance = estimate.variance / FORGETTING
+    gain = variance / (variance + noise_std ** 2)
+    residual = observed_tdee(intake_kcal, weight_change) - formula_tdee - estimate.offset
+    return Estimate(estimate.offset + gain * residual, (1 - gain) * variance, estimate.weeks + 1)
+
+
+def maintenance(estimate, formula_tdee):
+    """
+    The learned TDEE: the formula's estimate plus the member's offset.
+    """
+    return int(round(formula_tdee + (estimate or PRIOR).offset))
@@ -0,0 +1,243 @@
+"""
+Per-rerun instrumentation for the Streamlit pages.
+
+app.py opens one rerun record per script run and wraps its main sections
+in spans:
+
+    telemetry.begin(page)
+    with telemetry.span("nutrition_panel"):
+        ...
+    telemetry.end()          # also called right before st.rerun()
+
+The body of an st.fragment is wrapped in telemetry.fragment(page, name)
+instead: a span when the whole script runs, and a rerun record of its own
+when only the fragment reruns.
+
+Each finished rerun is written as one JSON line to a rolling log
+(spans.jsonl, rotated by size) and added to in-memory histograms, which are
+exported as a Prometheus text-format file (metrics.prom, for the node
+exporter's textfile collector) at most every `flush_interval` seconds.
+
+A rerun can also be profiled: cProfile for the script thread plus
+tracemalloc (process-wide) for its allocations. The .prof file and the
+top allocations are saved under profiles/. Only the standard library is
+used, so this loads on the Onboarding page for free.
+"""
+
+import contextlib
+import cProfile
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import tracemalloc
+
+DEFAULT_DIR = os.environ.get("MUSCLEMAP_TELEMETRY_DIR", "telemetry")
+# The "?_profile=<key>" switch only works when this is set on the server
+PROFILE_KEY = os.environ.get("MUSCLEMAP_PROFILE_KEY")
+
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+TOP_ALLOCATIONS = 25
+PROFILE_TIMEOUT = 300 # Seconds before a profiled rerun that never ended (an exception) is given up
+
+# Histogram bucket upper bounds in seconds (Prometheus convention)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Rerun:
+    __slots__ = ("page", "started", "spans", "profiler")
+
+    def __init__(self, page, profiler):
+        self.page = page
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.profiler = profiler
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+
+class Telemetry:
+    """
+    Span timings for every session on this server. Safe to share between
+    threads: each Streamlit script thread has its own current rerun.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, flush_interval=5.0, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.join(directory, "profiles"), exist_ok=True)
+        self._log = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, "spans.jsonl"), maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiled = None # The rerun being profiled; one at a time
+        self._histograms = {} # (metric, page, span) -> _Histogram
+        self._last_flush = 0.0
+
+    # --- Recording ---
+
+    def begin(self, page, profile=False):
+        """
+        Starts this thread's rerun record (dropping any that was not ended,
+        e.g. after an exception). With `profile`, the rerun is profiled.
+        """
+        rerun = _Rerun(page, None)
+        if profile:
+            with self._lock:
+                busy = self._profiled is not None and rerun.started - self._profiled.started < PROFILE_TIMEOUT
+                if not busy:
+                    tracemalloc.stop() # In case a profiled rerun was abandoned
+                    tracemalloc.start()
+                    self._profiled = rerun
+                    rerun.profiler = cProfile.Profile()
+            if rerun.profiler is not None:
+                rerun.profiler.enable()
+        self._local.rerun = rerun
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """
+        Times the block as `name` in the current rerun. Repeated spans add up.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            rerun = getattr(self._local, "rerun", None)
+            if rerun is not None:
+                rerun.spans[name] = rerun.spans.get(name, 0.0) + time.perf_counter() - started
+
+    @contextlib.contextmanager
+    def fragment(self, page, name):
+        """
+        Times the body of an st.fragment. In a full rerun it is a span
+        like any other. When the fragment reruns on its own (the rest of
+        the script is skipped), it gets its own rerun record for the page
+        "<page>/<name>".
+        """
+        if getattr(self._local, "rerun", None) is not None:
+            with self.span(name):
+                yield
+            return
+        self.begin(f"{page}/{name}")
+        try:
+            with self.span(name):
+                yield
+        finally:
+            self.end()
+
+    def end(self):
+        """
+        Finishes the current rerun: writes its JSON line, updates the
+        histograms and saves the profile if there was one. Does nothing
+        if the rerun was already ended.
+        """
+        rerun = getattr(self._local, "rerun", None)
+        if rerun is None:
+            return
+        self._local.rerun = None
+        total = time.perf_counter() - rerun.started
+        record = {
+            "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "page": rerun.page,
+            "total_ms": round(total * 1000, 3),
+            "spans": {name: round(seconds * 1000, 3) for name, seconds in rerun.spans.items()},
+        }
+        if rerun.profiler is not None:
+            record['profile'] = self._save_profile(rerun)
+        self._log.handle(logging.makeLogRecord({"msg": json.dumps(record)}))
+
+        with self._lock:
+            self._observe("musclemap_rerun_seconds", rerun.page, None, total)
+            for name, seconds in rerun.spans.items():
+                self._observe("musclemap_span_seconds", rerun.page, name, seconds)
+            flush = time.monotonic() - self._last_flush >= self.flush_interval
+        if flush:
+            self.write_metrics()
+
+    def _observe(self, metric, page, span, seconds):
+        key = (metric, page, span)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram()
+        histogram.observe(seconds)
+
+    def _save_profile(self, rerun):
+        rerun.profiler.disable()
+        with self._lock:
+            if self._profiled is not rerun: # Timed out and taken over by another rerun
+                return None
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self._profiled = None
+
+        stem = os.path.join(
+            self.directory, "profiles",
+            f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{rerun.page.lower().replace('/', '-')}",
+        )
+        rerun.profiler.dump_stats(stem + ".prof")
+        with open(stem + ".alloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n\n")
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        return {"path": stem + ".prof", "peak_kib": round(peak / 1024, 1)}
+
+    # --- Export ---
+
+    def write_metrics(self):
+        """
+        Writes every histogram to metrics.prom, replacing the file atomically
+        so the collector never reads half of it.
+        """
+        with self._lock:
+            self._last_flush = time.monotonic()
+            histograms = sorted(self._histograms.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or ""))
+            lines = []
+            for metric, help_text in (
+                ("musclemap_rerun_seconds", "Duration of a Streamlit script run."),
+                ("musclemap_span_seconds", "Duration of an instrumented section of a script run."),
+            ):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                for (name, page, span), histogram in histograms:
+                    if name != metric:
+                        continue
+                    labels = f'page="{page}"' + (f',span="{span}"' if span else "")
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.total:.6f}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+            path = os.path.join(self.directory, "metrics.prom")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(path + ".tmp", path)
+
+
+def wants_profile(query_value):
+    """
+    True if the hidden "?_profile=<key>" switch matches MUSCLEMAP_PROFILE_KEY.
+    """
+    return bool(PROFILE_KEY) and query_value == PROFILE_KEY
@@ -0,0 +1,449 @@
+"""
+Streaming bulk import and export of members.
+
+Moves profiles, plans and check-in logs between the store and CSV or
+Parquet files (picked by the file extension) in fixed-size chunks, so
+memory use does not grow with the file:
+
+    python -m musclemap.transfer import-profiles members.parquet
+    python -m musclemap.transfer import-checkins weigh_ins.csv --rejects bad_rows.csv
+    python -m musclemap.transfer import-weigh-ins scale_sync.csv
+    python -m musclemap.transfer export-checkins checkins.parquet
+
+Imports are checked against the same ranges and options as the Onboarding
+and check-in forms (see musclemap.brain). Invalid rows are skipped and
+written to the --rejects file, with the line number and the reason. Each
+valid chunk is computed with the vectorized cohort functions (TDEE, BMI,
+first nutrition plan) and written in one transaction.
+
+Profile columns: user_id, age, gender, activity_level, height,
+start_weight, goal, experience_level, plus the optional plan_start_date
+(default: today) and weeks_on_plan (default: 0). Other columns are
+ignored, so an export-profiles file can be imported again. A user_id is
+1-64 letters, digits, - or _ (it names the member's report file).
+
+Check-in columns: user_id, week_number, date, current_weight, plus the
+optional start_weight_of_week and the four form answers. When
+start_weight_of_week is missing, it is the member's previous weigh-in in
+the file, so the file should be sorted by member and week. A missing
+answer is stored as "" (not recorded). Importing check-ins also moves each
+member's profile (current weight, week, BMI) forward to their last one.
+
+Weigh-in columns: user_id, date, weight. Each chunk moves every member's
+weight trend (see musclemap.trend) on in one vectorized pass per round
+of weigh-ins: the first of each member's in the chunk, then the second,
+and so on, so a daily file with one weigh-in per member is one pass. A weigh-in older
+than the member's trend is saved but does not move it, so a history file
+should be sorted by date.
+"""
+
+import argparse
+import datetime
+import functools
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from musclemap.brain import (
+    ACTIVITY_LEVELS, AGE_RANGE, EXPERIENCE_LEVELS, GENDERS, GOALS, HEIGHT_RANGE_CM, WEIGHT_RANGE_KG,
+    get_initial_workout_plan,
+)
+from musclemap.cohort import calculate_bmi_details_batch, onboard_cohort, update_trends_batch
+from musclemap.history import ANSWER_FIELDS, ANSWER_OPTIONS
+from musclemap.store import CHECKIN_FIELDS, PROFILE_FIELDS, USER_ID_PATTERN, Store
+from musclemap.trend import Trend
+
+DEFAULT_CHUNKSIZE = 50_000
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+PROFILE_OPTIONS = {
+    "gender": GENDERS, "activity_level": ACTIVITY_LEVELS, "goal": GOALS, "experience_level": EXPERIENCE_LEVELS,
+}
+PROFILE_RANGES = {"age": AGE_RANGE, "height": HEIGHT_RANGE_CM, "start_weight": WEIGHT_RANGE_KG}
+CHECKIN_RANGES = {"current_weight": WEIGHT_RANGE_KG, "start_weight_of_week": WEIGHT_RANGE_KG}
+WEIGH_IN_RANGES = {"weight": WEIGHT_RANGE_KG}
+
+# The columns a profile import reads; others (e.g. an export's computed ones) are ignored
+PROFILE_COLUMNS = [
+    "user_id", "age", "gender", "activity_level", "height", "start_weight", "goal", "experience_level",
+    "plan_start_date", "weeks_on_plan",
+]
+# The nutrition plan columns onboard_cohort adds, in get_initial_nutrition_plan's key order
+NUTRITION_FIELDS = ["calories_kcal", "protein_g", "fats_g", "carbs_g", "notes"]
+
+
+# --- Chunked file reading and writing ---
+
+def read_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yields DataFrames of at most `chunksize` rows, with every column as
+    text (values are converted and validated by the importer).
+    """
+    if path.lower().endswith(PARQUET_EXTENSIONS):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas().astype(object).where(lambda df: df.notna(), None)
+    else:
+        yield from pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+
+
+class ChunkWriter:
+    """
+    Appends DataFrames to one CSV or Parquet file. The first chunk sets
+    the columns (and the Parquet schema).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.lower().endswith(PARQUET_EXTENSIONS)
+        self._writer = None
+        self._file = None
+
+    def write(self, df):
+        if not len(df):
+            return
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # Text columns as strings, even when a chunk has only blanks
+            df = df.astype({column: "string" for column in df.columns if df[column].dtype == object})
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            if self._file is None:
+                self._file = open(self.path, "w", newline="", encoding="utf-8")
+                df.to_csv(self._file, index=False)
+            else:
+                df.to_csv(self._file, index=False, header=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Validation ---
+
+def _blank(values):
+    return values.isna() | (values.astype(str).str.strip() == "")
+
+
+def validate(chunk, first_line, required, numbers=None, ranges=None, options=None, dates=(), checks=()):
+    """
+    Converts and checks one chunk of text columns:
+      - required: columns that must be filled in
+      - numbers:  {column: int or float}
+      - ranges:   {column: (min, max)}, inclusive, like the number inputs
+      - options:  {column: allowed values} (blank is allowed if not required)
+      - dates:    columns of ISO dates
+      - checks:   (function of the converted rows -> bad mask, message)
+    Returns (valid converted rows, rejects). Rejects are the original rows
+    with the file line number and the first problem found.
+    """
+    missing = [column for column in required if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    errors = pd.Series("", index=chunk.index, dtype=object)
+
+    def reject(mask, message):
+        errors[mask & (errors == "")] = message
+
+    converted = chunk.copy()
+    for column in required:
+        reject(_blank(chunk[column]), f"{column} is empty")
+    for column, kind in (numbers or {}).items():
+        if column in chunk.columns:
+            values = pd.to_numeric(chunk[column].where(~_blank(chunk[column])), errors="coerce")
+            reject(values.isna() & ~_blank(chunk[column]), f"{column} is not a number")
+            if kind is int:
+                reject(values.notna() & (values != np.trunc(values)), f"{column} is not a whole number")
+            converted[column] = values
+    for column, (low, high) in (ranges or {}).items():
+        if column in converted.columns:
+            values = converted[column]
+            reject(values.notna() & ((values < low) | (values > high)), f"{column} must be between {low} and {high}")
+    for column, allowed in (options or {}).items():
+        if column in chunk.columns:
+            reject(~chunk[column].isin(allowed) & ~_blank(chunk[column]), f"{column} must be one of {allowed}")
+    for column in dates:
+        values = pd.to_datetime(chunk[column].where(~_blank(chunk[column])), errors="coerce", format="ISO8601")
+        reject(values.isna() & ~_blank(chunk[column]), f"{column} is not a date (YYYY-MM-DD)")
+        converted[column] = values.dt.strftime("%Y-%m-%d")
+    for check, message in checks:
+        ok = errors == ""
+        reject(ok & check(converted[ok]).reindex(chunk.index, fill_value=False), message)
+
+    bad = (errors != "").to_numpy()
+    rejects = chunk[bad].copy()
+    rejects.insert(0, "error", errors[bad])
+    rejects.insert(0, "line", np.flatnonzero(bad) + first_line)
+    return converted[~bad], rejects
+
+
+# --- Imports ---
+
+@functools.lru_cache(maxsize=None)
+def _workout_json(goal, experience):
+    return json.dumps(get_initial_workout_plan(goal, experience).to_dict())
+
+
+def import_profiles(store, path, chunksize=DEFAULT_CHUNKSIZE, rejects_path=None):
+    """
+    Onboards every valid member in the file. Returns (imported, rejected).
+    """
+    imported = rejected = 0
+    today = datetime.date.today().isoformat()
+    first_line = 2 # Line 1 is the header
+    with ChunkWriter(rejects_path) if rejects_path else _NoWriter() as rejects_out:
+        for chunk in read_chunks(path, chunksize):
+            for column, default in (("plan_start_date", today), ("weeks_on_plan", "0")):
+                if column not in chunk.columns:
+                    chunk[column] = default
+                chunk[column] = chunk[column].where(~_blank(chunk[column]), default)
+            profiles, rejects = validate(
+                chunk, first_line,
+                required=["user_id", "age", "height", "start_weight", *PROFILE_OPTIONS],
+                numbers={"age": int, "height": float, "start_weight": float, "weeks_on_plan": int},
+                ranges={**PROFILE_RANGES, "weeks_on_plan": (0, 10_000)},
+                options=PROFILE_OPTIONS,
+                dates=["plan_start_date"],
+                checks=[(
+                    lambda rows: ~rows['user_id'].astype(str).str.fullmatch(USER_ID_PATTERN.pattern),
+                    "user_id must be 1-64 letters, digits, - or _",
+                )],
+            )
+            if len(profiles):
+                profiles = profiles[PROFILE_COLUMNS].astype({"age": "int64", "weeks_on_plan": "int64"})
+                store.import_members(_member_rows(onboard_cohort(profiles)))
+            rejects_out.write(rejects)
+            first_line += len(chunk)
+            imported += len(profiles)
+            rejected += len(rejects)
+    return imported, rejected
+
+
+def _member_rows(onboarded):
+    """
+    Store rows for onboarded profiles, with the plans as JSON text built
+    column-wise (the nutrition plans' notes are one of three constants).
+    """
+    nutrition = (
+        '{"calories_kcal": ' + onboarded['calories_kcal'].astype(str)
+        + ', "protein_g": ' + onboarded['protein_g'].astype(str)
+        + ', "fats_g": ' + onboarded['fats_g'].astype(str)
+        + ', "carbs_g": ' + onboarded['carbs_g'].astype(str)
+        + ', "notes": ' + onboarded['notes'].map(json.dumps).astype(str) + '}'
+    )
+    workout = [_workout_json(goal, experience) for goal, experience in zip(onboarded['goal'], onboarded['experience_level'])]
+    columns = [onboarded['user_id'].astype(str)] + [onboarded[f].astype(object) for f in PROFILE_FIELDS]
+    return zip(*columns, nutrition, workout)
+
+
+def import_checkins(store, path, chunksize=DEFAULT_CHUNKSIZE, rejects_path=None):
+    """
+    Adds every valid check-in in the file for members already in the store.
+    Returns (imported, rejected).
+    """
+    imported = rejected = 0
+    previous = None # (user_id, weight) of the last check-in of the previous chunk
+    first_line = 2
+    with ChunkWriter(rejects_path) if rejects_path else _NoWriter() as rejects_out:
+        for chunk in read_chunks(path, chunksize):
+            for column in ANSWER_FIELDS + ["start_weight_of_week"]:
+                if column not in chunk.columns:
+                    chunk[column] = ""
+            heights = store.heights(chunk['user_id'].unique())
+            checkins, rejects = validate(
+                chunk, first_line,
+                required=["user_id", "week_number", "date", "current_weight"],
+                numbers={"week_number": int, "current_weight": float, "start_weight_of_week": float},
+                ranges={**CHECKIN_RANGES, "week_number": (1, 10_000)},
+                options=ANSWER_OPTIONS,
+                dates=["date"],
+                checks=[(lambda rows: ~rows['user_id'].isin(list(heights)), "user_id is not a member")],
+            )
+            if len(checkins):
+                checkins = checkins.astype({"week_number": "int64"})
+                checkins['start_weight_of_week'], previous = _start_weights(checkins, previous)
+                rows = zip(checkins['user_id'], *(checkins[f].astype(object) for f in CHECKIN_FIELDS))
+                store.import_checkins(rows, _latest_rows(checkins, heights))
+            rejects_out.write(rejects)
+            first_line += len(chunk)
+            imported += len(checkins)
+            rejected += len(rejects)
+    return imported, rejected
+
+
+def import_weigh_ins(store, path, chunksize=DEFAULT_CHUNKSIZE, rejects_path=None):
+    """
+    Adds every valid weigh-in in the file for members already in the store
+    and moves their trends on. Returns (imported, rejected).
+    """
+    imported = rejected = 0
+    first_line = 2
+    with ChunkWriter(rejects_path) if rejects_path else _NoWriter() as rejects_out:
+        for chunk in read_chunks(path, chunksize):
+            heights = store.heights(chunk['user_id'].unique())
+            weigh_ins, rejects = validate(
+                chunk, first_line,
+                required=["user_id", "date", "weight"],
+                numbers={"weight": float},
+                ranges=WEIGH_IN_RANGES,
+                dates=["date"],
+                checks=[(lambda rows: ~rows['user_id'].isin(list(heights)), "user_id is not a member")],
+            )
+            if len(weigh_ins):
+                store.save_weigh_ins(*_trend_rows(store, weigh_ins))
+            rejects_out.write(rejects)
+            first_line += len(chunk)
+            imported += len(weigh_ins)
+            rejected += len(rejects)
+    return imported, rejected
+
+
+def _trend_rows(store, weigh_ins):
+    """
+    (weigh-in rows, trend rows) for Store.save_weigh_ins: each member's
+    stored trend moved on by their weigh-ins in date order, one
+    update_trends_batch call per round. Like record_weigh_in, the last
+    weigh-in of a day counts: it replaces one already on the trend's day.
+    """
+    weigh_ins = weigh_ins.drop_duplicates(["user_id", "date"], keep="last")
+    weigh_ins = weigh_ins.sort_values(["user_id", "date"], kind="stable")
+    users = weigh_ins['user_id'].unique()
+    stored = store.trends(users)
+    trends = pd.DataFrame.from_records(
+        [stored.get(user_id, Trend(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0)) for user_id in users],
+        columns=Trend._fields, index=users,
+    )
+    days = pd.to_datetime(weigh_ins['date']).map(datetime.date.toordinal)
+    last_day = weigh_ins['user_id'].map(trends['day'])
+    same_day = store.weigh_ins_on({user_id: datetime.date.fromordinal(t.day) for user_id, t in stored.items()})
+    replaces = weigh_ins['user_id'].map(same_day).where(days == last_day).astype(np.float64)
+    rounds = weigh_ins.groupby("user_id", sort=False).cumcount()
+    for n in range(rounds.max() + 1):
+        now = (rounds == n).to_numpy()
+        members = weigh_ins['user_id'][now].to_numpy()
+        trends.loc[members] = update_trends_batch(
+            trends.loc[members], days[now], weigh_ins['weight'][now], replaces[now],
+        ).to_numpy()
+    trends = trends.astype({"day": "int64", "weigh_ins": "int64"})
+    rows = zip(weigh_ins['user_id'], weigh_ins['date'], weigh_ins['weight'].astype(object))
+    return rows, zip(trends.index, *(trends[field].astype(object) for field in Trend._fields))
+
+
+def _start_weights(checkins, previous):
+    """
+    Fills missing start weights with the member's previous weigh-in (or,
+    for their first one, the weigh-in itself). Returns (start weights,
+    the carry-over for the next chunk).
+    """
+    users, weights = checkins['user_id'], checkins['current_weight']
+    before = weights.groupby(users, sort=False).shift(1)
+    if previous is not None:
+        before[(users == previous[0]) & before.isna()] = previous[1]
+    starts = checkins['start_weight_of_week'].fillna(before).fillna(weights)
+    return starts, (users.iloc[-1], weights.iloc[-1])
+
+
+def _latest_rows(checkins, heights):
+    """
+    One profile update per member: their last check-in in this chunk, with
+    the BMI recomputed in bulk.
+    """
+    last = checkins.sort_values("week_number", kind="stable").groupby("user_id", sort=False).tail(1)
+    bmi = calculate_bmi_details_batch(last['current_weight'], last['user_id'].map(heights))
+    return zip(
+        last['current_weight'].astype(object), last['week_number'].astype(object), bmi['bmi'].astype(object),
+        bmi['bmi_category'].astype(object), bmi['bmi_color'].astype(object), last['user_id'],
+    )
+
+
+class _NoWriter:
+    """
+    Stands in for the rejects ChunkWriter when no --rejects file was given.
+    """
+
+    def write(self, df):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+# --- Exports ---
+
+def export_profiles(store, path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Writes every member with their current plans: the nutrition plan as
+    columns and the workout plan as JSON text. Returns the row count.
+    """
+    rows = 0
+    with ChunkWriter(path) as out:
+        for columns, chunk in store.iter_table("profiles", chunksize):
+            df = pd.DataFrame.from_records([tuple(row) for row in chunk], columns=columns)
+            nutrition = pd.DataFrame.from_records(df.pop('nutrition_plan').map(json.loads).tolist(), columns=NUTRITION_FIELDS)
+            nutrition.columns = [f"nutrition_{field}" for field in NUTRITION_FIELDS]
+            out.write(pd.concat([df, nutrition], axis=1))
+            rows += len(df)
+    return rows
+
+
+def export_table(store, table, path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Writes a table as it is stored (checkins, or plan_versions for the
+    full plan history). Returns the row count.
+    """
+    rows = 0
+    with ChunkWriter(path) as out:
+        for columns, chunk in store.iter_table(table, chunksize):
+            out.write(pd.DataFrame.from_records([tuple(row) for row in chunk], columns=columns))
+            rows += len(chunk)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of members (CSV or Parquet).")
+    parser.add_argument("command", choices=["import-profiles", "import-checkins", "import-weigh-ins", "export-profiles", "export-plans", "export-checkins"])
+    parser.add_argument("path", help="file to read or write (.csv, .parquet)")
+    parser.add_argument("--db", default=None, help="database file (default: $MUSCLEMAP_DB or musclemap.db)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help=f"rows per chunk (default: {DEFAULT_CHUNKSIZE})")
+    parser.add_argument("--rejects", help="imports: write invalid rows and the reasons here")
+    args = parser.parse_args(argv)
+
+    store = Store(args.db) if args.db else Store()
+    if args.command == "import-profiles":
+        imported, rejected = import_profiles(store, args.path, args.chunksize, args.rejects)
+        print(f"Imported {imported} members, rejected {rejected} rows.", file=sys.stderr)
+    elif args.command == "import-checkins":
+        imported, rejected = import_checkins(store, args.path, args.chunksize, args.rejects)
+        print(f"Imported {imported} check-ins, rejected {rejected} rows.", file=sys.stderr)
+    elif args.command == "import-weigh-ins":
+        imported, rejected = import_weigh_ins(store, args.path, args.chunksize, args.rejects)
+        print(f"Imported {imported} weigh-ins, rejected {rejected} rows.", file=sys.stderr)
+    elif args.command == "export-profiles":
+        print(f"Exported {export_profiles(store, args.path, args.chunksize)} members.", file=sys.stderr)
+    else:
+        table = "plan_versions" if args.command == "export-plans" else "checkins"
+        print(f"Exported {export_table(store, table, args.path, args.chunksize)} rows.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
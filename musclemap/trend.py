@@ -0,0 +1,85 @@
+"""
+Smoothed weight trend from daily weigh-ins.
+
+A single weigh-in swings by a kilo or more with water and food, so the
+difference between two weekly weigh-ins is mostly noise. Each member has
+a small Kalman filter instead, a "local linear trend": the state is their
+underlying weight (level, kg) and its rate of change (slope, kg per day),
+with a 2x2 covariance. Every weigh-in updates it in O(1), whatever the
+gap since the last one:
+
+    trend = update(trend, day, weight)   # day = date.toordinal()
+    weekly_change(trend)                 # kg/week, or None while unsettled
+
+Only the last weigh-in of a day counts: a later one on the same day
+replaces the earlier one's reading instead of adding a second.
+
+The AI Coach's weight thresholds run on the trend's weekly change once
+it has settled (its slope is known to within SETTLED_STD_KG_PER_WEEK),
+and on the raw weekly difference before that. musclemap.cohort has the
+same update for many members at once. Only the standard library is used.
+"""
+
+import math
+from collections import namedtuple
+
+WEIGH_IN_NOISE_KG = 0.35 # Std. dev. of day-to-day (water weight) swings
+SLOPE_CHANGE = 1e-4 # Process noise: how fast the slope itself drifts, (kg/day)^2 per day
+SLOPE_PRIOR_STD = 0.1 # kg/day; what we know about the slope before the second weigh-in
+SETTLED_STD_KG_PER_WEEK = 0.25 # A slope this certain is used by the coach
+
+Trend = namedtuple("Trend", ["day", "level", "slope", "p00", "p01", "p11", "weigh_ins"])
+Trend.__doc__ = """
+One member's filter: the day of the last weigh-in (an ordinal), the
+estimated weight and slope (kg/day), the covariance of (level, slope)
+and how many weigh-ins went into it.
+"""
+
+
+def start(day, weight):
+    """
+    The filter after a member's first weigh-in.
+    """
+    return Trend(day, float(weight), 0.0, WEIGH_IN_NOISE_KG ** 2, 0.0, SLOPE_PRIOR_STD ** 2, 1)
+
+
+def update(trend, day, weight, replaces=None):
+    """
+    The filter after a weigh-in on `day`. Starts one if `trend` is None;
+    a weigh-in older than the last one is ignored. `replaces` is the
+    weight of an earlier weigh-in on the trend's last day, if this one
+    is on the same day: the filter then takes this reading instead.
+    """
+    if trend is None:
+        return start(day, weight)
+    dt = day - trend.day
+    if dt < 0:
+        return trend
+    if dt == 0 and replaces is not None:
+        # The correction is linear in the reading, with a gain of
+        # (p00, p01) / noise, so swapping the reading only shifts the state
+        change = (weight - replaces) / WEIGH_IN_NOISE_KG ** 2
+        return trend._replace(level=trend.level + trend.p00 * change, slope=trend.slope + trend.p01 * change)
+    # Predict: the level moves along the slope, and both get less certain
+    level = trend.level + dt * trend.slope
+    p00 = trend.p00 + 2 * dt * trend.p01 + dt * dt * trend.p11 + SLOPE_CHANGE * dt ** 3 / 3
+    p01 = trend.p01 + dt * trend.p11 + SLOPE_CHANGE * dt * dt / 2
+    p11 = trend.p11 + SLOPE_CHANGE * dt
+    # Correct with the weigh-in
+    s = p00 + WEIGH_IN_NOISE_KG ** 2
+    k0, k1 = p00 / s, p01 / s
+    residual = weight - level
+    return Trend(
+        day, level + k0 * residual, trend.slope + k1 * residual,
+        (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01, trend.weigh_ins + 1,
+    )
+
+
+def weekly_change(trend):
+    """
+    The trend's weight change in kg per week, or None if there is no
+    trend yet or its slope is still too uncertain to coach on.
+    """
+    if trend is None or trend.weigh_ins < 2 or math.sqrt(trend.p11) * 7 > SETTLED_STD_KG_PER_WEEK:
+        return None
+    return trend.slope * 7
@@ -0,0 +1,133 @@
+"""
+Plan versioning with structural sharing.
+
+get_ai_recommendation never changes a plan in place: it returns the same
+plan objects when nothing changed, and new objects that share everything
+unchanged otherwise (workout plans are immutable, see musclemap.workouts).
+This module records each check-in's change as a small PlanDiff on top of
+the previous version instead of another full copy:
+
+    {"nutrition": {"calories_kcal": 150, "carbs_g": 38}}
+    {"workout_notes": " AI UPDATE: Add one 30-minute cardio session this week."}
+
+The store (musclemap.store) keeps a full keyframe every KEYFRAME_EVERY
+versions, so any past week's plan is rebuilt by applying at most that
+many diffs. That gives a complete audit trail of every coaching change
+without N full copies.
+"""
+
+from collections import namedtuple
+
+from musclemap.workouts import WorkoutDay
+
+KEYFRAME_EVERY = 8 # Diffs between full copies; bounds the cost of rebuilding a past plan
+
+
+class PlanDiff(namedtuple("PlanDiff", ["nutrition", "workout_notes", "workout", "days"])):
+    """
+    The change from one plan version to the next.
+      - nutrition:     {key: amount added} for numbers, {key: new value} otherwise
+      - workout_notes: text appended to the workout notes
+      - workout:       {field: new value} for other changed workout fields
+      - days:          {index: WorkoutDay} for changed days of the schedule
+    """
+    __slots__ = ()
+
+    @classmethod
+    def between(cls, old_nutrition, old_workout, new_nutrition, new_workout):
+        """
+        Works out the diff between two versions. Thanks to structural
+        sharing, unchanged plans and days are found by identity and cost
+        nothing to compare.
+        """
+        nutrition = {}
+        if new_nutrition is not old_nutrition:
+            for key, value in new_nutrition.items():
+                old = old_nutrition.get(key)
+                if value == old:
+                    continue
+                if _is_number(value) and _is_number(old):
+                    nutrition[key] = value - old
+                else:
+                    nutrition[key] = value
+
+        workout_notes, workout, days = "", {}, {}
+        if new_workout is not old_workout:
+            if new_workout.notes != old_workout.notes:
+                if new_workout.notes.startswith(old_workout.notes):
+                    workout_notes = new_workout.notes[len(old_workout.notes):]
+                else:
+                    workout['notes'] = new_workout.notes
+            for field in ("split_type", "frequency_per_week"):
+                if getattr(new_workout, field) != getattr(old_workout, field):
+                    workout[field] = getattr(new_workout, field)
+            if new_workout.weekly_schedule is not old_workout.weekly_schedule:
+                if len(new_workout.weekly_schedule) != len(old_workout.weekly_schedule):
+                    workout['weekly_schedule'] = new_workout.weekly_schedule
+                else:
+                    days = {
+                        i: day for i, (day, old_day) in enumerate(zip(new_workout.weekly_schedule, old_workout.weekly_schedule))
+                        if day is not old_day and day != old_day
+                    }
+        return cls(nutrition, workout_notes, workout, days)
+
+    def __bool__(self):
+        return bool(self.nutrition or self.workout_notes or self.workout or self.days)
+
+    def apply(self, nutrition_plan, workout_plan):
+        """
+        Returns the plans with this diff applied. Unchanged plans are
+        returned as they are; changed ones share all unchanged parts.
+        """
+        if self.nutrition:
+            nutrition_plan = dict(nutrition_plan)
+            for key, value in self.nutrition.items():
+                if _is_number(value) and _is_number(nutrition_plan.get(key)):
+                    nutrition_plan[key] += value
+                else:
+                    nutrition_plan[key] = value
+        if self.workout_notes:
+            workout_plan = workout_plan.with_note(self.workout_notes)
+        if self.workout:
+            workout_plan = workout_plan._replace(**self.workout)
+        if self.days:
+            schedule = list(workout_plan.weekly_schedule)
+            for i, day in self.days.items():
+                schedule[i] = day
+            workout_plan = workout_plan._replace(weekly_schedule=tuple(schedule))
+        return nutrition_plan, workout_plan
+
+    def to_dict(self):
+        """
+        A JSON-ready dict with only the parts that changed.
+        """
+        diff = {}
+        if self.nutrition:
+            diff['nutrition'] = self.nutrition
+        if self.workout_notes:
+            diff['workout_notes'] = self.workout_notes
+        if self.workout:
+            diff['workout'] = {
+                field: [day.to_dict() for day in value] if field == "weekly_schedule" else value
+                for field, value in self.workout.items()
+            }
+        if self.days:
+            diff['days'] = {str(i): day.to_dict() for i, day in self.days.items()}
+        return diff
+
+    @classmethod
+    def from_dict(cls, diff):
+        workout = dict(diff.get('workout', {}))
+        if 'weekly_schedule' in workout:
+            workout['weekly_schedule'] = tuple(WorkoutDay.from_dict(day) for day in workout['weekly_schedule'])
+        return cls(
+            diff.get('nutrition', {}),
+            diff.get('workout_notes', ""),
+            workout,
+            {int(i): WorkoutDay.from_dict(day) for i, day in diff.get('days', {}).items()},
+        )
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
@@ -0,0 +1,232 @@
+"""
+Structured workout plans.
+
+A plan is a small tree of immutable objects:
+  WorkoutPlan -> WorkoutDay (one per day of the week) -> Exercise
+
+Exercises keep their sets, rep range and load as fields instead of free
+text like "Squats: 4 sets of 6-8 reps", so the coach can change them with
+structured transforms (see WorkoutPlan.with_rep_scheme). They still render
+to exactly the text the Dashboard has always shown.
+
+All classes are tuples with __slots__ = (), so they cannot be changed after
+they are built. The templates for every goal x experience combination are
+built once at import, and every member's plan shares them. A transform only
+creates new objects for the parts it changes.
+"""
+
+import ast
+import functools
+import re
+import sys
+from collections import namedtuple
+
+
+MAX_LEGACY_DAY_CHARS = 4096 # The longest old day is under 400 characters
+
+
+class Exercise(namedtuple("Exercise", ["name", "sets", "reps_low", "reps_high", "unit", "per", "load_kg"])):
+    """
+    One exercise prescription, e.g. Squats for 3 sets of 8-10 reps.
+    An exercise with 0 sets is a free-text instruction (its name is the text).
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, sets=0, reps_low=0, reps_high=None, unit="reps", per="", load_kg=None):
+        if reps_high is None:
+            reps_high = reps_low
+        return super().__new__(cls, name, sets, reps_low, reps_high, unit, per, load_kg)
+
+    def __str__(self):
+        if not self.sets:
+            return self.name
+        reps = f"{self.reps_low}" if self.reps_low == self.reps_high else f"{self.reps_low}-{self.reps_high}"
+        sets = "1 set" if self.sets == 1 else f"{self.sets} sets"
+        load = f" @ {self.load_kg:g} kg" if self.load_kg else ""
+        return f"{self.name}: {sets} of {reps} {self.unit}{self.per}{load}"
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Builds an Exercise from its rendered text (the old string format).
+        """
+        match = _EXERCISE_PATTERN.match(text)
+        if match is None:
+            return cls(text)
+        load = match['load']
+        return cls(
+            match['name'], int(match['sets']), int(match['low']), int(match['high'] or match['low']),
+            match['unit'], match['per'] or "", float(load) if load else None,
+        )
+
+
+_EXERCISE_PATTERN = re.compile(
+    r"^(?P<name>.+?): (?P<sets>\d+) sets? of (?P<low>\d+)(?:-(?P<high>\d+))? (?P<unit>reps|seconds)"
+    r"(?P<per> per leg)?(?: @ (?P<load>[\d.]+) kg)?$"
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def _shared_exercise(text):
+    """
+    Exercise.parse, memoized: plans loaded from the store share their
+    Exercise objects (most are the templates' exercises) across sessions.
+    """
+    return Exercise.parse(text)
+
+
+class WorkoutDay(namedtuple("WorkoutDay", ["day", "focus", "exercises"])):
+    """
+    One day of the weekly schedule. Rest days have no exercises.
+    """
+    __slots__ = ()
+
+    def __new__(cls, day, focus, exercises=()):
+        return super().__new__(cls, day, focus, tuple(exercises))
+
+    def to_dict(self):
+        """
+        The day in the old dict format, e.g. {"day": "Day 1", "focus": ..., "exercises": [...]}.
+        """
+        day = {"day": self.day, "focus": self.focus}
+        if self.exercises:
+            day['exercises'] = [str(exercise) for exercise in self.exercises]
+        return day
+
+    @classmethod
+    def from_dict(cls, day):
+        if isinstance(day, str):
+            day = _legacy_day(day)
+        exercises = [_shared_exercise(text) for text in day.get('exercises', [])]
+        return cls(sys.intern(day['day']), sys.intern(day['focus']), exercises)
+
+
+def _legacy_day(text):
+    """
+    A day saved by the old rep-scheme update, which turned each day dict
+    into its text. Only that format is evaluated.
+    """
+    if len(text) > MAX_LEGACY_DAY_CHARS or not text.startswith("{'day': "):
+        raise ValueError(f"not a saved workout day: {text[:40]!r}")
+    day = ast.literal_eval(text)
+    if not isinstance(day, dict):
+        raise ValueError(f"not a saved workout day: {text[:40]!r}")
+    return day
+
+
+class WorkoutPlan(namedtuple("WorkoutPlan", ["split_type", "frequency_per_week", "notes", "weekly_schedule"])):
+    """
+    A weekly training plan. Use the with_* methods to get changed copies.
+    """
+    __slots__ = ()
+
+    def __new__(cls, split_type, frequency_per_week, notes, weekly_schedule):
+        return super().__new__(cls, split_type, frequency_per_week, notes, tuple(weekly_schedule))
+
+    def with_note(self, note):
+        """
+        Returns the plan with `note` appended to its notes.
+        """
+        return self._replace(notes=self.notes + note)
+
+    def with_rep_scheme(self, old, new):
+        """
+        Returns the plan with every exercise done for the `old` rep range
+        (a (low, high) pair) moved to the `new` one. Days without such
+        exercises are shared with this plan, not copied.
+        """
+        days = []
+        for day in self.weekly_schedule:
+            if any((e.reps_low, e.reps_high) == old for e in day.exercises if e.sets):
+                day = day._replace(exercises=tuple(
+                    e._replace(reps_low=new[0], reps_high=new[1]) if e.sets and (e.reps_low, e.reps_high) == old else e
+                    for e in day.exercises
+                ))
+            days.append(day)
+        return self._replace(weekly_schedule=tuple(days))
+
+    def to_dict(self):
+        """
+        The plan in the old dict format, with exercises as display text.
+        """
+        return {
+            "split_type": self.split_type,
+            "frequency_per_week": self.frequency_per_week,
+            "notes": self.notes,
+            "weekly_schedule": [day.to_dict() for day in self.weekly_schedule],
+        }
+
+    @classmethod
+    def from_dict(cls, plan):
+        return cls(
+            sys.intern(plan['split_type']), plan['frequency_per_week'], sys.intern(plan['notes']),
+            [WorkoutDay.from_dict(day) for day in plan['weekly_schedule']],
+        )
+
+
+# --- Templates ---
+# Rep Ranges: 6-10 for strength/hypertrophy, 10-15 for endurance.
+
+E = Exercise
+
+FULL_BODY = WorkoutPlan(
+    "Full Body", 3,
+    "Focus on learning the main compound lifts (Squat, Bench, Deadlift, Overhead Press). Aim to get a little stronger each week.",
+    [
+        WorkoutDay("Day 1", "Full Body A", [E("Squats", 3, 8, 10), E("Bench Press", 3, 8, 10), E("Barbell Row", 3, 8, 10), E("Plank", 3, 60, unit="seconds")]),
+        WorkoutDay("Day 2", "Rest"),
+        WorkoutDay("Day 3", "Full Body B", [E("Deadlift", 1, 5), E("Overhead Press", 3, 8, 10), E("Pull-Ups (or Lat Pulldown)", 3, 8, 10), E("Lunges", 3, 10, 12, per=" per leg")]),
+        WorkoutDay("Day 4", "Rest"),
+        WorkoutDay("Day 5", "Full Body A (Repeat)", [E("Squats", 3, 8, 10), E("Bench Press", 3, 8, 10), E("Barbell Row", 3, 8, 10), E("Bicep Curls", 2, 12, 15)]),
+        WorkoutDay("Day 6", "Rest"),
+        WorkoutDay("Day 7", "Rest (or light cardio)"),
+    ],
+)
+
+_PUSH = [E("Bench Press", 4, 6, 8), E("Overhead Press", 3, 8, 10), E("Incline Dumbbell Press", 3, 10, 12), E("Tricep Pushdown", 3, 12, 15)]
+_PULL = [E("Deadlift", 3, 5), E("Pull-Ups (or Lat Pulldown)", 4, 8, 10), E("Barbell Row", 3, 8, 10), E("Bicep Curls", 3, 12, 15)]
+_LEGS = [E("Squats", 4, 6, 8), E("Romanian Deadlift", 3, 10, 12), E("Leg Press", 3, 12, 15), E("Calf Raises", 4, 15, 20)]
+
+PUSH_PULL_LEGS = WorkoutPlan(
+    "Push-Pull-Legs (PPL)", 6,
+    "Push-Pull-Legs is a high-frequency split. The key is progressive overload: add a little weight or an extra rep to your main lifts each week.",
+    [
+        WorkoutDay("Day 1", "Push (Chest, Shoulders, Triceps)", _PUSH),
+        WorkoutDay("Day 2", "Pull (Back, Biceps)", _PULL),
+        WorkoutDay("Day 3", "Legs (Quads, Hamstrings, Calves)", _LEGS),
+        WorkoutDay("Day 4", "Push (Repeat)", _PUSH),
+        WorkoutDay("Day 5", "Pull (Repeat)", _PULL),
+        WorkoutDay("Day 6", "Legs (Repeat)", _LEGS),
+        WorkoutDay("Day 7", "Rest"),
+    ],
+)
+
+UPPER_LOWER = WorkoutPlan(
+    "Upper / Lower Split", 4,
+    "This 4-day split balances strength training and recovery, leaving 3 days for cardio, which is key for weight loss.",
+    [
+        WorkoutDay("Day 1", "Upper Body Strength", [E("Bench Press", 4, 5, 8), E("Barbell Row", 4, 5, 8), E("Overhead Press", 3, 8, 10), E("Lat Pulldown", 3, 10, 12)]),
+        WorkoutDay("Day 2", "Lower Body Strength", [E("Squats", 4, 5, 8), E("Deadlift", 3, 5, 8), E("Leg Press", 3, 12, 15), E("Hamstring Curls", 3, 12, 15)]),
+        WorkoutDay("Day 3", "Rest / Cardio"),
+        WorkoutDay("Day 4", "Upper Body Hypertrophy", [E("Incline Dumbbell Press", 3, 10, 15), E("Dumbbell Row", 3, 10, 15), E("Lateral Raises", 4, 15, 20), E("Bicep Curls", 3, 12, 15), E("Tricep Extensions", 3, 12, 15)]),
+        WorkoutDay("Day 5", "Lower Body Hypertrophy", [E("Leg Press", 4, 15, 20), E("Lunges", 3, 12, 15, per=" per leg"), E("Leg Extensions", 3, 15, 20), E("Calf Raises", 4, 15, 20)]),
+        WorkoutDay("Day 6", "Cardio"),
+        WorkoutDay("Day 7", "Rest"),
+    ],
+)
+
+BODY_PART_SPLIT = WorkoutPlan(
+    "Advanced PPL or Body Part Split", 5,
+    "As an advanced lifter, you need more volume and specialization. This 5-day split lets you dedicate entire days to specific muscle groups.",
+    [
+        WorkoutDay("Day 1", "Chest & Triceps", [E("Bench Press", 5, 5), E("Incline Dumbbell Press", 4, 10, 12), E("Cable Flys", 3, 15, 20), E("Skullcrushers", 4, 10, 12)]),
+        WorkoutDay("Day 2", "Back & Biceps", [E("Deadlift", 5, 3, 5), E("Pull-Ups (Weighted)", 4, 6, 10), E("T-Bar Row", 4, 8, 10), E("Barbell Curls", 4, 10, 12)]),
+        WorkoutDay("Day 3", "Legs", [E("Squats", 5, 5), E("Romanian Deadlift", 4, 8, 10), E("Leg Press", 4, 15, 20), E("Leg Curls", 3, 12, 15), E("Calf Raises", 5, 15, 20)]),
+        WorkoutDay("Day 4", "Shoulders & Abs", [E("Overhead Press", 5, 5), E("Lateral Raises", 5, 15, 20), E("Reverse Pec Deck", 4, 12, 15), E("Cable Crunches", 4, 15, 20)]),
+        WorkoutDay("Day 5", "Full Body / Weak Point", [E("Squat", 3, 5), E("Bench Press", 3, 5), E("Barbell Row", 3, 5), E("Focus on 2-3 exercises for a lagging muscle group.")]),
+        WorkoutDay("Day 6", "Rest"),
+        WorkoutDay("Day 7", "Rest"),
+    ],
+)
+
+del E
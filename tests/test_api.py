@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+from starlette.requests import Request
+
+from musclemap.api import check_in, checkin_endpoint, make_plan, plan_endpoint, run_batch
+
+PROFILE = {
+    "age": 30, "gender": "Male", "activity_level": "Sedentary (office job)", "height": 180,
+    "start_weight": 80.0, "goal": "Weight Reduction", "experience_level": "Beginner (0-1 years)",
+}
+PROGRESS = {
+    "current_weight": 79.5, "diet_adherence": "Great (I hit my targets)",
+    "strength_progress": "Got stronger (added weight/reps)", "energy_levels": "High",
+    "sleep_quality": "Great (7-8+ hours)",
+}
+
+
+def checkin_body(**changes):
+    plan = make_plan(PROFILE)
+    body = {"progress": PROGRESS, "tdee_estimate": None, **plan}
+    body.update(changes)
+    return body
+
+
+def post(endpoint, body):
+    data = body if isinstance(body, bytes) else json.dumps(body).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": data, "more_body": False}
+
+    request = Request({"type": "http", "method": "POST", "path": "/", "headers": []}, receive)
+    return asyncio.run(endpoint(request))
+
+
+def test_checkin():
+    response = post(checkin_endpoint, checkin_body())
+    assert response.status_code == 200
+    assert json.loads(response.body)['profile']['weeks_on_plan'] == 1
+
+
+def test_float_tdee():
+    body = checkin_body()
+    body['profile'] = dict(body['profile'], tdee=body['profile']['tdee'] + 0.5)
+    assert post(checkin_endpoint, body).status_code == 200
+
+
+@pytest.mark.parametrize("body", [
+    checkin_body(workout_plan=dict(make_plan(PROFILE)['workout_plan'], weekly_schedule=["not a day"])),
+    checkin_body(workout_plan=dict(make_plan(PROFILE)['workout_plan'], weekly_schedule=["{'day': "])),
+    # The text of a day, as the old app saved it, is only read from the store
+    checkin_body(workout_plan=dict(make_plan(PROFILE)['workout_plan'], weekly_schedule=[
+        str(day) for day in make_plan(PROFILE)['workout_plan']['weekly_schedule']
+    ])),
+    checkin_body(workout_plan=dict(make_plan(PROFILE)['workout_plan'], weekly_schedule=[{"day": "Day 1", "focus": "Rest"}] * 100)),
+    checkin_body(progress=dict(PROGRESS, current_weight=1e308)),
+    checkin_body(profile=dict(make_plan(PROFILE)['profile'], weeks_on_plan="3")),
+    checkin_body(progress=dict(PROGRESS, trend_kg_per_week=1e308)),
+    checkin_body(nutrition_plan=dict(make_plan(PROFILE)['nutrition_plan'], calories_kcal=-1e308)),
+    checkin_body(tdee_estimate={"offset": 0.0, "variance": 0.0, "weeks": 1}),
+    b'{"profile": {"start_weight": NaN}}',
+    b'{"age": Infinity}',
+])
+def test_bad_input_is_400(body):
+    endpoint = plan_endpoint if b"age" in (body if isinstance(body, bytes) else b"") else checkin_endpoint
+    assert post(endpoint, body).status_code == 400
+
+
+def test_bad_batch_line_is_an_error_line():
+    lines = [json.dumps({"op": "plan", **PROFILE}), '{"op": "plan", "age": NaN}']
+    results = [json.loads(line) for line in run_batch(lines).splitlines()]
+    assert "profile" in results[0] and "error" in results[1]
+
+
+def test_check_in_without_tdee_estimate():
+    result = check_in({key: value for key, value in checkin_body().items() if key != "tdee_estimate"})
+    assert "tdee_estimate" not in result
@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+
+from musclemap.brain import (
+    adapt_maintenance, calculate_tdee, get_ai_recommendation, get_initial_nutrition_plan, get_initial_workout_plan,
+)
+
+PROFILE = {
+    "age": 35, "gender": "Female", "activity_level": "Lightly Active (1-2 days/week)", "height": 165,
+    "start_weight": 80.0, "goal": "Weight Reduction", "experience_level": "Beginner (0-1 years)",
+    "plan_start_date": datetime.date(2024, 1, 1), "weeks_on_plan": 0,
+}
+
+
+def check_in(profile, nutrition_plan, workout_plan, estimate, current_weight, diet_adherence,
+             sleep_quality="Great (7-8+ hours)"):
+    progress = {
+        "date": datetime.date(2024, 1, 8), "week_number": profile['weeks_on_plan'] + 1,
+        "start_weight_of_week": profile['start_weight'], "current_weight": current_weight,
+        "diet_adherence": diet_adherence, "strength_progress": "Stalled (lifted the same)",
+        "energy_levels": "Normal", "sleep_quality": sleep_quality,
+    }
+    coached, workout_plan, _ = get_ai_recommendation(profile, progress, nutrition_plan, workout_plan)
+    tdee, new_plan, estimate, feedback = adapt_maintenance(profile, progress, nutrition_plan, coached, estimate)
+    # Every move of the plan is explained to the member
+    assert bool(feedback) == (tdee != profile['tdee'])
+    profile = dict(profile, tdee=tdee, start_weight=current_weight, weeks_on_plan=profile['weeks_on_plan'] + 1)
+    return profile, coached, new_plan, workout_plan, estimate
+
+
+def test_coach_steps_survive_later_weeks():
+    profile = dict(PROFILE, tdee=calculate_tdee(PROFILE))
+    nutrition_plan = get_initial_nutrition_plan(profile['tdee'], profile['goal'], profile['start_weight'])
+    workout_plan = get_initial_workout_plan(profile['goal'], profile['experience_level'])
+    estimate = None
+    weeks = [
+        (80.0, "Great (I hit my targets)"), # Stalled: the coach cuts calories
+        (79.9, "Bad (I didn't follow the plan)"), # No changes this week
+        (79.4, "Bad (I didn't follow the plan)"),
+        (79.0, "Good (I was pretty close)"),
+        (78.6, "Great (I hit my targets)"),
+    ]
+    cut = False
+    for current_weight, diet_adherence in weeks:
+        old_tdee = profile['tdee']
+        profile, coached, new_plan, workout_plan, estimate = check_in(
+            profile, nutrition_plan, workout_plan, estimate, current_weight, diet_adherence,
+        )
+        cut = cut or coached['calories_kcal'] < nutrition_plan['calories_kcal']
+        # The plan is the coach's plan moved by the TDEE change, never rebuilt
+        assert new_plan['calories_kcal'] == coached['calories_kcal'] + profile['tdee'] - old_tdee
+        assert new_plan['protein_g'] == coached['protein_g']
+        if diet_adherence.startswith("Bad"):
+            assert new_plan == nutrition_plan
+        nutrition_plan = new_plan
+    assert cut
+
+
+@pytest.mark.parametrize("diet_adherence, sleep_quality", [
+    ("Bad (I didn't follow the plan)", "Great (7-8+ hours)"), # not_followed
+    ("Great (I hit my targets)", "Poor (4-5 hours)"), # recover
+])
+@pytest.mark.parametrize("current_weight", [76.0, 84.0])
+def test_final_outcomes_keep_the_plan(diet_adherence, sleep_quality, current_weight):
+    profile = dict(PROFILE, tdee=calculate_tdee(PROFILE))
+    nutrition_plan = get_initial_nutrition_plan(profile['tdee'], profile['goal'], profile['start_weight'])
+    workout_plan = get_initial_workout_plan(profile['goal'], profile['experience_level'])
+    new_profile, coached, new_plan, _, estimate = check_in(
+        profile, nutrition_plan, workout_plan, None, current_weight, diet_adherence, sleep_quality,
+    )
+    assert coached == nutrition_plan
+    assert new_plan == nutrition_plan and new_profile['tdee'] == profile['tdee']
+    # A week on target still teaches the estimate; the next check-in catches up with it
+    assert (estimate is not None) == diet_adherence.startswith("Great")
+
+
+def test_float_tdee():
+    profile = dict(PROFILE, tdee=calculate_tdee(PROFILE) + 0.4)
+    plan = get_initial_nutrition_plan(profile['tdee'], profile['goal'], profile['start_weight'])
+    progress = {
+        "current_weight": 79.0, "diet_adherence": "Great (I hit my targets)", "trend_kg_per_week": -1.0,
+        "strength_progress": "Stalled (lifted the same)", "energy_levels": "Normal", "sleep_quality": "Great (7-8+ hours)",
+    }
+    tdee, new_plan, estimate, feedback = adapt_maintenance(profile, progress, plan, plan, None)
+    assert isinstance(tdee, int) and estimate.weeks == 1
+    assert feedback and new_plan['calories_kcal'] == pytest.approx(plan['calories_kcal'] + tdee - profile['tdee'])
+
+
+def test_initial_nutrition_plans_are_not_shared():
+    plan = get_initial_nutrition_plan(2400, "Muscle Gain", 80.0)
+    plan['calories_kcal'] += 500
+    plan['notes'] = "changed"
+    again = get_initial_nutrition_plan(2400, "Muscle Gain", 80.0)
+    assert again is not plan
+    assert again['calories_kcal'] == 2700 and again['notes'] != "changed"
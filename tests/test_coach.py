@@ -0,0 +1,43 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from musclemap.brain import (
+    DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, GOALS, SLEEP_OPTIONS, STRENGTH_OPTIONS, get_ai_recommendation,
+    get_initial_nutrition_plan, get_initial_workout_plan,
+)
+from musclemap.coach import evaluate_checkins, feedback_messages
+from musclemap.rules import NUTRITION_KEYS
+
+# From a start weight of 0 the weight change is exactly each of these: the
+# rule boundaries and values on both sides of them
+WEIGHT_CHANGES = [-2.0, -0.81, -0.8, -0.79, -0.5, -0.3, -0.29, 0.0, 0.09, 0.1, 0.25, 0.39, 0.4, 0.45, 0.5, 0.51, 1.5]
+
+
+def checkins():
+    rows = [
+        {"goal": goal, "start_weight": 0.0, "current_weight": change, "diet_adherence": adherence,
+         "strength_progress": strength, "energy_levels": energy, "sleep_quality": sleep,
+         **{key: get_initial_nutrition_plan(2500, goal, 80.0)[key] for key in NUTRITION_KEYS}}
+        for goal, adherence, strength, energy, sleep, change in itertools.product(
+            GOALS, DIET_ADHERENCE_OPTIONS, STRENGTH_OPTIONS, ENERGY_OPTIONS, SLEEP_OPTIONS, WEIGHT_CHANGES,
+        )
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_batch_matches_the_per_member_coach():
+    table = checkins()
+    results = evaluate_checkins(table)
+    outcomes = np.column_stack([results[c].cat.codes for c in results.columns if c.startswith("outcome_")])
+    for (_, row), (_, result), codes in zip(table.iterrows(), results.iterrows(), outcomes):
+        profile = {"goal": row['goal'], "start_weight": row['start_weight']}
+        nutrition_plan = get_initial_nutrition_plan(2500, row['goal'], 80.0)
+        workout_plan = get_initial_workout_plan(row['goal'], "Intermediate (1-3 years)")
+        new_nutrition, new_workout, feedback = get_ai_recommendation(profile, row.to_dict(), nutrition_plan, workout_plan)
+
+        assert {key: result[key] for key in NUTRITION_KEYS} == {key: new_nutrition[key] for key in NUTRITION_KEYS}
+        assert workout_plan.notes + result['workout_note'] == new_workout.notes
+        assert result['rep_scheme_change'] == (new_workout.weekly_schedule != workout_plan.weekly_schedule)
+        assert feedback_messages(codes, result['weight_change']) == feedback
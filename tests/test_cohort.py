@@ -0,0 +1,28 @@
+import itertools
+
+import pandas as pd
+
+from musclemap.brain import (
+    ACTIVITY_LEVELS, GENDERS, GOALS, calculate_bmi_details, calculate_tdee, get_initial_nutrition_plan,
+)
+from musclemap.cohort import onboard_cohort
+
+# Every option, with ages, heights and weights at and between the form's limits
+PROFILES = pd.DataFrame(
+    [
+        {"age": age, "gender": gender, "activity_level": activity, "height": height, "start_weight": weight, "goal": goal}
+        for gender, activity, goal, age, height, weight in itertools.product(
+            GENDERS, ACTIVITY_LEVELS, GOALS, [16, 37, 100], [100, 172.5, 250], [40.0, 63.7, 88.8, 200.0],
+        )
+    ]
+)
+
+
+def test_onboard_cohort_matches_the_scalar_functions():
+    onboarded = onboard_cohort(PROFILES)
+    for profile, row in zip(PROFILES.to_dict("records"), onboarded.itertuples()):
+        tdee = calculate_tdee(profile)
+        assert row.tdee == tdee
+        assert (row.bmi, row.bmi_category, row.bmi_color) == calculate_bmi_details(profile['start_weight'], profile['height'])
+        plan = get_initial_nutrition_plan(tdee, profile['goal'], profile['start_weight'])
+        assert {key: getattr(row, key) for key in plan} == plan
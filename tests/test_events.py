@@ -0,0 +1,99 @@
+import datetime
+import random
+
+from musclemap.brain import (
+    COACHING_RULES, DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, SLEEP_OPTIONS, STRENGTH_OPTIONS, adapt_maintenance,
+    calculate_bmi_details, get_ai_recommendation,
+)
+from musclemap.events import SNAPSHOT_VERSION, apply, onboard, rebuild, replay
+from musclemap.store import Store
+from musclemap.transfer import import_checkins
+from musclemap.trend import weekly_change
+
+START = datetime.date(2024, 1, 1)
+FORM = {
+    "age": 35, "gender": "Female", "activity_level": "Lightly Active (1-2 days/week)", "height": 165.0,
+    "start_weight": 80.0, "goal": "Weight Reduction", "experience_level": "Beginner (0-1 years)",
+    "plan_start_date": START, "weeks_on_plan": 0,
+}
+
+
+def onboard_member(store, user_id):
+    profile, nutrition_plan, workout_plan, _ = onboard(FORM)
+    store.save_onboarding(user_id, profile, nutrition_plan, workout_plan)
+
+
+def check_in(store, user_id, week_number, current_weight, rng):
+    """
+    What the Dashboard's check-in submit does.
+    """
+    profile, nutrition_plan, workout_plan = store.load_session(user_id)
+    progress_log = {
+        "week_number": week_number, "date": START + datetime.timedelta(weeks=week_number),
+        "start_weight_of_week": profile['start_weight'], "current_weight": current_weight,
+        "diet_adherence": rng.choice(DIET_ADHERENCE_OPTIONS), "strength_progress": rng.choice(STRENGTH_OPTIONS),
+        "energy_levels": rng.choice(ENERGY_OPTIONS), "sleep_quality": rng.choice(SLEEP_OPTIONS),
+    }
+    trend = store.record_weigh_in(user_id, progress_log['date'], current_weight)
+    progress_log['trend_kg_per_week'] = weekly_change(trend)
+    new_nutrition_plan, new_workout_plan, _ = get_ai_recommendation(profile, progress_log, nutrition_plan, workout_plan)
+    tdee, new_nutrition_plan, estimate, _ = adapt_maintenance(
+        profile, progress_log, nutrition_plan, new_nutrition_plan, store.load_tdee_estimate(user_id),
+    )
+    profile = dict(profile, tdee=tdee, start_weight=current_weight, weeks_on_plan=week_number)
+    profile['bmi'], profile['bmi_category'], profile['bmi_color'] = calculate_bmi_details(current_weight, profile['height'])
+    store.record_checkin(user_id, progress_log, profile, new_nutrition_plan, new_workout_plan, estimate)
+
+
+def member_with_check_ins(tmp_path, weeks, skip=()):
+    store = Store(str(tmp_path / "musclemap.db"))
+    onboard_member(store, "member_1")
+    rng = random.Random(7)
+    weight = FORM['start_weight']
+    for week_number in range(1, weeks + 1):
+        weight = round(weight + rng.uniform(-1.2, 0.6), 1)
+        if week_number not in skip:
+            check_in(store, "member_1", week_number, weight, rng)
+    return store
+
+
+def replayed_from_scratch(store, user_id, rules):
+    state = None
+    for _, kind, data in store.load_events(user_id):
+        state = apply(state, kind, data, rules)
+    return state
+
+
+def test_rebuild_matches_the_live_member(tmp_path):
+    store = member_with_check_ins(tmp_path, 30)
+    state = rebuild(store, "member_1")
+    assert (state.profile, state.nutrition_plan, state.workout_plan) == store.load_session("member_1")
+    assert state.tdee_estimate == store.load_tdee_estimate("member_1")
+    assert rebuild(store, "nobody") is None
+
+
+def test_resuming_from_a_snapshot_gives_the_same_state(tmp_path):
+    store = member_with_check_ins(tmp_path, 30)
+    rules = COACHING_RULES.current()
+    state, events, snapshots = replay(store, "member_1", rules, snapshot_every=4)
+    assert events == 31 and len(snapshots) == 7
+    store.save_snapshots(snapshots)
+
+    resumed, events, _ = replay(store, "member_1", rules, snapshot_every=4)
+    assert events == 30 - snapshots[-1][2]
+    assert resumed == state
+
+
+def test_importing_an_earlier_week_invalidates_later_snapshots(tmp_path):
+    store = member_with_check_ins(tmp_path, 12, skip={5})
+    rules = COACHING_RULES.current()
+    key = f"{rules.digest}.{SNAPSHOT_VERSION}"
+    _, _, snapshots = replay(store, "member_1", rules, snapshot_every=2)
+    store.save_snapshots(snapshots)
+    assert store.load_snapshot("member_1", key)[0] == 12
+
+    checkins = tmp_path / "checkins.csv"
+    checkins.write_text("user_id,week_number,date,current_weight\nmember_1,5,2024-02-05,70.0\n")
+    import_checkins(store, str(checkins))
+    assert store.load_snapshot("member_1", key)[0] < 5
+    assert rebuild(store, "member_1", rules) == replayed_from_scratch(store, "member_1", rules)
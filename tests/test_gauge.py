@@ -0,0 +1,16 @@
+import json
+
+from musclemap.brain import bmi_category
+from musclemap.gauge import create_bmi_gauge
+from musclemap.reports import _gauge_json
+
+
+def test_gauge_title_is_the_category_of_the_unrounded_bmi():
+    # Both round to 25.0, on either side of the Overweight line
+    for bmi in (25.04, 24.96, 25.04):
+        category = bmi_category(bmi)[0]
+        figure = create_bmi_gauge(bmi)
+        assert figure.data[0].title.text == category
+        assert figure.data[0].value == 25.0
+        assert json.loads(_gauge_json(round(bmi, 1), category))['data'][0]['title']['text'] == category
+    assert bmi_category(24.96)[0] != bmi_category(25.04)[0]
@@ -0,0 +1,49 @@
+import pytest
+
+from musclemap.brain import ACTIVITY_LEVELS, GENDERS, GOALS, adjust_nutrition_plan, calculate_tdee, get_initial_nutrition_plan
+from musclemap.meals import DIETS, default_table, member_seed, plan_week, solve_day, update_week
+
+
+def nutrition_plans():
+    for goal in GOALS:
+        for weight in (50, 65, 80, 100, 130):
+            for activity_level in ACTIVITY_LEVELS:
+                for gender in GENDERS:
+                    profile = {"age": 30, "gender": gender, "activity_level": activity_level,
+                               "height": 175, "start_weight": weight}
+                    yield get_initial_nutrition_plan(calculate_tdee(profile), goal, weight)
+
+
+@pytest.mark.parametrize("diet", list(DIETS))
+def test_days_fit_their_plan(diet):
+    for i, nutrition_plan in enumerate(nutrition_plans()):
+        for day_plan in plan_week(nutrition_plan, DIETS[diet], seed=member_seed(f"member_{i}")):
+            assert day_plan.fits(nutrition_plan, DIETS[diet]), (nutrition_plan, day_plan.totals)
+            portions = [portion for meal in day_plan.meals for portion in meal.portions]
+            assert day_plan.totals['calories_kcal'] == pytest.approx(
+                sum(portion.servings * portion.food.kcal for portion in portions), abs=0.1,
+            )
+
+
+@pytest.mark.parametrize("tag", default_table().tags())
+def test_excluded_tags_never_appear(tag):
+    for i, nutrition_plan in enumerate(list(nutrition_plans())[::8]):
+        for day_plan in plan_week(nutrition_plan, {tag}, seed=i):
+            assert all(tag not in food.tags for food in day_plan.foods())
+
+
+def test_update_week_only_solves_days_that_no_longer_fit():
+    nutrition_plan = get_initial_nutrition_plan(2400, "Muscle Gain", 80.0)
+    exclude = DIETS["Vegetarian"]
+    week = plan_week(nutrition_plan, exclude, seed=3)
+    new_plan = adjust_nutrition_plan(nutrition_plan, calories_kcal=90, carbs_g=22)
+    new_week = update_week(week, new_plan, exclude, seed=3)
+    kept = [day for day, day_plan in enumerate(week) if day_plan.fits(new_plan, exclude)]
+    assert 0 < len(kept) < len(week)
+    for day, (day_plan, new_day_plan) in enumerate(zip(week, new_week)):
+        if day in kept:
+            assert new_day_plan is day_plan
+        else:
+            assert new_day_plan == solve_day(new_plan, day, exclude, seed=3)
+            assert new_day_plan.fits(new_plan, exclude)
+    assert update_week(new_week, new_plan, exclude, seed=3) == new_week
@@ -0,0 +1,78 @@
+import pytest
+
+from musclemap.brain import EXPERIENCE_LEVELS, GOALS, get_initial_workout_plan
+from musclemap.periodization import (
+    DELOAD_SETS, INTENSIFICATION_REPS, MAX_EXTRA_SETS, MIN_REPS, Program, _block_swaps, _week_plan,
+)
+
+# (accumulation, intensification, deload) weeks per block
+BLOCKS = {
+    ("Muscle Gain", "Beginner (0-1 years)"): (5, 1, 1),
+    ("Weight Reduction", "Beginner (0-1 years)"): (3, 1, 1),
+    ("General Fitness", "Beginner (0-1 years)"): (4, 1, 1),
+    ("Muscle Gain", "Intermediate (1-3 years)"): (4, 2, 1),
+    ("Weight Reduction", "Intermediate (1-3 years)"): (2, 2, 1),
+    ("General Fitness", "Intermediate (1-3 years)"): (3, 2, 1),
+    ("Muscle Gain", "Advanced (3+ years)"): (3, 2, 1),
+    ("Weight Reduction", "Advanced (3+ years)"): (1, 2, 1),
+    ("General Fitness", "Advanced (3+ years)"): (2, 2, 1),
+}
+
+
+def program(goal="Muscle Gain", experience="Intermediate (1-3 years)", seed="member_1", weeks=52):
+    return Program(get_initial_workout_plan(goal, experience), goal, experience, seed=seed, weeks=weeks)
+
+
+def main_lifts(plan):
+    return [day.exercises[0] for day in plan.weekly_schedule if day.exercises]
+
+
+def test_the_same_seed_rebuilds_the_same_weeks():
+    weeks = list(program())
+    _week_plan.cache_clear()
+    _block_swaps.cache_clear()
+    assert list(program()) == weeks
+    assert [week.plan for week in program(seed="member_2")] != [week.plan for week in weeks]
+    # The first block keeps the plan's own exercises
+    names = {exercise.name for day in weeks[0].plan.weekly_schedule for exercise in day.exercises}
+    assert names == {exercise.name for day in program().base_plan.weekly_schedule for exercise in day.exercises}
+
+
+@pytest.mark.parametrize("goal", GOALS)
+@pytest.mark.parametrize("experience", EXPERIENCE_LEVELS)
+def test_blocks_are_laid_out_by_goal_and_experience(goal, experience):
+    accumulation, intensification, deload = BLOCKS[goal, experience]
+    block = ["accumulation"] * accumulation + ["intensification"] * intensification + ["deload"] * deload
+    weeks = list(program(goal, experience))
+    assert [week.phase for week in weeks] == (block * 52)[:52]
+    assert [week.block for week in weeks] == [week // len(block) for week in range(52)]
+
+    base = main_lifts(program(goal, experience).base_plan)
+    for week in weeks[:len(block)]:
+        lifts = main_lifts(week.plan)
+        step = week.week - block.index(week.phase)
+        if week.phase == "accumulation":
+            assert [lift.sets for lift in lifts] == [lift.sets + min(step, MAX_EXTRA_SETS) for lift in base]
+        elif week.phase == "intensification":
+            fewer = INTENSIFICATION_REPS + step
+            assert [(lift.sets, lift.reps_low) for lift in lifts] == [
+                (lift.sets, max(MIN_REPS, lift.reps_low - fewer) if lift.unit == "reps" else lift.reps_low) for lift in base
+            ]
+        else:
+            assert [lift.sets for lift in lifts] == [max(1, round(lift.sets * DELOAD_SETS)) for lift in base]
+
+
+def test_open_ended_programs_index_any_week():
+    endless = program(weeks=None)
+    bounded = program()
+    assert endless[30] == bounded[30]
+    week = endless[1000]
+    assert (week.week, week.block, week.phase) == (1000, 142, "deload") # 1000 = 142 * 7 + 6
+    assert week == program(weeks=None)[1000]
+    assert [w.week for w in endless.weeks(start=500, stop=503)] == [500, 501, 502]
+    with pytest.raises(TypeError):
+        len(endless)
+    with pytest.raises(IndexError):
+        bounded[52]
+    with pytest.raises(IndexError):
+        endless[-1]
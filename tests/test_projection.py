@@ -0,0 +1,71 @@
+import datetime
+
+import numpy as np
+
+from musclemap import trend
+from musclemap.brain import (
+    DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, SLEEP_OPTIONS, STRENGTH_OPTIONS, adapt_maintenance, calculate_tdee,
+    get_ai_recommendation, get_initial_nutrition_plan, get_initial_workout_plan,
+)
+from musclemap.projection import (
+    ADHERENCE_ODDS, ENERGY_ODDS, PERCENTILES, SLEEP_ODDS, STRENGTH_ODDS, WEIGH_IN_NOISE_KG, _weeks_to_goal, project,
+    simulate,
+)
+
+PROFILE = {
+    "age": 30, "gender": "Male", "activity_level": "Moderately Active (3-5 days/week)", "height": 180,
+    "start_weight": 90.0, "goal": "Weight Reduction", "experience_level": "Intermediate (1-3 years)",
+    "plan_start_date": datetime.date(2024, 1, 1), "weeks_on_plan": 0,
+}
+
+
+def plan():
+    return get_initial_nutrition_plan(calculate_tdee(PROFILE), PROFILE['goal'], PROFILE['start_weight'])
+
+
+def test_unreachable_goal_is_inf():
+    projection = project(PROFILE, plan(), goal_weight=50.0, weeks=12, scenarios=500, seed=1)
+    assert np.isinf(projection.weeks_to_goal).all()
+
+
+def test_goal_reached_by_some():
+    weights = np.array([[90, 89, 88, 87]] * 3 + [[90, 90, 90, 90]] * 2, dtype=float)
+    weeks = _weeks_to_goal(weights, "Weight Reduction", 88.0)
+    assert not np.isnan(weeks).any()
+    assert weeks[0] == 2 and np.isinf(weeks[-1])
+    assert len(weeks) == len(PERCENTILES)
+
+
+def test_reachable_goal_is_finite():
+    projection = project(PROFILE, plan(), goal_weight=89.0, weeks=12, scenarios=500, seed=1)
+    assert np.isfinite(projection.weeks_to_goal[:3]).all()
+
+
+def test_scenarios_are_coached_like_live_check_ins():
+    scenarios, weeks = 40, 26
+    profile = dict(PROFILE, tdee=calculate_tdee(PROFILE))
+    weights, calories = simulate(profile, plan()['calories_kcal'], weeks, scenarios, seed=3)
+
+    # The same draws, in the same order, through the per-member functions
+    rng = np.random.default_rng(3)
+    draws = []
+    for _ in range(weeks):
+        answers = [rng.choice(len(odds), size=scenarios, p=odds) for odds in (ADHERENCE_ODDS, STRENGTH_ODDS, ENERGY_ODDS, SLEEP_ODDS)]
+        rng.standard_normal(scenarios) # Intake
+        draws.append((answers, rng.standard_normal(scenarios)))
+    workout_plan = get_initial_workout_plan(profile['goal'], profile['experience_level'])
+    for i in range(scenarios):
+        member, nutrition_plan, estimate = dict(profile), plan(), None
+        weight_trend = trend.start(0, member['start_weight'])
+        for week, ((adherence, strength, energy, sleep), noise) in enumerate(draws, 1):
+            weigh_in = weights[i, week] + WEIGH_IN_NOISE_KG * noise[i]
+            weight_trend = trend.update(weight_trend, 7 * week, weigh_in)
+            progress = {
+                "current_weight": weigh_in, "trend_kg_per_week": trend.weekly_change(weight_trend),
+                "diet_adherence": DIET_ADHERENCE_OPTIONS[adherence[i]], "strength_progress": STRENGTH_OPTIONS[strength[i]],
+                "energy_levels": ENERGY_OPTIONS[energy[i]], "sleep_quality": SLEEP_OPTIONS[sleep[i]],
+            }
+            coached, _, _ = get_ai_recommendation(member, progress, nutrition_plan, workout_plan)
+            member['tdee'], nutrition_plan, estimate, _ = adapt_maintenance(member, progress, nutrition_plan, coached, estimate)
+            member['start_weight'] = weigh_in
+            assert calories[i, week] == nutrition_plan['calories_kcal'], (i, week)
@@ -0,0 +1,24 @@
+import datetime
+import sqlite3
+
+from musclemap.reports import _render_chunk
+from musclemap.store import Store
+from musclemap.transfer import import_profiles
+
+HEADER = "user_id,age,gender,activity_level,height,start_weight,goal,experience_level\n"
+ROW = ",30,Male,Sedentary (office job),180,80,General Fitness,Beginner (0-1 years)\n"
+
+
+def test_reports_stay_in_out_dir(tmp_path):
+    path = tmp_path / "members.csv"
+    path.write_text(HEADER + "member_1" + ROW + "member_2" + ROW)
+    db_path = str(tmp_path / "musclemap.db")
+    import_profiles(Store(db_path), str(path))
+    with sqlite3.connect(db_path) as conn: # A member stored before ids were checked
+        conn.execute("UPDATE profiles SET user_id = '../escaped' WHERE user_id = 'member_2'")
+    out_dir = tmp_path / "reports"
+    out_dir.mkdir()
+    written, _ = _render_chunk((db_path, str(out_dir), "cdn", datetime.date(2024, 6, 2), ["member_1", "../escaped"]))
+    assert written == 1
+    assert [p.name for p in out_dir.iterdir()] == ["member_1.html"]
+    assert not (tmp_path / "escaped.html").exists()
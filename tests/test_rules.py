@@ -0,0 +1,113 @@
+import ast
+import copy
+import itertools
+
+from musclemap.brain import (
+    DIET_ADHERENCE_OPTIONS, ENERGY_OPTIONS, EXPERIENCE_LEVELS, GOALS, SLEEP_OPTIONS, STRENGTH_OPTIONS,
+    get_ai_recommendation, get_initial_nutrition_plan, get_initial_workout_plan,
+)
+
+# The weight change is current_weight - start_weight; from 0 it is exactly
+# each of WEIGHT_CHANGES, so the boundaries themselves are tested too
+START_WEIGHT = 0.0
+# The rule boundaries and values on both sides of them
+WEIGHT_CHANGES = [-2.0, -0.81, -0.8, -0.79, -0.5, -0.3, -0.29, 0.0, 0.09, 0.1, 0.25, 0.39, 0.4, 0.45, 0.5, 0.51, 1.5]
+
+
+def old_get_ai_recommendation(profile, progress, current_nutrition_plan, current_workout_plan):
+    """
+    The AI Coach as it was written before the rule table (plans as dicts).
+    """
+    new_nutrition_plan = copy.deepcopy(current_nutrition_plan)
+    new_workout_plan = copy.deepcopy(current_workout_plan)
+    goal = profile['goal']
+    weight_change = progress['current_weight'] - profile['start_weight']
+    diet_adherence = progress['diet_adherence']
+    strength_progress = progress['strength_progress']
+    energy_levels = progress['energy_levels']
+    sleep_quality = progress['sleep_quality']
+    feedback_log = []
+
+    if diet_adherence in ["Bad (I didn't follow the plan)"]:
+        feedback_log.append("The most important factor is consistency. We can't know if the plan is working unless you follow it. **No changes this week.** Let's aim for 100% adherence.")
+        return new_nutrition_plan, new_workout_plan, feedback_log
+
+    if sleep_quality in ["Poor (4-5 hours)"] or energy_levels == "Low":
+        feedback_log.append("Your sleep and energy are low. This is a huge factor in progress. This week, your #1 goal is to **get 7-8 hours of sleep**. We will keep the plan the same to allow your body to recover.")
+        return new_nutrition_plan, new_workout_plan, feedback_log
+
+    if goal == "Weight Reduction":
+        if weight_change < -0.8:
+            feedback_log.append(f"You lost {abs(weight_change):.1f} kg! This is great, but a bit fast. We'll **add 150 calories** (mostly from carbs) to make this more sustainable and preserve muscle.")
+            new_nutrition_plan['calories_kcal'] += 150
+            new_nutrition_plan['carbs_g'] += 38
+        elif -0.8 <= weight_change < -0.3:
+            feedback_log.append(f"You lost {abs(weight_change):.1f} kg. This is the perfect range! **No changes to the plan.** Keep up the great work.")
+        else:
+            feedback_log.append(f"Your weight stayed about the same (change: {weight_change:.1f} kg). This is a normal plateau. We will make two changes to break it:")
+            feedback_log.append("1. **Decreasing calories by 200.**")
+            feedback_log.append("2. **Adding one 30-minute cardio session.**")
+            new_nutrition_plan['calories_kcal'] -= 200
+            new_nutrition_plan['carbs_g'] -= 50
+            new_workout_plan['notes'] += " AI UPDATE: Add one 30-minute cardio session this week."
+
+    elif goal == "Muscle Gain":
+        if weight_change > 0.5:
+            feedback_log.append(f"You gained {weight_change:.1f} kg. This is a bit fast, which might mean we're adding too much fat. We'll **decrease calories by 150** to lean this out.")
+            new_nutrition_plan['calories_kcal'] -= 150
+            new_nutrition_plan['carbs_g'] -= 38
+        elif 0.1 <= weight_change < 0.4:
+            feedback_log.append(f"You gained {weight_change:.1f} kg. This is the perfect range for a lean bulk! **No changes to nutrition.**")
+        else:
+            feedback_log.append(f"Your weight stayed about the same (change: {weight_change:.1f} kg). We need to eat more to grow. We'll **add 200 calories** (carbs & protein) to fuel muscle growth.")
+            new_nutrition_plan['calories_kcal'] += 200
+            new_nutrition_plan['carbs_g'] += 30
+            new_nutrition_plan['protein_g'] += 20
+
+        if strength_progress == "Got stronger (added weight/reps)":
+            feedback_log.append("You got stronger! This is the #1 rule of muscle growth (Progressive Overload). Your next workout, try to **add another 1-2 reps, or add 2.5kg** to your main lifts.")
+            new_workout_plan['notes'] += " AI UPDATE: You're stronger. Apply progressive overload: add 2.5kg or 1-2 reps to main lifts."
+        elif strength_progress == "Stalled (lifted the same)":
+            feedback_log.append("You stalled on lifts. This is normal. This week, we will **change your rep scheme** to introduce a new stimulus. We'll move from 8-10 reps to 5-8 reps on your main lifts.")
+            new_workout_plan['weekly_schedule'] = [str(day).replace('8-10', '5-8') for day in new_workout_plan['weekly_schedule']]
+
+    else:
+        feedback_log.append("You're on the General Fitness plan. The main goal is consistency. Keep showing up!")
+        if strength_progress == "Got stronger (added weight/reps)":
+            feedback_log.append("You got stronger! This is fantastic. Keep adding weight or reps when you can.")
+
+    return new_nutrition_plan, new_workout_plan, feedback_log
+
+
+def check_ins():
+    """
+    (profile, progress, nutrition plan, workout plan) for every answer,
+    goal and experience level at each of the WEIGHT_CHANGES.
+    """
+    for goal, experience in itertools.product(GOALS, EXPERIENCE_LEVELS):
+        profile = {"goal": goal, "start_weight": START_WEIGHT}
+        nutrition_plan = get_initial_nutrition_plan(2500, goal, 80.0)
+        workout_plan = get_initial_workout_plan(goal, experience)
+        for answers in itertools.product(
+            DIET_ADHERENCE_OPTIONS, STRENGTH_OPTIONS, ENERGY_OPTIONS, SLEEP_OPTIONS, WEIGHT_CHANGES,
+        ):
+            adherence, strength, energy, sleep, change = answers
+            progress = {
+                "current_weight": START_WEIGHT + change, "diet_adherence": adherence,
+                "strength_progress": strength, "energy_levels": energy, "sleep_quality": sleep,
+            }
+            yield profile, progress, nutrition_plan, workout_plan
+
+
+def test_rule_table_matches_the_old_coach():
+    for profile, progress, nutrition_plan, workout_plan in check_ins():
+        old_nutrition, old_workout, old_feedback = old_get_ai_recommendation(
+            profile, progress, nutrition_plan, workout_plan.to_dict(),
+        )
+        new_nutrition, new_workout, new_feedback = get_ai_recommendation(profile, progress, nutrition_plan, workout_plan)
+        assert new_feedback == old_feedback
+        assert new_nutrition == old_nutrition
+        assert new_workout.notes == old_workout['notes']
+        # The old coach turned each day into the text of its dict
+        new_days = [day.to_dict() for day in new_workout.weekly_schedule]
+        assert [day if isinstance(day, dict) else ast.literal_eval(day) for day in old_workout['weekly_schedule']] == new_days
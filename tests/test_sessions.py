@@ -0,0 +1,75 @@
+import datetime
+
+from musclemap.events import onboard
+from musclemap.sessions import MemberCache
+from musclemap.store import Store
+
+FORM = {
+    "age": 35, "gender": "Female", "activity_level": "Lightly Active (1-2 days/week)", "height": 165.0,
+    "start_weight": 80.0, "goal": "Weight Reduction", "experience_level": "Beginner (0-1 years)",
+    "plan_start_date": datetime.date(2024, 1, 1), "weeks_on_plan": 0,
+}
+
+
+class CountingStore(Store):
+    loads = 0
+
+    def load_session(self, user_id):
+        self.loads += 1
+        return super().load_session(user_id)
+
+
+def store_with_members(tmp_path, user_ids):
+    store = CountingStore(str(tmp_path / "musclemap.db"))
+    for user_id in user_ids:
+        profile, nutrition_plan, workout_plan, _ = onboard(FORM)
+        store.save_onboarding(user_id, profile, nutrition_plan, workout_plan)
+    return store
+
+
+def use(members, user_id):
+    """
+    One rerun of the Dashboard for a member.
+    """
+    member = members.get(user_id)
+    members.touch(member)
+    return member
+
+
+def test_hits_return_the_same_member(tmp_path):
+    store = store_with_members(tmp_path, ["a"])
+    members = MemberCache(store)
+    member = members.get("a")
+    assert members.get("a") is member and use(members, "a") is member
+    assert store.loads == 1
+    assert members.get("nobody") is None
+
+
+def test_least_recently_used_idle_members_are_spilled(tmp_path):
+    user_ids = ["a", "b", "c", "d", "e"]
+    store = store_with_members(tmp_path, user_ids)
+    size = MemberCache(store).get("a").estimate_size()
+    members = MemberCache(store, budget_bytes=3 * size + size // 2, idle_seconds=0)
+    a = use(members, "a")
+    use(members, "b")
+    use(members, "c")
+    assert len(members) == 3 and members.nbytes == 3 * size
+    assert use(members, "a") is a # Now b is the least recently used
+    use(members, "d")
+    assert list(members._members) == ["c", "a", "d"] and members.spilled == 1
+    use(members, "e")
+    assert list(members._members) == ["a", "d", "e"] and members.spilled == 2
+    assert members.nbytes == sum(member.nbytes for member in members._members.values()) <= members.budget_bytes
+    # A spilled member comes back from the store
+    loads = store.loads
+    b = use(members, "b")
+    assert store.loads == loads + 1 and b.profile == a.profile
+    assert members.nbytes <= members.budget_bytes
+
+
+def test_active_members_are_never_spilled(tmp_path):
+    store = store_with_members(tmp_path, ["a", "b", "c"])
+    members = MemberCache(store, budget_bytes=1, idle_seconds=300)
+    for user_id in ["a", "b", "c"]:
+        use(members, user_id)
+    assert len(members) == 3 and members.spilled == 0
@@ -0,0 +1,20 @@
+import os
+
+from musclemap.shared_cache import SharedCache
+
+
+def test_round_trip(tmp_path):
+    cache = SharedCache(str(tmp_path / "cache" / "shared.sqlite"))
+    value = {"data": [{"type": "indicator", "value": 0}], "layout": {"height": 350}}
+    assert cache.get_or_build("template", lambda: value, version="1") == value
+    assert cache.get_or_build("template", lambda: None, version="1") == value
+    assert os.stat(tmp_path / "cache").st_mode & 0o077 == 0
+
+
+def test_file_others_can_write_is_not_read(tmp_path):
+    path = tmp_path / "shared.sqlite"
+    SharedCache(str(path)).put("template", {"built": "elsewhere"})
+    os.chmod(path, 0o666)
+    cache = SharedCache(str(path))
+    assert cache.get("template") is None
+    assert cache.get_or_build("template", lambda: {"built": "here"}) == {"built": "here"}
@@ -0,0 +1,44 @@
+import datetime
+
+from musclemap.brain import calculate_bmi_details
+from musclemap.store import Store
+from musclemap.transfer import import_checkins, import_profiles
+
+HEADER = "user_id,age,gender,activity_level,height,start_weight,goal,experience_level\n"
+ROW = ",30,Male,Sedentary (office job),180,80,General Fitness,Beginner (0-1 years)\n"
+
+
+def test_import_rejects_user_ids_that_are_not_file_names(tmp_path):
+    path = tmp_path / "members.csv"
+    path.write_text(HEADER + "".join(user_id + ROW for user_id in ["member_1", "../../x", "a/b", "ok-2"]))
+    store = Store(str(tmp_path / "musclemap.db"))
+    assert import_profiles(store, str(path)) == (2, 2)
+    assert sorted(store.user_ids()) == ["member_1", "ok-2"]
+
+
+def test_import_keeps_check_ins_made_in_the_app(tmp_path):
+    members = tmp_path / "members.csv"
+    members.write_text(HEADER + "member_1" + ROW)
+    store = Store(str(tmp_path / "musclemap.db"))
+    import_profiles(store, str(members))
+    profile, nutrition_plan, workout_plan = store.load_session("member_1")
+    progress = {
+        "week_number": 1, "date": datetime.date(2024, 1, 8), "start_weight_of_week": 80.0, "current_weight": 79.0,
+        "diet_adherence": "Great (I hit my targets)", "strength_progress": "Stalled (lifted the same)",
+        "energy_levels": "Normal", "sleep_quality": "Great (7-8+ hours)",
+    }
+    profile = dict(profile, start_weight=79.0, weeks_on_plan=1)
+    profile['bmi'], profile['bmi_category'], profile['bmi_color'] = calculate_bmi_details(79.0, profile['height'])
+    store.record_checkin("member_1", progress, profile, nutrition_plan, workout_plan)
+
+    checkins = tmp_path / "checkins.csv"
+    header = "user_id,week_number,date,current_weight\n"
+    checkins.write_text(header + "member_1,1,2024-01-08,85\nmember_1,2,2024-01-15,78.5\n")
+    import_checkins(store, str(checkins))
+    checkins.write_text(header + "member_1,2,2024-01-15,78.0\n") # A corrected file
+    import_checkins(store, str(checkins))
+
+    events = {seq: (kind, data) for seq, kind, data in store.load_events("member_1", after=0)}
+    assert events[1][0] == "checkin" and events[1][1]['current_weight'] == 79.0
+    assert events[2][0] == "weigh_in" and events[2][1]['current_weight'] == 78.0
+    assert list(store.load_progress_history("member_1").weights) == [79.0, 78.0]
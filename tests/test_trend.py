@@ -0,0 +1,63 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from musclemap import trend
+from musclemap.cohort import update_trends_batch
+from musclemap.store import Store
+
+DAY = datetime.date(2024, 3, 1).toordinal()
+
+
+def history(days=10):
+    t = None
+    for i in range(days):
+        t = trend.update(t, DAY + i, 80 - 0.1 * i + 0.3 * (-1) ** i)
+    return t
+
+
+@pytest.mark.parametrize("before", [None, history()])
+def test_same_day_weigh_in_replaces_the_reading(before):
+    day = DAY + 10
+    once = trend.update(before, day, 78.4)
+    replaced = trend.update(trend.update(before, day, 79.6), day, 78.4, replaces=79.6)
+    assert replaced == pytest.approx(once)
+
+
+def test_batch_matches_scalar_replacement():
+    before = history()
+    first = trend.update(before, DAY + 10, 79.6)
+    trends = pd.DataFrame([first, before], columns=trend.Trend._fields)
+    batch = update_trends_batch(trends, [DAY + 10, DAY + 10], [78.4, 78.4], [79.6, np.nan])
+    assert tuple(batch.iloc[0]) == pytest.approx(trend.update(first, DAY + 10, 78.4, replaces=79.6))
+    assert tuple(batch.iloc[1]) == pytest.approx(trend.update(before, DAY + 10, 78.4))
+
+
+def test_store_counts_the_last_weigh_in_of_a_day(tmp_path):
+    store = Store(str(tmp_path / "musclemap.db"))
+    date = datetime.date(2024, 3, 1)
+    for i in range(5):
+        store.record_weigh_in("member_1", date + datetime.timedelta(days=i), 80 - 0.1 * i)
+    one = Store(str(tmp_path / "other.db"))
+    for i in range(5):
+        one.record_weigh_in("member_1", date + datetime.timedelta(days=i), 80 - 0.1 * i)
+    last = date + datetime.timedelta(days=5)
+    for weight in (81.0, 79.9, 79.5):
+        repeated = store.record_weigh_in("member_1", last, weight)
+    assert repeated == pytest.approx(one.record_weigh_in("member_1", last, 79.5))
+
+
+def test_batch_is_bit_for_bit_the_scalar_update():
+    rng = np.random.default_rng(7)
+    members = 50
+    scalar = [None] * members
+    batch = pd.DataFrame([trend.Trend(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0)] * members, columns=trend.Trend._fields)
+    day = np.full(members, DAY)
+    for _ in range(30):
+        day = day + rng.integers(-2, 6, members) # Gaps, same-day and older weigh-ins
+        weight = 80 + rng.normal(0, 1, members)
+        scalar = [trend.update(t, int(d), float(w)) for t, d, w in zip(scalar, day, weight)]
+        batch = update_trends_batch(batch, day, weight)
+    assert [tuple(row) for row in batch.itertuples(index=False)] == [tuple(t) for t in scalar]
@@ -0,0 +1,16 @@
+import pytest
+
+from musclemap.workouts import FULL_BODY, WorkoutDay, WorkoutPlan
+
+
+def test_days_saved_as_text_by_the_old_app_load():
+    saved = dict(FULL_BODY.to_dict(), weekly_schedule=[str(day) for day in FULL_BODY.to_dict()['weekly_schedule']])
+    assert WorkoutPlan.from_dict(saved) == FULL_BODY
+
+
+@pytest.mark.parametrize("text", [
+    "[1, 2, 3]", "{'focus': 'Rest', 'day': 'Day 1'}", "{'day': " + "9" * 5000 + "}",
+], ids=["not a dict", "not as saved", "too long"])
+def test_other_text_is_not_evaluated(text):
+    with pytest.raises(ValueError):
+        WorkoutDay.from_dict(text)